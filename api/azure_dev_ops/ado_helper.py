@@ -1,10 +1,17 @@
 """Azure DevOps helper functions"""
-from api.azure_dev_ops.api import ado_api
+from api.azure_dev_ops.api import ado_api, ado_host
+from api.utilities.metadata_cache import METADATA_CACHE
+from api.utilities.request_scheduler import BULK_READ, READ, WRITE, scheduled
 from api.utilities.retry_request import retry_request
 from report.log_and_report import write_logging_error
 
+WIQL_MAX_RESULTS = 20000
+WORK_ITEMS_BATCH_SIZE = 200
 
+
+@METADATA_CACHE.cached("ado_project")
 @retry_request
+@scheduled(ado_host, READ)
 def get_project_by_id_or_name(organization, project_id_or_name):
     """
     Retrieves a project from Azure DevOps by its ID or name.
@@ -25,7 +32,53 @@ def get_project_by_id_or_name(organization, project_id_or_name):
     response.raise_for_status()
 
 
+@METADATA_CACHE.cached("ado_work_item_types")
 @retry_request
+@scheduled(ado_host, READ)
+def get_work_item_types(organization, project):
+    """
+    Retrieves the work item types of a project, with their states.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+
+    Returns:
+        list: The work item types.
+
+    Raises:
+        HTTPError: If the API response is not successful.
+    """
+    response = ado_api.get_work_item_types(organization, project)
+    if response.ok:
+        return response.json()["value"]
+    response.raise_for_status()
+
+
+@METADATA_CACHE.cached("ado_relation_types")
+@retry_request
+@scheduled(ado_host, READ)
+def get_work_item_relation_types(organization):
+    """
+    Retrieves the work item relation types of an organization, e.g. System.LinkTypes.Related.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+
+    Returns:
+        list: The relation types.
+
+    Raises:
+        HTTPError: If the API response is not successful.
+    """
+    response = ado_api.get_work_item_relation_types(organization)
+    if response.ok:
+        return response.json()["value"]
+    response.raise_for_status()
+
+
+@retry_request
+@scheduled(ado_host, READ)
 def get_work_item_by_id(organization, project, work_item_id):
     """
     Retrieves a work item by its ID from Azure DevOps.
@@ -46,6 +99,7 @@ def get_work_item_by_id(organization, project, work_item_id):
 
 
 @retry_request
+@scheduled(ado_host, WRITE)
 def create_work_item(organization, project, work_item_type, body):
     """
     Creates a work item in Azure DevOps.
@@ -69,6 +123,7 @@ def create_work_item(organization, project, work_item_type, body):
     return response.raise_for_status()
 
 @retry_request
+@scheduled(ado_host, WRITE)
 def update_work_item(organization, project, work_item_id, body):
     """
     Creates a work item in Azure DevOps.
@@ -93,6 +148,7 @@ def update_work_item(organization, project, work_item_id, body):
 
 
 @retry_request
+@scheduled(ado_host, BULK_READ)
 def get_all_work_items_in_project(organization, project, team=None):
     """
     Retrieves all work items in a project.
@@ -123,3 +179,245 @@ def get_all_work_items_in_project(organization, project, team=None):
         response = ado_api.get_work_items_batch(organization, project, body)
         return response.json() if response.ok else response.raise_for_status()
     return response.raise_for_status()
+
+
+@retry_request
+@scheduled(ado_host, BULK_READ)
+def get_work_item_ids_page(organization, project, query, after_id, team=None):
+    """
+    Retrieves the ids of up to WIQL_MAX_RESULTS work items found by a WIQL query, above an id.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+        query (str): The WIQL query selecting [System.Id] with a WHERE clause and without ORDER BY.
+        after_id (int): The ids returned are greater than this one.
+        team (str, optional): The name of the team. Defaults to None.
+
+    Returns:
+        list: The ids of the work items, in ascending order.
+
+    Raises:
+        HTTPError: If there is an error in the HTTP request.
+    """
+    if not team:
+        team = f"{project} Team"
+    body = {"query": f"{query} AND [System.Id] > {after_id} ORDER BY [System.Id]"}
+    response = ado_api.query_by_wiql(organization, project, team, WIQL_MAX_RESULTS, body)
+    if not response.ok:
+        return response.raise_for_status()
+    return [work_item["id"] for work_item in response.json()["workItems"]]
+
+
+@retry_request
+@scheduled(ado_host, BULK_READ)
+def get_work_items_fields(organization, project, work_item_ids, fields):
+    """
+    Retrieves some fields of up to WORK_ITEMS_BATCH_SIZE work items.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+        work_item_ids (list): The ids of the work items.
+        fields (list): The fields to retrieve.
+
+    Returns:
+        list: The dictionaries representing the work items.
+
+    Raises:
+        HTTPError: If there is an error in the HTTP request.
+    """
+    response = ado_api.get_work_items_batch(organization, project, {"ids": work_item_ids, "fields": fields})
+    if not response.ok:
+        return response.raise_for_status()
+    return response.json()["value"]
+
+
+def get_work_items_by_query(organization, project, query, fields, team=None):
+    """
+    Retrieves the work items found by a WIQL query, whatever their number. Azure DevOps returns at most
+    WIQL_MAX_RESULTS work items per query, so the query is paged by id until a page comes back short, and the
+    work items of each page are fetched in batches of WORK_ITEMS_BATCH_SIZE.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+        query (str): The WIQL query selecting [System.Id] with a WHERE clause and without ORDER BY.
+        fields (list): The fields to retrieve.
+        team (str, optional): The name of the team. Defaults to None.
+
+    Returns:
+        list: The dictionaries representing the work items.
+
+    Raises:
+        HTTPError: If there is an error in the HTTP request.
+    """
+    work_items = []
+    after_id = 0
+    while True:
+        work_item_ids = get_work_item_ids_page(organization, project, query, after_id, team)
+        for index in range(0, len(work_item_ids), WORK_ITEMS_BATCH_SIZE):
+            work_items.extend(get_work_items_fields(organization, project,
+                                                    work_item_ids[index:index + WORK_ITEMS_BATCH_SIZE], fields))
+        if len(work_item_ids) < WIQL_MAX_RESULTS:
+            return work_items
+        after_id = work_item_ids[-1]
+
+
+@retry_request
+@scheduled(ado_host, BULK_READ)
+def get_work_items_with_relations(organization, project, work_item_ids):
+    """
+    Retrieves up to WORK_ITEMS_BATCH_SIZE work items with all their fields and their relations.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        work_item_ids (list): The ids of the work items.
+
+    Returns:
+        list: The dictionaries representing the work items.
+
+    Raises:
+        HTTPError: If the API response is not successful.
+    """
+    response = ado_api.get_work_items_batch(organization, project, {"ids": work_item_ids, "$expand": "Relations"})
+    if response.ok:
+        return response.json()["value"]
+    return response.raise_for_status()
+
+
+@retry_request
+@scheduled(ado_host, WRITE)
+def delete_work_items(organization, project, work_item_ids, destroy=False):
+    """
+    Deletes up to WORK_ITEMS_BATCH_SIZE work items in a single request.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        work_item_ids (list): The ids of the work items.
+        destroy (bool): True to destroy the work items, False to move them to the recycle bin.
+
+    Returns:
+        list: The ids of the work items that could not be deleted.
+
+    Raises:
+        HTTPError: If the API response is not successful.
+    """
+    body = {"ids": work_item_ids, "destroy": destroy, "skipNotifications": True}
+    response = ado_api.delete_work_items(organization, project, body)
+    if response.ok:
+        failed = [result for result in response.json().get("value", []) if result.get("code", 200) >= 400]
+        for result in failed:
+            write_logging_error(f"Error deleting work item '{result['id']}': {result.get('message')}")
+        return [result["id"] for result in failed]
+    write_logging_error(f"Error deleting work items: {response.status_code} - {response.text}")
+    return response.raise_for_status()
+
+
+@retry_request
+@scheduled(ado_host, BULK_READ)
+def create_attachment(organization, project, file_name, content):
+    """
+    Uploads an attachment to Azure DevOps in a single request.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        file_name (str): The name of the file.
+        content (bytes): The content of the file.
+
+    Returns:
+        dict: The JSON response containing the id and url of the attachment.
+
+    Raises:
+        HTTPError: If the API response is not successful.
+    """
+    response = ado_api.create_attachment(organization, project, file_name, content)
+    if response.ok:
+        return response.json()
+    write_logging_error(f"Error uploading attachment '{file_name}': {response.status_code} - {response.text}")
+    return response.raise_for_status()
+
+
+@retry_request
+@scheduled(ado_host, BULK_READ)
+def start_chunked_attachment(organization, project, file_name):
+    """
+    Starts the chunked upload of an attachment to Azure DevOps.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        file_name (str): The name of the file.
+
+    Returns:
+        dict: The JSON response containing the id and url of the attachment.
+
+    Raises:
+        HTTPError: If the API response is not successful.
+    """
+    response = ado_api.start_chunked_attachment(organization, project, file_name, "Chunked")
+    if response.ok:
+        return response.json()
+    write_logging_error(f"Error starting upload of attachment '{file_name}': {response.status_code} - "
+                        f"{response.text}")
+    return response.raise_for_status()
+
+
+@retry_request
+@scheduled(ado_host, BULK_READ)
+def upload_attachment_chunk(organization, project, attachment_id, file_name, start, content, total_size):
+    """
+    Uploads a chunk of an attachment started with start_chunked_attachment.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        attachment_id (str): The id of the attachment.
+        file_name (str): The name of the file.
+        start (int): The offset of the chunk in the file.
+        content (bytes): The content of the chunk.
+        total_size (int): The size of the file.
+
+    Returns:
+        dict: The JSON response containing the id and url of the attachment.
+
+    Raises:
+        HTTPError: If the API response is not successful.
+    """
+    content_range = f"bytes {start}-{start + len(content) - 1}/{total_size}"
+    response = ado_api.upload_attachment_chunk(organization, project, attachment_id, file_name, "Chunked",
+                                               content_range, content)
+    if response.ok:
+        return response.json()
+    write_logging_error(f"Error uploading chunk {content_range} of attachment '{file_name}': "
+                        f"{response.status_code} - {response.text}")
+    return response.raise_for_status()
+
+
+@retry_request
+@scheduled(ado_host, WRITE)
+def add_work_item_comment(organization, project, work_item_id, text):
+    """
+    Adds a comment to a Work Item.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        work_item_id (int): The id of the Work Item.
+        text (str): The HTML text of the comment.
+
+    Returns:
+        dict: The JSON response containing the id of the comment.
+
+    Raises:
+        HTTPError: If the API response is not successful.
+    """
+    response = ado_api.add_work_item_comment(organization, project, work_item_id, body={"text": text})
+    if response.ok:
+        return response.json()
+    write_logging_error(f"Error adding a comment to Work Item {work_item_id}: {response.status_code} - "
+                        f"{response.text}")
+    return response.raise_for_status()
@@ -1,10 +1,16 @@
 """Implements the easeRequirements and Azure DevOps APIs"""
+from urllib.parse import urlsplit
+
 import requests
-from uplink import Consumer, get, post, headers, json, Body, put, delete, patch
+from uplink import Consumer, get, post, headers, Body, put, delete, patch, Query, Header
 from uplink.auth import BasicAuth
 import urllib3
 from urllib3 import exceptions
+from api.utilities.http_cassette import install_transport
+from api.utilities.json_codec import install_json_codec
+from api.utilities.uplink_extensions import fast_json
 from config.config import ADO_ENV
+from report.metrics import instrument_session
 
 
 class EaseRequirementsForAzureDevopsApi(Consumer):
@@ -23,7 +29,7 @@ class EaseRequirementsForAzureDevopsApi(Consumer):
 
     @headers({"Accept": f"application/json; api-version={API_VERSION}"})
     @headers({"Content-Type": "application/json"})
-    @json
+    @fast_json
     @put("{}{}".format(url_tree_items, "{project_id}/Documents/"))
     def create_single_tree_item(self, project_id, body: Body):
         """Create a single tree item"""
@@ -55,10 +61,14 @@ class AzureDevOpsApi(Consumer):
     Attributes:
         API_VERSION (str): The API version to be used for API requests.
         API_VERSION_WIQL (str): The API version to be used for WIQL queries.
+        API_VERSION_DELETE (str): The API version to be used for batch deletes.
+        API_VERSION_COMMENTS (str): The API version to be used for Work Item comments.
     """
 
     API_VERSION = "7.1-preview.3"
     API_VERSION_WIQL = "5.1"
+    API_VERSION_DELETE = "7.1-preview.1"
+    API_VERSION_COMMENTS = "7.1-preview.4"
 
     @headers({"Accept": f"application/json; api-version={API_VERSION}"})
     @get("{organization}/_apis/projects")
@@ -70,6 +80,16 @@ class AzureDevOpsApi(Consumer):
     def get_project_by_id_or_name(self, organization, project_id_or_name):
         """Get project by id or name"""
 
+    @headers({"Accept": f"application/json; api-version={API_VERSION}"})
+    @get("{organization}/{project}/_apis/wit/workitemtypes")
+    def get_work_item_types(self, organization, project):
+        """Get the work item types of a project, with their states"""
+
+    @headers({"Accept": f"application/json; api-version={API_VERSION}"})
+    @get("{organization}/_apis/wit/workitemrelationtypes")
+    def get_work_item_relation_types(self, organization):
+        """Get the work item relation types"""
+
     @headers({"Accept": f"application/json; api-version={API_VERSION}"})
     @get("{organization}/{project}/_apis/wit/workitems/{work_item_id}")
     def get_work_item_by_id(self, organization, project, work_item_id):
@@ -77,36 +97,74 @@ class AzureDevOpsApi(Consumer):
 
     @headers({"Accept": f"application/json-patch+json; api-version={API_VERSION}"})
     @headers({"Content-Type": "application/json-patch+json"})
-    @json
+    @fast_json
     @post("{organization}/{project}/_apis/wit/workitems/${work_item_type}")
     def create_work_item(self, organization, project, work_item_type, body: Body):
         """Create new WorkItem"""
 
     @headers({"Accept": f"application/json-patch+json; api-version={API_VERSION}"})
     @headers({"Content-Type": "application/json-patch+json"})
-    @json
+    @fast_json
     @patch("{organization}/{project}/_apis/wit/workitems/{work_item_id}")
     def update_work_item(self, organization, project, work_item_id, body: Body):
         """Update WorkItem"""
 
     @headers({"Accept": f"application/json; api-version={API_VERSION_WIQL}"})
     @headers({"Content-Type": "application/json"})
-    @json
+    @fast_json
     @post("{organization}/{project}/{team}/_apis/wit/wiql?top={top}")
     def query_by_wiql(self, organization, project, team, top, body: Body):
         """Wiql - Query by Wiql, were top is the max number of results to return."""
 
     @headers({"Accept": f"application/json; api-version={API_VERSION_WIQL}"})
     @headers({"Content-Type": "application/json"})
-    @json
+    @fast_json
     @post("{organization}/{project}/_apis/wit/workitemsbatch")
     def get_work_items_batch(self, organization, project, body: Body):
         """Get Work Items Batch"""
 
+    @headers({"Accept": f"application/json; api-version={API_VERSION_DELETE}"})
+    @headers({"Content-Type": "application/json"})
+    @fast_json
+    @post("{organization}/{project}/_apis/wit/workitemsdelete")
+    def delete_work_items(self, organization, project, body: Body):
+        """Delete or destroy Work Items in a batch"""
+
+    @headers({"Accept": f"application/json; api-version={API_VERSION}"})
+    @headers({"Content-Type": "application/octet-stream"})
+    @post("{organization}/{project}/_apis/wit/attachments")
+    def create_attachment(self, organization, project, file_name: Query("fileName"), body: Body):
+        """Upload an attachment in a single request"""
+
+    @headers({"Accept": f"application/json; api-version={API_VERSION}"})
+    @headers({"Content-Type": "application/octet-stream"})
+    @post("{organization}/{project}/_apis/wit/attachments")
+    def start_chunked_attachment(self, organization, project, file_name: Query("fileName"),
+                                 upload_type: Query("uploadType")):
+        """Start the chunked upload of an attachment"""
+
+    @headers({"Accept": f"application/json; api-version={API_VERSION}"})
+    @headers({"Content-Type": "application/octet-stream"})
+    @put("{organization}/{project}/_apis/wit/attachments/{attachment_id}")
+    def upload_attachment_chunk(self, organization, project, attachment_id, file_name: Query("fileName"),
+                                upload_type: Query("uploadType"), content_range: Header("Content-Range"),
+                                body: Body):
+        """Upload a chunk of an attachment started with start_chunked_attachment"""
+
+    @headers({"Accept": f"application/json; api-version={API_VERSION_COMMENTS}"})
+    @headers({"Content-Type": "application/json"})
+    @fast_json
+    @post("{organization}/{project}/_apis/wit/workitems/{work_item_id}/comments")
+    def add_work_item_comment(self, organization, project, work_item_id, body: Body):
+        """Add a comment to a Work Item"""
+
 
 urllib3.disable_warnings(exceptions.InsecureRequestWarning)
 session = requests.Session()
 session.verify = False
+instrument_session(session)
+install_json_codec(session)
+install_transport(session)
 api_auth = BasicAuth(ADO_ENV.username, ADO_ENV.ado_pat)
 ado_api = AzureDevOpsApi(ADO_ENV.application_url,
                          auth=api_auth, client=session)
@@ -114,3 +172,5 @@ ease_requirements_api_auth = BasicAuth(ADO_ENV.ado_pat, "")
 ease_requirements_url = f"https://extmgmt.{ADO_ENV.application_url.split('//')[-1]}"
 ease_requirements_api = EaseRequirementsForAzureDevopsApi(ease_requirements_url, auth=ease_requirements_api_auth,
                                                           client=session)
+ado_host = urlsplit(ADO_ENV.application_url).netloc
+ease_requirements_host = urlsplit(ease_requirements_url).netloc
@@ -1,12 +1,15 @@
 """Helper functions to call the Azure DevOps REST API for Requirements."""
 from api.azure_dev_ops import ado_helper
-from api.azure_dev_ops.api import ease_requirements_api
+from api.azure_dev_ops.api import ease_requirements_api, ease_requirements_host
+from api.utilities.metadata_cache import METADATA_CACHE
+from api.utilities.request_scheduler import BULK_READ, READ, TREE_WRITE, scheduled
 from api.utilities.retry_request import retry_request
-from report.log_and_report import (write_logging_server_response,
+from report.log_and_report import (write_logging_item_message, write_logging_server_response,
                                    write_logging_simple_message)
 
 
 @retry_request
+@scheduled(ease_requirements_host, TREE_WRITE)
 def create_single_tree_item(project_id, child_id, parent_id):
     """
     Create a single tree item.
@@ -27,13 +30,14 @@ def create_single_tree_item(project_id, child_id, parent_id):
     if response.status_code == 200 or response.status_code == 201:
         result = response.json()
         created_id = result["id"]
-        write_logging_simple_message(f"Tree item created with ID: {created_id}, parent {parent_id}")
+        write_logging_item_message(f"Tree item created with ID: {created_id}, parent {parent_id}")
         return created_id
     else:
         response.raise_for_status()
 
 
 @retry_request
+@scheduled(ease_requirements_host, BULK_READ)
 def get_all_tree_items(project_id):
     """
     Get all tree items for a project.
@@ -55,6 +59,7 @@ def get_all_tree_items(project_id):
 
 
 @retry_request
+@scheduled(ease_requirements_host, TREE_WRITE)
 def delete_single_tree_item(project_id, item_id):
     """
     Delete a single tree item.
@@ -65,12 +70,13 @@ def delete_single_tree_item(project_id, item_id):
     """
     response = ease_requirements_api.delete_single_tree_item(project_id, item_id)
     if response.status_code == 204:
-        write_logging_simple_message(f"Tree item deleted with ID: {item_id}")
+        write_logging_item_message(f"Tree item deleted with ID: {item_id}")
     else:
         response.raise_for_status()
 
 
 @retry_request
+@scheduled(ease_requirements_host, READ)
 def get_folder_work_item_type(organization, project_key):
     """
     Get the folder work item type for a project.
@@ -81,14 +87,18 @@ def get_folder_work_item_type(organization, project_key):
 
     Returns:
         str: The folder work item type.
-        response: The response of the api.
+        response: The response of the api, None when the folder work item type was cached.
     """
     project_id = ado_helper.get_project_by_id_or_name(organization, project_key)["id"]
+    folder_item_type = METADATA_CACHE.get("folder_work_item_type", project_id)
+    if folder_item_type is not None:
+        return folder_item_type, None
     response = ease_requirements_api.get_folder_work_item_type(project_id)
     if response.ok:
         folder_item_type = response.json()["value"]["folderSettings"]["folderItemType"]
         if folder_item_type != "None":
             write_logging_simple_message(f"The folder work item type is {folder_item_type}")
+            METADATA_CACHE.set("folder_work_item_type", folder_item_type, project_id)
             return folder_item_type, response
         else:
             message = \
@@ -1,9 +1,15 @@
+from urllib.parse import urlsplit
+
 import requests
-from uplink import Consumer, get
+from uplink import Consumer, get, Query, Url
 from uplink.auth import BasicAuth, BearerToken
 import urllib3
 from urllib3 import exceptions
+from api.utilities.http_cassette import install_transport
+from api.utilities.json_codec import install_json_codec
+from api.utilities.uplink_extensions import streaming
 from config.config import DC_ENV
+from report.metrics import instrument_session
 
 
 class R4jApi(Consumer):
@@ -41,14 +47,32 @@ class JiraAPI(Consumer):
     def get_project_by_id_or_key(self, project_id_or_key):
         """Get project details by project id or key"""
 
-    @get("{}{}".format(jira_endpoint, 'search?jql=project={project_key} OR issue in requirementsPath("{project_name}")&maxResults=1000'))
-    def get_all_issues_in_project_by_project_key_or_tree(self, project_key, project_name):
+    @get("{}{}".format(jira_endpoint, 'search?jql=project={project_key} OR issue in requirementsPath("{project_name}")&maxResults=1000&fields={fields}'))
+    def get_all_issues_in_project_by_project_key_or_tree(self, project_key, project_name, fields):
         """Get all issues in project by project key"""
 
+    @get("{}{}".format(jira_endpoint, 'search'))
+    def search_issues(self, jql: Query, start_at: Query("startAt"), max_results: Query("maxResults"),
+                      fields: Query):
+        """Get a page of the issues found by a JQL query"""
+
+    @get("{}{}".format(jira_endpoint, 'issue/{issue_id}/comment'))
+    def get_issue_comments(self, issue_id, start_at: Query("startAt"), max_results: Query("maxResults")):
+        """Get a page of the comments of an issue, oldest first"""
+
+    @streaming
+    @get
+    def download_attachment(self, content_url: Url):
+        """Download the content of an attachment, streaming the response body"""
+
 
 urllib3.disable_warnings(exceptions.InsecureRequestWarning)
 session = requests.Session()
 session.verify = False
+instrument_session(session)
+install_json_codec(session)
+install_transport(session)
 api_auth = BasicAuth(DC_ENV.username, DC_ENV.password) if DC_ENV.pat == '' else BearerToken(DC_ENV.pat)
 r4j_api = R4jApi(DC_ENV.application_url, auth=api_auth, client=session)
 jira_api = JiraAPI(DC_ENV.application_url, auth=api_auth, client=session)
+data_center_host = urlsplit(DC_ENV.application_url).netloc
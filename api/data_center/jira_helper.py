@@ -1,10 +1,17 @@
 
 """Jira helper functions"""
-from api.data_center.api import jira_api
+from api.data_center.api import data_center_host, jira_api
+from api.utilities.metadata_cache import METADATA_CACHE
+from api.utilities.request_scheduler import BULK_READ, READ, SCHEDULER, ScheduledStream, scheduled
 from api.utilities.retry_request import retry_request
+from config.config import RUN_ENV
+
+ISSUE_SEARCH_FIELDS = "*navigable,attachment"
+COMMENTS_PAGE_SIZE = 100
 
 
 @retry_request
+@scheduled(data_center_host, READ)
 def get_issue_by_key(issue_key):
     """
     Retrieves an issue from Jira based on the provided issue key.
@@ -19,7 +26,9 @@ def get_issue_by_key(issue_key):
     return response
 
 
+@METADATA_CACHE.cached("jira_projects")
 @retry_request
+@scheduled(data_center_host, READ)
 def get_all_projects():
     """
     Retrieves a project from Jira based on the provided project ID or key.
@@ -31,25 +40,42 @@ def get_all_projects():
     return response
 
 
-@retry_request
+@METADATA_CACHE.cached("jira_projects_by_name")
+def get_projects_by_name():
+    """
+    Index the Jira projects by their name.
+
+    Returns:
+        dict: The project details by project name.
+    """
+    return {project["name"]: project for project in get_all_projects()}
+
+
 def get_project_by_name(project_name):
     """
-    Retrieves a project from Jira based on the provided project ID or key.
+    Retrieves a project from Jira based on the provided project name.
+
+    The project list is cached, so it is downloaded again only when the project is not in the cached list.
 
     Args:
-        project_name (str): The ID or key of the project to retrieve.
+        project_name (str): The name of the project to retrieve.
 
     Returns:
         dict: The JSON response containing the project details.
     """
-    response = get_all_projects()
-    for project in response:
-        if project["name"] == project_name:
-            return project
-    raise ValueError(f"Project with name {project_name} not found")
+    project = get_projects_by_name().get(project_name)
+    if project is None:
+        METADATA_CACHE.invalidate("jira_projects")
+        METADATA_CACHE.invalidate("jira_projects_by_name")
+        project = get_projects_by_name().get(project_name)
+    if project is None:
+        raise ValueError(f"Project with name {project_name} not found")
+    return project
 
 
+@METADATA_CACHE.cached("jira_project")
 @retry_request
+@scheduled(data_center_host, READ)
 def get_project_by_id_or_key(project_id_or_key):
     """
     Retrieves a project from Jira based on the provided project ID or key.
@@ -65,6 +91,7 @@ def get_project_by_id_or_key(project_id_or_key):
 
 
 @retry_request
+@scheduled(data_center_host, BULK_READ)
 def get_all_issues_in_project_by_project_key_or_tree(project_key, project_name):
     """
     Retrieves all issues in a project from Jira based on the provided project key.
@@ -75,5 +102,134 @@ def get_all_issues_in_project_by_project_key_or_tree(project_key, project_name):
     Returns:
         dict: The JSON response containing the list of issues in the project.
     """
-    response = jira_api.get_all_issues_in_project_by_project_key_or_tree(project_key, project_name).json()
+    response = jira_api.get_all_issues_in_project_by_project_key_or_tree(project_key, project_name,
+                                                                        issue_search_fields()).json()
     return response
+
+
+def issue_search_fields():
+    """
+    The fields returned by the issue searches, with the comments when they are migrated.
+
+    Returns:
+        str: The comma-separated fields.
+    """
+    return f"{ISSUE_SEARCH_FIELDS},comment" if RUN_ENV.migrate_comments else ISSUE_SEARCH_FIELDS
+
+
+def project_or_tree_jql(project_key, project_name):
+    """
+    Build the JQL query of the issues in a project or in its requirements tree.
+
+    Args:
+        project_key (str): The key of the project.
+        project_name (str): The name of the project, used by the R4J requirementsPath function.
+
+    Returns:
+        str: The JQL query.
+    """
+    return f'project={project_key} OR issue in requirementsPath("{project_name}")'
+
+
+@retry_request
+@scheduled(data_center_host, BULK_READ)
+def search_issues(jql, start_at, max_results):
+    """
+    Retrieves a page of the issues found by a JQL query.
+
+    Args:
+        jql (str): The JQL query.
+        start_at (int): The index of the first issue of the page.
+        max_results (int): The maximum number of issues in the page.
+
+    Returns:
+        dict: The JSON response containing the issues of the page and the total.
+    """
+    response = jira_api.search_issues(jql, start_at, max_results, issue_search_fields())
+    if response.ok:
+        return response.json()
+    return response.raise_for_status()
+
+
+def iterate_issue_pages(jql, page_size):
+    """
+    Retrieves the issues found by a JQL query one page at a time.
+
+    Args:
+        jql (str): The JQL query.
+        page_size (int): The maximum number of issues requested per page.
+
+    Yields:
+        list: The issues of each page.
+    """
+    start_at = 0
+    while True:
+        page = search_issues(jql, start_at, page_size)
+        issues = page["issues"]
+        if issues:
+            yield issues
+        start_at += len(issues)
+        if not issues or start_at >= page["total"]:
+            return
+
+
+@retry_request
+@scheduled(data_center_host, READ)
+def get_issue_comments(issue_id, start_at, max_results):
+    """
+    Retrieves a page of the comments of an issue, oldest first.
+
+    Args:
+        issue_id (str): The id of the issue.
+        start_at (int): The index of the first comment of the page.
+        max_results (int): The maximum number of comments in the page.
+
+    Returns:
+        dict: The JSON response containing the comments of the page and the total.
+    """
+    response = jira_api.get_issue_comments(issue_id, start_at, max_results)
+    if response.ok:
+        return response.json()
+    return response.raise_for_status()
+
+
+def get_all_issue_comments(issue_id):
+    """
+    Retrieves all the comments of an issue, one page of COMMENTS_PAGE_SIZE at a time.
+
+    Args:
+        issue_id (str): The id of the issue.
+
+    Returns:
+        list: The comments, oldest first.
+    """
+    comments = []
+    while True:
+        page = get_issue_comments(issue_id, len(comments), COMMENTS_PAGE_SIZE)
+        comments.extend(page["comments"])
+        if not page["comments"] or len(comments) >= page["total"]:
+            return comments
+
+
+@retry_request
+def download_attachment(content_url):
+    """
+    Starts the download of an attachment from Jira, without reading its content. The BULK_READ slot of the
+    Jira host is held until the response is closed, so the content is read within the per-host cap.
+
+    Args:
+        content_url (str): The content URL of the attachment.
+
+    Returns:
+        ScheduledStream: The streamed response, to be read with iter_content and closed by the caller.
+    """
+    SCHEDULER.acquire(data_center_host, BULK_READ)
+    try:
+        response = ScheduledStream(jira_api.download_attachment(content_url), data_center_host)
+    except BaseException:
+        SCHEDULER.release(data_center_host)
+        raise
+    if response.ok:
+        return response
+    response.close()
+    return response.raise_for_status()
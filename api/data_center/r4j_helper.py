@@ -1,7 +1,9 @@
-from api.data_center.api import r4j_api
+from api.data_center.api import data_center_host, r4j_api
+from api.utilities.request_scheduler import BULK_READ, scheduled
 from report.log_and_report import write_logging_server_response, write_logging_error
 
 
+@scheduled(data_center_host, BULK_READ)
 def get_complete_tree_structure_by_project_key(project_key):
     response = r4j_api.get_complete_tree_structure_by_project_key(project_key)
     if response.status_code == 200:
@@ -0,0 +1,89 @@
+"""JSON codec shared by the consumers: orjson or ujson when installed, the standard library otherwise"""
+import json as std_json
+
+import requests
+
+from config.config import RUN_ENV
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+CODECS = ("orjson", "ujson", "json")
+
+
+def _select_codec(name):
+    """
+    Select the codec to use.
+
+    Args:
+        name (str): 'auto' for the fastest installed codec, or one of CODECS.
+
+    Returns:
+        str: The name of the selected codec.
+    """
+    installed = {"orjson": orjson is not None, "ujson": ujson is not None, "json": True}
+    if name == "auto":
+        return next(codec for codec in CODECS if installed[codec])
+    if name not in installed:
+        raise ValueError(f"Unknown JSON codec {name}, use auto or one of {', '.join(CODECS)}")
+    if not installed[name]:
+        raise ImportError(f"The JSON codec {name} is not installed")
+    return name
+
+
+CODEC = _select_codec(RUN_ENV.json_codec)
+
+# loads decodes a JSON document from bytes or str, dumps encodes a value as a UTF-8 JSON document
+if CODEC == "orjson":
+    loads = orjson.loads
+
+    def dumps(value):
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+elif CODEC == "ujson":
+    loads = ujson.loads
+
+    def dumps(value):
+        return ujson.dumps(value, ensure_ascii=False).encode("utf-8")
+else:
+    loads = std_json.loads
+
+    def dumps(value):
+        return std_json.dumps(value).encode("utf-8")
+
+
+class _DecodedOnceResponse(requests.Response):
+    """A response whose JSON payload is decoded with the codec on the first call of json() and kept on it."""
+
+    def json(self, **kwargs):
+        # A plain attribute rather than a closure over the response, so no reference cycle keeps large payloads
+        # alive until the cyclic garbage collector runs
+        if "_decoded_json" not in self.__dict__:
+            try:
+                self._decoded_json = loads(self.content)
+            except ValueError as e:
+                raise requests.exceptions.JSONDecodeError(str(e), self.text, 0)
+        return self._decoded_json
+
+
+def _attach_decoder(response, *args, **kwargs):
+    # Streamed responses are read by the caller, their content is never decoded as JSON
+    if not kwargs.get("stream") and type(response) is requests.Response:
+        response.__class__ = _DecodedOnceResponse
+
+
+def install_json_codec(session):
+    """
+    Make response.json() of every response of a session decode with the codec, once: the helpers and the log
+    functions share the decoded payload instead of decoding it again.
+
+    Args:
+        session (Session): The session used by the consumers.
+    """
+    session.hooks["response"].append(_attach_decoder)
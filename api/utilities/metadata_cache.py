@@ -0,0 +1,141 @@
+"""Read-through cache for the read-only metadata of Jira DC and Azure DevOps: projects, settings and types"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config.config import RUN_ENV
+
+
+class MetadataCache:
+    """
+    Memoizes the results of metadata requests, evicting the least recently used entries above max_entries and
+    dropping the entries older than ttl seconds.
+
+    When a path is given, the entries are also written to a JSON file and read back by the next runs, so batch
+    runs do not request the same metadata again. Only JSON serializable values are stored on disk.
+
+    Args:
+        ttl (float): Seconds an entry stays valid.
+        max_entries (int): Maximum number of entries kept in memory.
+        path (str): Path of the JSON file storing the entries, None to keep them only in memory.
+    """
+
+    def __init__(self, ttl, max_entries, path=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    @staticmethod
+    def _key(namespace, args):
+        return json.dumps([namespace, *args], default=str)
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as file:
+            stored = json.load(file)
+        now = time.time()
+        for key, (expires_at, value) in stored.items():
+            if expires_at > now:
+                self._entries[key] = (expires_at, value)
+
+    def _save(self):
+        stored = {}
+        for key, entry in self._entries.items():
+            try:
+                json.dumps(entry[1])
+            except TypeError:
+                continue
+            stored[key] = entry
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(stored, file)
+        os.replace(temporary_path, self.path)
+
+    def get(self, namespace, *args):
+        """
+        Get a cached value.
+
+        Args:
+            namespace (str): The kind of metadata, e.g. 'ado_project'.
+            *args: The arguments identifying the value in the namespace.
+
+        Returns:
+            The value, None when it is not cached or expired.
+        """
+        key = self._key(namespace, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, namespace, value, *args):
+        """
+        Cache a value.
+
+        Args:
+            namespace (str): The kind of metadata, e.g. 'ado_project'.
+            value: The value, None values are not cached.
+            *args: The arguments identifying the value in the namespace.
+        """
+        if value is None:
+            return
+        key = self._key(namespace, args)
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.path:
+                self._save()
+
+    def invalidate(self, namespace=None):
+        """
+        Remove the cached values of a namespace, or all of them.
+
+        Args:
+            namespace (str): The namespace to clear, None to clear the whole cache.
+        """
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+            else:
+                prefix = json.dumps([namespace])[:-1]
+                for key in [key for key in self._entries if key.startswith(prefix)]:
+                    del self._entries[key]
+            if self.path:
+                self._save()
+
+    def cached(self, namespace):
+        """
+        Decorator memoizing a function by its positional arguments.
+
+        Args:
+            namespace (str): The namespace of the values returned by the function.
+
+        Returns:
+            function: The decorator.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args):
+                value = self.get(namespace, *args)
+                if value is None:
+                    value = function(*args)
+                    self.set(namespace, value, *args)
+                return value
+            return wrapper
+        return decorator
+
+
+METADATA_CACHE = MetadataCache(RUN_ENV.cache_ttl, RUN_ENV.cache_size, RUN_ENV.cache_file)
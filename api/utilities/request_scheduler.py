@@ -0,0 +1,186 @@
+"""Schedules the requests of all the helpers by priority class, with per-host caps and backpressure"""
+import contextlib
+import functools
+import heapq
+import itertools
+import threading
+import time
+
+from config.config import RUN_ENV
+from report.metrics import record_queue_wait
+
+# Priority classes, the lowest first
+TREE_WRITE = 0  # Tree items, the children of an item wait for it
+WRITE = 1  # Work Item creations, state updates and deletions
+READ = 2  # Single items and metadata
+BULK_READ = 3  # Issue pages, Work Item scans, the R4J tree and the attachment transfers
+PRIORITY_NAMES = {TREE_WRITE: "tree_write", WRITE: "write", READ: "read", BULK_READ: "bulk_read"}
+
+
+class RequestScheduler:
+    """
+    Admits the requests of the helpers, sent by the concurrent phases of the migration, to the servers.
+
+    Each host serves at most max_per_host requests at once. The other requests wait for a slot, which is given
+    to the lowest priority class first, then in the order of arrival. The bulk reads are the producers of the
+    migration: they also wait while max_queue_depth requests of the other classes are waiting, on any host, so
+    the downloads pause when the writes fall behind instead of piling up pages in memory.
+
+    A helper called by another scheduled helper runs in the slot of its caller.
+
+    Args:
+        max_per_host (int): Maximum number of requests sent to a host at once, RUN_ENV.host_concurrency if None.
+        max_queue_depth (int): Number of waiting requests pausing the bulk reads, RUN_ENV.request_queue_depth
+            if None.
+    """
+
+    def __init__(self, max_per_host=None, max_queue_depth=None):
+        self.max_per_host = max_per_host
+        self.max_queue_depth = max_queue_depth
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._sequence = itertools.count()
+        self._waiting = {}
+        self._active = {}
+        self._waiting_urgent = 0
+
+    def _limits(self):
+        max_per_host = self.max_per_host if self.max_per_host is not None else RUN_ENV.host_concurrency
+        max_queue_depth = self.max_queue_depth if self.max_queue_depth is not None else RUN_ENV.request_queue_depth
+        return max_per_host, max_queue_depth
+
+    def _admissible(self, host, ticket, max_per_host, max_queue_depth):
+        return (self._waiting[host][0] == ticket and self._active.get(host, 0) < max_per_host
+                and (ticket[0] != BULK_READ or self._waiting_urgent < max_queue_depth))
+
+    def _dequeue(self, host, ticket):
+        waiting = self._waiting[host]
+        waiting.remove(ticket)
+        heapq.heapify(waiting)
+        if ticket[0] != BULK_READ:
+            self._waiting_urgent -= 1
+
+    @contextlib.contextmanager
+    def slot(self, host, priority):
+        """
+        Wait for a slot of a host and hold it while the requests of a helper are sent.
+
+        Args:
+            host (str): The host the requests are sent to.
+            priority (int): The priority class of the requests, e.g. TREE_WRITE.
+        """
+        if getattr(self._local, "held", False):
+            yield
+            return
+        self.acquire(host, priority)
+        self._local.held = True
+        try:
+            yield
+        finally:
+            self._local.held = False
+            self.release(host)
+
+    def acquire(self, host, priority):
+        """
+        Wait for a slot of a host and hold it until release is called, e.g. while a streamed response is read.
+        Unlike slot, the other requests sent meanwhile by the thread wait for their own slots.
+
+        Args:
+            host (str): The host the requests are sent to.
+            priority (int): The priority class of the requests, e.g. TREE_WRITE.
+        """
+        ticket = (priority, next(self._sequence))
+        started = time.perf_counter()
+        with self._condition:
+            heapq.heappush(self._waiting.setdefault(host, []), ticket)
+            if priority != BULK_READ:
+                self._waiting_urgent += 1
+            max_per_host, max_queue_depth = self._limits()
+            try:
+                while not self._admissible(host, ticket, max_per_host, max_queue_depth):
+                    self._condition.wait()
+            finally:
+                self._dequeue(host, ticket)
+                # The next request of the host, or a bulk read held back by the queue depth, may go now
+                self._condition.notify_all()
+            self._active[host] = self._active.get(host, 0) + 1
+        record_queue_wait(PRIORITY_NAMES[priority], time.perf_counter() - started)
+
+    def release(self, host):
+        """
+        Give back a slot taken with acquire.
+
+        Args:
+            host (str): The host of the slot.
+        """
+        with self._condition:
+            self._active[host] -= 1
+            self._condition.notify_all()
+
+    def queue_depths(self):
+        """
+        The number of requests waiting for a slot and sent now, by host.
+
+        Returns:
+            dict: The (waiting, active) counts by host.
+        """
+        with self._condition:
+            return {host: (len(self._waiting.get(host, ())), self._active.get(host, 0))
+                    for host in set(self._waiting) | set(self._active)}
+
+
+SCHEDULER = RequestScheduler()
+
+
+class ScheduledStream:
+    """
+    A streamed response holding the slot of its host until it is closed, so the content is read within the
+    per-host cap and the priorities of the SCHEDULER. The other attributes are those of the response.
+
+    Args:
+        response (Response): The streamed response.
+        host (str): The host whose slot was acquired for the response.
+    """
+
+    def __init__(self, response, host):
+        self.response = response
+        self.host = host
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        try:
+            self.response.close()
+        finally:
+            if not self._released:
+                self._released = True
+                SCHEDULER.release(self.host)
+
+
+def scheduled(host, priority):
+    """
+    Decorator sending the requests of a helper through the SCHEDULER. It goes below retry_request, so the slot
+    is given back while a failed request waits to be retried.
+
+    Args:
+        host (str): The host the helper sends its requests to.
+        priority (int): The priority class of the requests, e.g. TREE_WRITE.
+
+    Returns:
+        The decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with SCHEDULER.slot(host, priority):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,8 +1,10 @@
 """Utility functions to handle requests"""
+import functools
 import time
 import requests
 from report.log_and_report import (write_logging_error,
                                    write_logging_simple_message)
+from report.metrics import record_retry
 
 MAX_RETRIES = 3
 
@@ -21,6 +23,7 @@ def retry_request(function):
     Raises:
         TimeoutError: If the maximum number of retries is reached without success.
     """
+    @functools.wraps(function)
     def wrapper(*args, **kwargs):
         for i in range(MAX_RETRIES):
             try:
@@ -32,11 +35,12 @@ def retry_request(function):
                     raise e
                 if e.args[0].startswith("404 Client Error"):
                     raise e
-                if e.args[0].startswith("400 Bad Request"):
+                if e.args[0].startswith(("400 Bad Request", "400 Client Error")):
                     raise e
                 if i == MAX_RETRIES - 1:
                     print("Reached max number of retries. Aborting...")
                     raise e
+                record_retry(function.__name__)
                 time.sleep(2**i)
         raise TimeoutError("Max request retries reached")
 
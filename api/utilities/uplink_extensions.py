@@ -0,0 +1,33 @@
+"""Uplink annotations that are not provided by uplink"""
+from uplink.decorators import MethodAnnotation, json
+
+from api.utilities import json_codec
+
+
+# noinspection PyPep8Naming
+class streaming(MethodAnnotation):
+    """
+    Use as a decorator to stream the response body instead of downloading it when the request returns.
+
+    The caller reads the body with ``response.iter_content`` and must close the response.
+    """
+    _can_be_static = True
+
+    def modify_request(self, request_builder):
+        """Sets the stream option of the request."""
+        request_builder.info["stream"] = True
+
+
+# noinspection PyPep8Naming
+class fast_json(json):
+    """
+    Use as a decorator instead of uplink's json to encode the request body with the shared JSON codec.
+
+    The method sets the Content-Type header, since the body is sent as already encoded data.
+    """
+
+    @classmethod
+    def set_json_body(cls, request_builder):
+        """Encodes the JSON body of the request."""
+        super().set_json_body(request_builder)
+        request_builder.info["data"] = json_codec.dumps(request_builder.info.pop("json"))
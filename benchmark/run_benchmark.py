@@ -0,0 +1,292 @@
+"""
+Benchmarks the migration phases on synthetic projects served by local stubs.
+
+Usage:
+    python -m benchmark.run_benchmark [--sizes 1000 10000] [--shapes wide mixed] [--output results.json]
+                                      [--compare previous_results.json]
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmark.synthetic_data import PROJECT_NAME, SHAPES, generate_project
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_TIMEOUT = 900
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class PhaseTimer:
+    """
+    Times the phases of one scenario and sends each result to the parent process as soon as it is measured.
+
+    Args:
+        results (Queue): Queue shared with the parent process.
+        server (StubServer): The stub server, used to count the requests sent by each phase.
+        trace_memory (bool): If True, record the peak of the Python allocations of each phase with tracemalloc.
+    """
+
+    def __init__(self, results, server, trace_memory):
+        self.results = results
+        self.server = server
+        self.trace_memory = trace_memory
+
+    def run(self, phase, function, *args):
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        requests_before = self.server.request_count
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        peak_traced_bytes = None
+        if self.trace_memory:
+            peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.results.put({"phase": phase, "seconds": seconds, "requests": self.server.request_count - requests_before,
+                          "peak_traced_bytes": peak_traced_bytes, "max_rss_bytes": _max_rss_bytes()})
+        return result
+
+
+def _prepare_child(workdir):
+    """Run the scenario inside its folder, send the log there and silence the console output."""
+    os.makedirs(os.path.join(workdir, "report"), exist_ok=True)
+    os.chdir(workdir)
+    logging.basicConfig(format='%(asctime)s: %(levelname)s => %(message)s',
+                        filename=os.path.join(workdir, "benchmark.log"), level=logging.DEBUG)
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def _create_tree_items(project_id, deep_order_tree):
+    from api.azure_dev_ops import ease_requirements_helper
+
+    return [ease_requirements_helper.create_single_tree_item(project_id, issue.id, issue.parent_id)
+            for issue in deep_order_tree]
+
+
+def _replace_parent_ids(tree_items_list, jira_ado_ids):
+    for issue in tree_items_list:
+        issue.parent_id = jira_ado_ids[str(issue.jira_parent_id)]
+
+
+def run_isolated_phases(size, shape, seed, options, workdir, results):
+    """
+    Run each migration phase on its own against the stubs, in the order of a real migration.
+
+    Args:
+        size (int): Number of nodes in the synthetic tree.
+        shape (str): Shape of the synthetic tree.
+        seed (int): Seed of the synthetic data.
+        options (dict): The benchmark options: trace_memory, latency and pipeline.
+        workdir (str): Folder for the log and the generated HTML.
+        results (Queue): Queue to send the phase results to the parent process.
+    """
+    with _prepare_child(workdir):
+        try:
+            from benchmark.stub_server import ADO_PROJECT_ID, FOLDER_WORK_ITEM_TYPE, install_stub_server
+            from config.config import ADO_ENV
+            from report.log_and_report import generate_expected_tree_html
+            from utilities import ado_verifications, read_and_process_tree_items
+            from utilities.migrate_tree import (create_work_items_on_ado,
+                                                replace_tree_issues_data_with_jira_issue_data)
+            from utilities.transform_data import sort_tree
+
+            project = generate_project(size, shape, seed)
+            server = install_stub_server(project, options["latency"])
+            timer = PhaseTimer(results, server, options["trace_memory"])
+
+            tree_items_list = []
+            timer.run("read_and_process_tree_items", read_and_process_tree_items, project.tree, tree_items_list)
+            timer.run("replace_tree_issues_data_with_jira_issue_data", replace_tree_issues_data_with_jira_issue_data,
+                      tree_items_list, project.issues)
+            jira_ado_ids = {"-1": -1}
+            timer.run("find_existing_work_items_on_ado",
+                      ado_verifications.verify_all_data_center_tree_issues_in_ado_instance, jira_ado_ids,
+                      tree_items_list, ADO_ENV.organization, PROJECT_NAME)
+            timer.run("create_work_items_on_ado", create_work_items_on_ado, tree_items_list, jira_ado_ids,
+                      FOLDER_WORK_ITEM_TYPE, PROJECT_NAME)
+            _replace_parent_ids(tree_items_list, jira_ado_ids)
+            deep_order_tree = timer.run("sort_tree", sort_tree, tree_items_list)
+            timer.run("create_tree_items", _create_tree_items, ADO_PROJECT_ID, deep_order_tree)
+            timer.run("generate_expected_tree_html", generate_expected_tree_html,
+                      os.path.join(workdir, "expected_tree.html"), deep_order_tree, PROJECT_NAME)
+        except Exception as e:
+            results.put({"error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()})
+
+
+def run_end_to_end(size, shape, seed, options, workdir, results):
+    """
+    Run the complete migration against the stubs.
+
+    Args:
+        size (int): Number of nodes in the synthetic tree.
+        shape (str): Shape of the synthetic tree.
+        seed (int): Seed of the synthetic data.
+        options (dict): The benchmark options: trace_memory, latency and pipeline.
+        workdir (str): Folder for the log of the migration.
+        results (Queue): Queue to send the result, and the phase breakdown recorded by the run, to the parent.
+    """
+    with _prepare_child(workdir):
+        try:
+            from benchmark.stub_server import install_stub_server
+            from config.config import RUN_ENV
+            from report.metrics import METRICS
+            from utilities import run_migration
+
+            RUN_ENV.pipeline = options["pipeline"]
+            project = generate_project(size, shape, seed)
+            server = install_stub_server(project, options["latency"])
+            PhaseTimer(results, server, options["trace_memory"]).run("run_migration", run_migration, PROJECT_NAME,
+                                                                     False)
+            results.put({"breakdown": METRICS.summary()["phases"]})
+        except Exception as e:
+            results.put({"error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()})
+
+
+def run_scenario(target, mode, size, shape, seed, options, timeout):
+    """
+    Run a scenario in a separate process, so each scenario starts with a clean heap and can be stopped on timeout.
+
+    Args:
+        target (function): run_isolated_phases or run_end_to_end.
+        mode (str): Name of the scenario mode saved in the results.
+        size (int): Number of nodes in the synthetic tree.
+        shape (str): Shape of the synthetic tree.
+        seed (int): Seed of the synthetic data.
+        options (dict): The benchmark options: trace_memory, latency and pipeline.
+        timeout (int): Seconds after which the scenario is stopped.
+
+    Returns:
+        dict: The scenario results.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workdir = tempfile.mkdtemp(prefix="r4j-benchmark-")
+    process = context.Process(target=target, args=(size, shape, seed, options, workdir, results))
+    scenario = {"mode": mode, "size": size, "shape": shape, "status": "ok", "phases": []}
+    deadline = time.monotonic() + timeout
+    process.start()
+    while process.is_alive() or not results.empty():
+        try:
+            result = results.get(timeout=min(1, max(deadline - time.monotonic(), 0.01)))
+        except queue.Empty:
+            if time.monotonic() > deadline:
+                process.terminate()
+                scenario["status"] = "timeout"
+                break
+            continue
+        if "error" in result:
+            scenario["status"] = "error"
+            scenario["error"] = result["error"]
+            print(result["traceback"], file=sys.stderr)
+            continue
+        if "breakdown" in result:
+            scenario["breakdown"] = result["breakdown"]
+            continue
+        scenario["phases"].append(result)
+        print(f"\t{mode:<8} {shape:<6} {size:>7}  {result['phase']:<48} {result['seconds']:10.3f} s")
+    process.join()
+    shutil.rmtree(workdir, ignore_errors=True)
+    scenario["total_seconds"] = sum(phase["seconds"] for phase in scenario["phases"])
+    return scenario
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(previous, current):
+    """
+    Print the time ratio of every phase measured in both result files.
+
+    Args:
+        previous (dict): Results of the reference run.
+        current (dict): Results of the new run.
+    """
+    def index(results):
+        return {(scenario["mode"], scenario["shape"], scenario["size"], phase["phase"]): phase["seconds"]
+                for scenario in results["scenarios"] for phase in scenario["phases"]}
+
+    previous_index = index(previous)
+    print(f"\nComparison with {previous.get('git_revision')}:")
+    for key, seconds in index(current).items():
+        if key in previous_index and previous_index[key] > 0:
+            ratio = seconds / previous_index[key]
+            print(f"\t{key[0]:<8} {key[1]:<6} {key[2]:>7}  {key[3]:<48} "
+                  f"{previous_index[key]:10.3f} s -> {seconds:10.3f} s  (x{ratio:.2f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the migration phases on synthetic projects.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=SHAPES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="Seconds allowed for each scenario")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record the peak of the Python allocations of each phase (slower)")
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="Milliseconds each stub response is delayed by, to simulate the network")
+    parser.add_argument("--pipeline", action="store_true", help="Run the end-to-end scenarios in pipelined mode")
+    parser.add_argument("--skip-end-to-end", action="store_true")
+    parser.add_argument("--output", help="Path of the JSON results file")
+    parser.add_argument("--compare", help="Path of a previous JSON results file to compare with")
+    args = parser.parse_args(argv)
+
+    results = {"created": datetime.datetime.now().isoformat(timespec="seconds"), "git_revision": _git_revision(),
+               "python": platform.python_version(), "platform": platform.platform(), "seed": args.seed,
+               "trace_memory": args.trace_memory, "latency_ms": args.latency_ms, "pipeline": args.pipeline,
+               "scenarios": []}
+    options = {"trace_memory": args.trace_memory, "latency": args.latency_ms / 1000, "pipeline": args.pipeline}
+    for size in args.sizes:
+        for shape in args.shapes:
+            results["scenarios"].append(run_scenario(run_isolated_phases, "phases", size, shape, args.seed,
+                                                     options, args.timeout))
+            if not args.skip_end_to_end:
+                results["scenarios"].append(run_scenario(run_end_to_end, "end2end", size, shape, args.seed,
+                                                         options, args.timeout))
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"benchmark_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved in {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare_results(json.load(file), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""Local stubs for the Jira DC, R4J, Azure DevOps and easeRequirements REST APIs"""
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from benchmark.synthetic_data import PROJECT_KEY, PROJECT_NAME
+from config.config import ADO_ENV
+
+ADO_PROJECT_ID = "00000000-0000-0000-0000-00000000b3c4"
+FOLDER_WORK_ITEM_TYPE = "Folder"
+ADO_URL = "https://dev.azure.com/benchmark"
+ATTACHMENT_SIZE = 1024
+# Every COMMENTED_ISSUES_STEP-th issue has comments, every LONG_THREAD_STEP-th more than the search returns
+COMMENTED_ISSUES_STEP = 3
+LONG_THREAD_STEP = 50
+SEARCH_COMMENTS = 20
+
+
+def _response(request, status_code, payload=None, content=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = "OK" if status_code < 400 else "Error"
+    response.request = request
+    response.url = request.url
+    response.headers["Content-Type"] = "application/json"
+    if content is not None:
+        response._content = content
+    else:
+        response._content = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    response._content_consumed = True
+    return response
+
+
+def _issue_comments(issue_id):
+    """The comments of a synthetic issue, derived from its id so the generated project is unchanged."""
+    if issue_id % COMMENTED_ISSUES_STEP:
+        return []
+    count = SEARCH_COMMENTS + 5 if issue_id % LONG_THREAD_STEP == 0 else 2
+    return [{"id": str(issue_id * 1000 + index), "author": {"displayName": f"User {index % 3}"},
+             "created": "2024-01-01T00:00:00.000+0000", "body": f"Comment {index} on *requirement* {issue_id}"}
+            for index in range(count)]
+
+
+def _with_comments(issue):
+    comments = _issue_comments(int(issue["id"]))
+    comment_field = {"startAt": 0, "maxResults": SEARCH_COMMENTS, "total": len(comments),
+                     "comments": comments[:SEARCH_COMMENTS]}
+    return {**issue, "fields": {**issue["fields"], "comment": comment_field}}
+
+
+class StubServer:
+    """
+    In-memory implementation of the REST endpoints used by the migration.
+
+    The large payloads (tree, search results and existing work items) are serialized once, so the timings
+    measure the client side of the migration and not the stubs.
+
+    Args:
+        project (SyntheticProject): The project served by the stubs.
+        latency (float): Seconds each response is delayed by, to simulate the network round trip.
+    """
+
+    def __init__(self, project, latency=0):
+        self.project = project
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._next_work_item_id = 1
+        self._next_attachment_id = 1
+        self.work_items = {}
+        self.tree_items = {}
+        self.attachments = {}
+        self.comments = {}
+        self.request_count = 0
+        self._tree_content = json.dumps(project.tree).encode("utf-8")
+        self._search_content = json.dumps({"startAt": 0, "maxResults": len(project.issues),
+                                           "total": len(project.issues),
+                                           "issues": project.issues}).encode("utf-8")
+        self._existing_by_id = {item["id"]: item for item in project.ado_work_items}
+        # Every mapped type accepts every mapped state, the fields are not listed so they are not checked
+        states = [{"name": state} for state in dict.fromkeys(["New", *ADO_ENV.status_map.values()])]
+        self.work_item_types = [{"name": name, "states": states}
+                                for name in dict.fromkeys([FOLDER_WORK_ITEM_TYPE, *ADO_ENV.issue_type_map.values()])]
+        self.relation_types = [{"referenceName": name} for name in dict.fromkeys(ADO_ENV.link_type_map.values())]
+        self.routes = [
+            ("GET", r"/rest/api/2/project$", self.get_jira_projects),
+            ("GET", r"/rest/api/2/search", self.search_issues),
+            ("GET", r"/rest/api/2/issue/(?P<issue_id>\d+)/comment$", self.get_issue_comments),
+            ("GET", r"/rest/com\.easesolutions\.jira\.plugins\.requirements/1\.0/tree/", self.get_tree),
+            ("GET", r"/_apis/projects$", self.get_ado_projects),
+            ("GET", r"/_apis/projects/[^/]+$", self.get_ado_project),
+            ("GET", r"/_apis/wit/workitemtypes$", self.get_work_item_types),
+            ("GET", r"/_apis/wit/workitemrelationtypes$", self.get_work_item_relation_types),
+            ("POST", r"/_apis/wit/wiql$", self.query_by_wiql),
+            ("POST", r"/_apis/wit/workitemsbatch$", self.get_work_items_batch),
+            ("POST", r"/_apis/wit/workitems/\$(?P<work_item_type>[^/]+)$", self.create_work_item),
+            ("GET", r"/_apis/wit/workitems/(?P<work_item_id>\d+)$", self.get_work_item),
+            ("PATCH", r"/_apis/wit/workitems/(?P<work_item_id>\d+)$", self.update_work_item),
+            ("POST", r"/_apis/wit/workitemsdelete$", self.delete_work_items),
+            ("POST", r"/_apis/wit/workitems/(?P<work_item_id>\d+)/comments$", self.add_work_item_comment),
+            ("POST", r"/_apis/wit/attachments$", self.create_attachment),
+            ("PUT", r"/_apis/wit/attachments/(?P<attachment_id>[^/]+)$", self.upload_attachment_chunk),
+            ("GET", r"/secure/attachment/", self.download_attachment),
+            ("GET", r"/Documents/Settings_[^/]+$", self.get_folder_settings),
+            ("PUT", r"/TreeItems_[^/]+/Documents/$", self.create_tree_item),
+            ("GET", r"/TreeItems_[^/]+/Documents/$", self.get_tree_items),
+            ("DELETE", r"/TreeItems_[^/]+/Documents/(?P<item_id>[^/]+)$", self.delete_tree_item),
+        ]
+
+    def handle(self, request):
+        """
+        Route a prepared request to the matching stub endpoint.
+
+        Args:
+            request (PreparedRequest): The request sent by the migration.
+
+        Returns:
+            Response: The stub response.
+        """
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        path = unquote(urlsplit(request.url).path)
+        for method, pattern, endpoint in self.routes:
+            match = re.search(pattern, path)
+            if request.method == method and match:
+                return endpoint(request, **match.groupdict())
+        return _response(request, 404, {"message": f"No stub for {request.method} {path}"})
+
+    def get_jira_projects(self, request):
+        return _response(request, 200, [{"id": "10000", "key": PROJECT_KEY, "name": PROJECT_NAME}])
+
+    def _requirements_path_issues(self, path):
+        """The issues of the folder at a requirementsPath 'project/folder/subfolder' and of its subfolders."""
+        names = path.split("/")[1:]
+        folder = self.project.tree
+        for name in names:
+            folder = next((child for child in folder["folders"] if child["name"] == name), None)
+            if folder is None:
+                return []
+        ids = set()
+        stack = [folder]
+        while stack:
+            container = stack.pop()
+            stack.extend(container.get("folders", ()))
+            for issue in container.get("issues", ()):
+                ids.add(issue["issueId"])
+                stack.append({"issues": issue.get("childReqs", {}).get("childReq", ())})
+        return [issue for issue in self.project.issues if int(issue["id"]) in ids]
+
+    def _jql_issues(self, jql):
+        """The issues found by the JQL queries of the migration, every issue being in the project."""
+        window = re.fullmatch(r"\((.*)\) AND id >= (\d+) AND id <= (\d+)(.*)", jql)
+        if window:
+            first_id, last_id = int(window.group(2)), int(window.group(3))
+            jql = window.group(1) + window.group(4)
+        order = re.search(r" ORDER BY id (ASC|DESC)$", jql)
+        if order:
+            jql = jql[:order.start()]
+        if jql.startswith("(") and jql.endswith(")"):
+            jql = jql[1:-1]
+        if jql.endswith(f" AND project != {PROJECT_KEY}"):
+            return []
+        scoped = re.fullmatch(r'issue in requirementsPath\("(.*)"\)', jql)
+        issues = self._requirements_path_issues(scoped.group(1)) if scoped else self.project.issues
+        if window:
+            issues = [issue for issue in issues if first_id <= int(issue["id"]) <= last_id]
+        if order:
+            issues = sorted(issues, key=lambda issue: int(issue["id"]), reverse=order.group(1) == "DESC")
+        return issues
+
+    def search_issues(self, request):
+        query = parse_qs(urlsplit(request.url).query)
+        with_comments = "comment" in query.get("fields", [""])[0].split(",")
+        if "startAt" not in query and not with_comments:
+            return _response(request, 200, content=self._search_content)
+        issues = self._jql_issues(query["jql"][0])
+        if "startAt" not in query:
+            issues = [_with_comments(issue) for issue in issues]
+            return _response(request, 200, {"startAt": 0, "maxResults": len(issues), "total": len(issues),
+                                            "issues": issues})
+        start_at = int(query["startAt"][0])
+        max_results = int(query["maxResults"][0])
+        page = issues[start_at:start_at + max_results]
+        if with_comments:
+            page = [_with_comments(issue) for issue in page]
+        return _response(request, 200, {"startAt": start_at, "maxResults": max_results,
+                                        "total": len(issues), "issues": page})
+
+    def get_issue_comments(self, request, issue_id):
+        query = parse_qs(urlsplit(request.url).query)
+        comments = _issue_comments(int(issue_id))
+        start_at = int(query["startAt"][0])
+        max_results = int(query["maxResults"][0])
+        return _response(request, 200, {"startAt": start_at, "maxResults": max_results, "total": len(comments),
+                                        "comments": comments[start_at:start_at + max_results]})
+
+    def get_tree(self, request):
+        return _response(request, 200, content=self._tree_content)
+
+    def get_ado_projects(self, request):
+        return _response(request, 200, {"count": 1, "value": [{"id": ADO_PROJECT_ID, "name": PROJECT_NAME}]})
+
+    def get_ado_project(self, request):
+        return _response(request, 200, {"id": ADO_PROJECT_ID, "name": PROJECT_NAME})
+
+    def get_work_item_types(self, request):
+        return _response(request, 200, {"count": len(self.work_item_types), "value": self.work_item_types})
+
+    def get_work_item_relation_types(self, request):
+        return _response(request, 200, {"count": len(self.relation_types), "value": self.relation_types})
+
+    def query_by_wiql(self, request):
+        ids = [*self._existing_by_id, *self.work_items]
+        query = json.loads(request.body)["query"]
+        after = re.search(r"\[System\.Id\] > (\d+)", query)
+        if after:
+            ids = sorted(item_id for item_id in ids if item_id > int(after.group(1)))
+        top = parse_qs(urlsplit(request.url).query).get("top")
+        if top:
+            ids = ids[:int(top[0])]
+        return _response(request, 200, {"workItems": [{"id": item_id} for item_id in ids]})
+
+    def get_work_items_batch(self, request):
+        body = json.loads(request.body)
+        items = [self._existing_by_id.get(item_id) or self.work_items.get(item_id) for item_id in body["ids"]]
+        return _response(request, 200, {"count": len(items), "value": [item for item in items if item]})
+
+    def create_work_item(self, request, work_item_type):
+        body = json.loads(request.body)
+        fields = {operation["path"].split("/")[-1]: operation["value"] for operation in body
+                  if operation["path"].startswith("/fields/")}
+        fields.setdefault("System.State", "New")
+        fields["System.WorkItemType"] = work_item_type
+        relations = [operation["value"] for operation in body if operation["path"] == "/relations/-"]
+        with self._lock:
+            work_item = {"id": self._next_work_item_id, "fields": fields, "relations": relations}
+            self._next_work_item_id += 1
+            self.work_items[work_item["id"]] = work_item
+        return _response(request, 200, work_item)
+
+    def get_work_item(self, request, work_item_id):
+        work_item = self.work_items.get(int(work_item_id)) or self._existing_by_id.get(int(work_item_id))
+        if work_item is None:
+            return _response(request, 404, {"message": f"Work item {work_item_id} does not exist"})
+        return _response(request, 200, work_item)
+
+    def update_work_item(self, request, work_item_id):
+        work_item = self.work_items.get(int(work_item_id))
+        if work_item is None:
+            return _response(request, 404, {"message": f"Work item {work_item_id} does not exist"})
+        for operation in json.loads(request.body):
+            if operation["path"].startswith("/fields/"):
+                work_item["fields"][operation["path"].split("/")[-1]] = operation["value"]
+            elif operation["path"] == "/relations/-":
+                work_item.setdefault("relations", []).append(operation["value"])
+        return _response(request, 200, work_item)
+
+    def delete_work_items(self, request):
+        body = json.loads(request.body)
+        results = []
+        with self._lock:
+            for work_item_id in body["ids"]:
+                deleted = self.work_items.pop(work_item_id, None) or self._existing_by_id.pop(work_item_id, None)
+                results.append({"id": work_item_id, "code": 200 if deleted else 404})
+        return _response(request, 200, {"value": results})
+
+    def add_work_item_comment(self, request, work_item_id):
+        body = json.loads(request.body)
+        with self._lock:
+            comments = self.comments.setdefault(int(work_item_id), [])
+            comment = {"id": len(comments) + 1, "workItemId": int(work_item_id), "text": body["text"]}
+            comments.append(comment)
+        return _response(request, 200, comment)
+
+    def create_attachment(self, request):
+        with self._lock:
+            attachment_id = f"attachment-{self._next_attachment_id}"
+            self._next_attachment_id += 1
+            self.attachments[attachment_id] = len(request.body or b"")
+        return _response(request, 201, {"id": attachment_id, "url": f"{ADO_URL}/_apis/wit/attachments/{attachment_id}"})
+
+    def upload_attachment_chunk(self, request, attachment_id):
+        with self._lock:
+            self.attachments[attachment_id] = self.attachments.get(attachment_id, 0) + len(request.body)
+        return _response(request, 201, {"id": attachment_id, "url": f"{ADO_URL}/_apis/wit/attachments/{attachment_id}"})
+
+    def download_attachment(self, request):
+        return _response(request, 200, content=b"\0" * ATTACHMENT_SIZE)
+
+    def get_folder_settings(self, request):
+        return _response(request, 200, {"value": {"folderSettings": {"folderItemType": FOLDER_WORK_ITEM_TYPE}}})
+
+    def create_tree_item(self, request):
+        body = json.loads(request.body)
+        with self._lock:
+            self.tree_items[str(body["id"])] = body
+        return _response(request, 200, body)
+
+    def get_tree_items(self, request):
+        return _response(request, 200, {"count": len(self.tree_items), "value": list(self.tree_items.values())})
+
+    def delete_tree_item(self, request, item_id):
+        with self._lock:
+            self.tree_items.pop(item_id, None)
+        return _response(request, 204)
+
+
+class StubAdapter(BaseAdapter):
+    """
+    Transport adapter that answers the requests of a ``requests.Session`` with a StubServer.
+
+    Args:
+        server (StubServer): The server answering the requests.
+    """
+
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+
+    def send(self, request, **kwargs):
+        return self.server.handle(request)
+
+    def close(self):
+        pass
+
+
+def install_stub_server(project, latency=0):
+    """
+    Mount a StubServer on the sessions used by the Jira DC and Azure DevOps consumers.
+
+    Args:
+        project (SyntheticProject): The project served by the stubs.
+        latency (float): Seconds each response is delayed by.
+
+    Returns:
+        StubServer: The installed server.
+    """
+    from api.azure_dev_ops import api as ado_api_module
+    from api.data_center import api as data_center_api_module
+
+    server = StubServer(project, latency)
+    adapter = StubAdapter(server)
+    for session in (ado_api_module.session, data_center_api_module.session):
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return server
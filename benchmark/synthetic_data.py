@@ -0,0 +1,134 @@
+"""Generates synthetic R4J trees, Jira issues and ADO work items for the benchmarks"""
+import random
+
+from utilities.origin_marker import MIGRATED_TAG, ORIGIN_TAG_PREFIX
+from utilities.wiki_markup import description_to_html
+
+SHAPES = ("wide", "deep", "mixed")
+PROJECT_NAME = "Benchmark Project"
+PROJECT_KEY = "BENCH"
+ISSUE_TYPES = ("Story", "Bug", "Task", "Epic")
+STATUSES = ("Draft", "In Progress", "Reopened", "To Do", "Done")
+LINK_NAMES = ("relates to", "derives to", "derives from", "trace to", "trace from", "is tested by", "tests")
+DESCRIPTION = "As a user I want the requirement {0} so that the\xa0acceptance criteria are met."
+
+WIDE_ROOT_FOLDERS = 10
+DEEP_MAX_LEVEL = 64
+MIXED_MAX_LEVEL = 16
+MIXED_FOLDER_RATIO = 0.15
+EXTRA_ISSUES_RATIO = 0.1
+EXISTING_WORK_ITEMS_RATIO = 0.1
+LINKS_RATIO = 0.2
+
+
+class SyntheticProject:
+    """
+    A synthetic project with the same payload shapes as the Jira DC, R4J and ADO REST APIs.
+
+    Attributes:
+        tree (dict): The R4J tree as returned by the R4J tree endpoint.
+        issues (list): The Jira issues as returned by the Jira search endpoint.
+        ado_work_items (list): Work items already on ADO, as returned by the workitemsbatch endpoint.
+        node_count (int): Number of folders and issues in the tree.
+    """
+
+    def __init__(self, tree, issues, ado_work_items, node_count):
+        self.tree = tree
+        self.issues = issues
+        self.ado_work_items = ado_work_items
+        self.node_count = node_count
+
+
+def _new_folder(folder_id, position):
+    return {"id": folder_id, "name": f"Folder {folder_id}", "description": DESCRIPTION.format(folder_id),
+            "absolutePosition": position, "folders": [], "issues": []}
+
+
+def _new_tree_issue(issue_id, position):
+    return {"issueId": issue_id, "key": f"{PROJECT_KEY}-{issue_id}", "summary": f"Requirement {issue_id}",
+            "absolutePosition": position, "childReqs": {"childReq": []}}
+
+
+def _new_jira_issue(issue_id, rng):
+    return {"id": str(issue_id), "key": f"{PROJECT_KEY}-{issue_id}",
+            "fields": {"summary": f"Requirement {issue_id}", "description": DESCRIPTION.format(issue_id),
+                       "status": {"name": rng.choice(STATUSES)}, "issuetype": {"name": rng.choice(ISSUE_TYPES)},
+                       "issuelinks": []}}
+
+
+def _children(container):
+    return container["childReqs"]["childReq"] if "issueId" in container else container["issues"]
+
+
+def _choose_parent(shape, rng, containers, levels):
+    """Pick the container that receives the next node and whether the new node is a folder."""
+    if shape == "wide":
+        if len(containers) <= WIDE_ROOT_FOLDERS:
+            return containers[0], True
+        return containers[rng.randint(1, WIDE_ROOT_FOLDERS)], False
+    if shape == "deep":
+        parent = containers[-1]
+        if levels[id(parent)] >= DEEP_MAX_LEVEL:
+            parent = containers[0]
+        is_folder = "issueId" not in parent and rng.random() < 0.5
+        return parent, is_folder
+    parent = containers[-rng.randint(1, min(len(containers), 32))]
+    while levels[id(parent)] >= MIXED_MAX_LEVEL:
+        parent = containers[rng.randrange(len(containers))]
+    is_folder = "issueId" not in parent and rng.random() < MIXED_FOLDER_RATIO
+    return parent, is_folder
+
+
+def generate_project(size, shape, seed=0):
+    """
+    Generate a synthetic project with a tree of the given size and shape.
+
+    Args:
+        size (int): Number of folders and issues in the tree.
+        shape (str): One of 'wide' (few root folders with many issues), 'deep' (long chains of folders and
+            child requirements) or 'mixed' (random branching).
+        seed (int): Seed of the random generator, the same arguments always generate the same project.
+
+    Returns:
+        SyntheticProject: The generated project.
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown tree shape {shape}, expected one of {SHAPES}")
+    rng = random.Random(f"{seed}-{size}-{shape}")
+    tree = {"id": -1, "folders": [], "issues": []}
+    containers = [tree]
+    levels = {id(tree): 0}
+    issues = []
+    next_id = 1
+    for _ in range(size):
+        parent, is_folder = _choose_parent(shape, rng, containers, levels)
+        if is_folder:
+            node = _new_folder(next_id, len(parent["folders"]))
+            parent["folders"].append(node)
+        else:
+            node = _new_tree_issue(next_id, len(_children(parent)))
+            _children(parent).append(node)
+            issues.append(_new_jira_issue(next_id, rng))
+        levels[id(node)] = levels[id(parent)] + 1
+        containers.append(node)
+        next_id += 1
+
+    for _ in range(int(size * EXTRA_ISSUES_RATIO)):
+        issues.append(_new_jira_issue(next_id, rng))
+        next_id += 1
+
+    for issue in rng.sample(issues, int(len(issues) * LINKS_RATIO)):
+        target = rng.choice(issues)
+        issue["fields"]["issuelinks"].append({"type": {"outward": rng.choice(LINK_NAMES)},
+                                              "outwardIssue": {"id": target["id"], "key": target["key"]}})
+
+    ado_work_items = []
+    for index, issue in enumerate(rng.sample(issues, int(len(issues) * EXISTING_WORK_ITEMS_RATIO))):
+        ado_work_items.append({"id": 900000 + index,
+                               "fields": {"System.Title": issue["fields"]["summary"],
+                                          "System.Description": description_to_html(
+                                              issue["fields"]["description"]),
+                                          "System.State": "New",
+                                          "System.Tags": f"{MIGRATED_TAG}; {ORIGIN_TAG_PREFIX}issue-{issue['id']}"}})
+    rng.shuffle(issues)
+    return SyntheticProject(tree, issues, ado_work_items, size)
@@ -21,6 +21,8 @@ class AdoSettings:
         self.issue_type_map = env_settings['issue_type_map'] if 'issue_type_map' in env_settings else {}
         self.status_map = env_settings['status_map'] if 'status_map' in env_settings else {}
         self.link_type_map = env_settings['link_type_map'] if 'link_type_map' in env_settings else {}
+        self.field_map = env_settings['field_map'] if env_settings.get('field_map') else []
+        self.origin_field = env_settings['origin_field'] if env_settings.get('origin_field') else None
 
 
 class DataCenterSettings:
@@ -37,5 +39,72 @@ class DataCenterSettings:
             self.pat = ''
 
 
+class RunSettings:
+
+    def __init__(self, env_yml_file):
+        env_obj = read_yaml_file(env_yml_file)
+        env_settings = env_obj['settings']['run_env'] if env_obj['settings'].get('run_env') else {}
+        self.prometheus_metrics = env_settings['prometheus_metrics'] if 'prometheus_metrics' in env_settings \
+            else False
+        self.prometheus_port = env_settings['prometheus_port'] if 'prometheus_port' in env_settings else None
+        self.pipeline = env_settings['pipeline'] if 'pipeline' in env_settings else False
+        self.concurrency = env_settings['concurrency'] if 'concurrency' in env_settings else 4
+        self.queue_size = env_settings['queue_size'] if 'queue_size' in env_settings else 1000
+        self.host_concurrency = env_settings['host_concurrency'] if 'host_concurrency' in env_settings else 8
+        self.request_queue_depth = env_settings['request_queue_depth'] \
+            if 'request_queue_depth' in env_settings else 16
+        self.issues_page_size = env_settings['issues_page_size'] if 'issues_page_size' in env_settings else 1000
+        self.issue_query_plan = env_settings['issue_query_plan'] if 'issue_query_plan' in env_settings else True
+        self.issue_query_concurrency = env_settings['issue_query_concurrency'] \
+            if 'issue_query_concurrency' in env_settings else 4
+        self.migrate_attachments = env_settings['migrate_attachments'] if 'migrate_attachments' in env_settings \
+            else False
+        self.attachment_concurrency = env_settings['attachment_concurrency'] \
+            if 'attachment_concurrency' in env_settings else 4
+        self.attachment_chunk_size = env_settings['attachment_chunk_size'] \
+            if 'attachment_chunk_size' in env_settings else 8 * 1024 * 1024
+        self.attachment_relations_batch = env_settings['attachment_relations_batch'] \
+            if 'attachment_relations_batch' in env_settings else 50
+        self.attachment_record_file = env_settings['attachment_record_file'] \
+            if 'attachment_record_file' in env_settings else './report/failed_attachments.jsonl'
+        self.migrate_comments = env_settings['migrate_comments'] if 'migrate_comments' in env_settings else False
+        self.comment_concurrency = env_settings['comment_concurrency'] \
+            if 'comment_concurrency' in env_settings else 4
+        self.comment_record_file = env_settings['comment_record_file'] if 'comment_record_file' in env_settings \
+            else './report/migrated_comments.jsonl'
+        self.legacy_resume_matching = env_settings['legacy_resume_matching'] \
+            if 'legacy_resume_matching' in env_settings else False
+        self.cache_ttl = env_settings['cache_ttl'] if 'cache_ttl' in env_settings else 3600
+        self.cache_size = env_settings['cache_size'] if 'cache_size' in env_settings else 256
+        self.cache_file = env_settings['cache_file'] if 'cache_file' in env_settings else None
+        self.json_codec = env_settings['json_codec'] if 'json_codec' in env_settings else 'auto'
+        self.run_record_file = env_settings['run_record_file'] if 'run_record_file' in env_settings \
+            else './report/created_work_items.jsonl'
+        self.verify_migration = env_settings['verify_migration'] if 'verify_migration' in env_settings else False
+        self.working_set = env_settings['working_set'] if 'working_set' in env_settings else 'memory'
+        self.working_set_file = env_settings['working_set_file'] if 'working_set_file' in env_settings \
+            else './report/working_set.sqlite'
+        self.id_registry_file = env_settings['id_registry_file'] if 'id_registry_file' in env_settings \
+            else './report/id_registry.sqlite'
+        self.convert_wiki_markup = env_settings['convert_wiki_markup'] if 'convert_wiki_markup' in env_settings \
+            else True
+        self.markup_workers = env_settings['markup_workers'] if 'markup_workers' in env_settings else None
+        self.shard_file = env_settings['shard_file'] if 'shard_file' in env_settings else './report/shards.sqlite'
+        self.shard_size = env_settings['shard_size'] if 'shard_size' in env_settings else 5000
+        self.shard_journal_mode = env_settings['shard_journal_mode'] if 'shard_journal_mode' in env_settings \
+            else 'wal'
+        self.shard_lease_seconds = env_settings['shard_lease_seconds'] if 'shard_lease_seconds' in env_settings \
+            else 600
+        self.http_mode = env_settings['http_mode'] if 'http_mode' in env_settings else 'live'
+        self.http_cassette = env_settings['http_cassette'] if 'http_cassette' in env_settings else None
+        self.replay_latency_scale = env_settings['replay_latency_scale'] \
+            if 'replay_latency_scale' in env_settings else 1.0
+        self.verify_mappings = env_settings['verify_mappings'] if 'verify_mappings' in env_settings else True
+        self.verify_tree = env_settings['verify_tree'] if 'verify_tree' in env_settings else True
+        self.progress = env_settings['progress'] if 'progress' in env_settings else 'auto'
+        self.progress_interval = env_settings['progress_interval'] if 'progress_interval' in env_settings else None
+
+
 ADO_ENV = AdoSettings(env_yml_file=YML_ENV)
 DC_ENV = DataCenterSettings(env_yml_file=YML_ENV)
+RUN_ENV = RunSettings(env_yml_file=YML_ENV)
@@ -1,10 +1,15 @@
 import sys
+from report.profiler import run_profiled, split_profile_argument
 from utilities import run_clean
 
 if __name__ == '__main__':
-    if len(sys.argv) == 2:
-        project_key = sys.argv[1]
+    arguments, profile = split_profile_argument(sys.argv[1:])
+    if len(arguments) == 1:
+        project_key = arguments[0]
         # should be change
-        run_clean(project_key)
+        if profile:
+            run_profiled("clean_tree_profile", run_clean, project_key)
+        else:
+            run_clean(project_key)
     else:
-        print("{project_key} is required. Usage: python ease_requirements_clean_tree.py {project_key}")
+        print("{project_key} is required. Usage: python ease_requirements_clean_tree.py {project_key} [--profile]")
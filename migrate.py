@@ -1,15 +1,40 @@
 import sys
-from utilities import run_migration
+from report.profiler import run_profiled, split_profile_argument
+from utilities import MigrationScope, pop_option, run_migration
+
+USAGE = "Usage: python migrate.py <project_name> <dry_run> [--folder <folder_id> | --path <folder/path>] " \
+        "[--parent <work_item_id>] [--profile]"
+
 
 if __name__ == '__main__':
-    if len(sys.argv) == 3:
-        project_name = sys.argv[1]
-        dry_run: bool = sys.argv[2].lower() in ["true", "t", "1"] if sys.argv[2] is not None else False
+    arguments, profile = split_profile_argument(sys.argv[1:])
+    folder_id = pop_option(arguments, "--folder", USAGE)
+    folder_path = pop_option(arguments, "--path", USAGE)
+    parent_id = pop_option(arguments, "--parent", USAGE)
+    scope = None
+    if folder_id is not None or folder_path is not None:
+        if folder_id is not None and folder_path is not None:
+            print(f"Give either --folder or --path. {USAGE}")
+            sys.exit()
+        scope = MigrationScope(int(folder_id) if folder_id is not None else None, folder_path,
+                               int(parent_id) if parent_id is not None else None)
+    elif parent_id is not None:
+        print(f"--parent needs --folder or --path. {USAGE}")
+        sys.exit()
+    if len(arguments) == 2:
+        project_name = arguments[0]
+        dry_run: bool = arguments[1].lower() in ["true", "t", "1"] if arguments[1] is not None else False
         print(f"Project key: {project_name}, Dry run: {dry_run}")
-        run_migration(project_name, dry_run)
-    elif len(sys.argv) == 2:
-        project_name = sys.argv[1]
+    elif len(arguments) == 1:
+        project_name = arguments[0]
+        dry_run = False
         print(f"Project name: {project_name}, Dry run: {False}")
-        run_migration(project_name, False)
     else:
-        print("Project name is required. Usage: python migrate.py <project_name> <dry_run>")
+        print(f"Project name is required. {USAGE}")
+        sys.exit()
+    if scope is not None:
+        print(f"Scope: {scope}")
+    if profile:
+        run_profiled("migration_profile", run_migration, project_name, dry_run, scope)
+    else:
+        run_migration(project_name, dry_run, scope)
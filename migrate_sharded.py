@@ -0,0 +1,27 @@
+import sys
+from report.profiler import run_profiled, split_profile_argument
+from utilities import finish_sharded_migration, plan_sharded_migration, pop_option, run_shard_worker
+
+USAGE = "Usage: python migrate_sharded.py <plan|work|finish> <project_name> [--shard-size <nodes>] " \
+        "[--worker <name>] [--profile]"
+
+
+if __name__ == '__main__':
+    arguments, profile = split_profile_argument(sys.argv[1:])
+    shard_size = pop_option(arguments, "--shard-size", USAGE)
+    worker_name = pop_option(arguments, "--worker", USAGE)
+    if len(arguments) != 2 or arguments[0] not in ("plan", "work", "finish"):
+        print(USAGE)
+        sys.exit()
+    command, project_name = arguments
+    print(f"Project name: {project_name}, Step: {command}")
+    if command == "plan":
+        function, function_arguments = plan_sharded_migration, (project_name, int(shard_size) if shard_size else None)
+    elif command == "work":
+        function, function_arguments = run_shard_worker, (project_name, worker_name)
+    else:
+        function, function_arguments = finish_sharded_migration, (project_name,)
+    if profile:
+        run_profiled(f"sharded_{command}_profile", function, *function_arguments)
+    else:
+        function(*function_arguments)
@@ -2,6 +2,8 @@ import logging
 import webbrowser
 import os
 
+from report.progress import PROGRESS
+
 UL_OPEM = "<ul>"
 UL_CLOSE = "</ul>"
 LI_OPEN = "<li>"
@@ -20,6 +22,13 @@ HEADER = '<header><h1>R4J Data Center Migration to Azure DevOps</h1><h2>Expected
 NOTE = ''
 
 
+def _print(message):
+    if PROGRESS.active:
+        PROGRESS.write(message)
+    else:
+        print(message)
+
+
 def initialize_logging(file_name):
     """
         Initialize the logging file to save the log of the script.
@@ -57,7 +66,7 @@ def write_logging_server_response(response, message, error=False, type_error=Non
     response_content = f"\t\tResponse content: {response.json()}" \
         if response.status_code < 400 else f"\t\t{response.content}"
     if not error:
-        print(f"\t{message}")
+        _print(f"\t{message}")
         logging.info(f"\t{message}")
         logging.info(method_status_endpoint)
         if response.request.method == "POST":
@@ -81,7 +90,7 @@ def write_logging_dry_run_message(message, request_body):
     Returns:
         None
     """
-    print(f"\t{message}")
+    _print(f"\t{message}")
     logging.info(f"\t{message}")
     logging.info(f"\t\tRequest body: {request_body}")
 
@@ -96,7 +105,23 @@ def write_logging_simple_message(message):
     Returns:
         None
     """
-    print(message)
+    _print(message)
+    logging.info(message)
+
+
+def write_logging_item_message(message):
+    """
+    Write log with the message of a single item, e.g. a tree item created. While the progress display runs, the
+    message is only written to the log file.
+
+    Args:
+        message (str): Log message
+
+    Returns:
+        None
+    """
+    if not PROGRESS.active:
+        print(message)
     logging.info(message)
 
 
@@ -110,7 +135,7 @@ def write_logging_error(message):
     Returns:
         None
     """
-    print(f"ERROR: {message}")
+    _print(f"ERROR: {message}")
     logging.error(message)    
 
 
@@ -119,13 +144,13 @@ def create_item_on_current_level(data, a_label):
     Create html item based on current level
 
     Args:
-        data (dict): Item data
+        data (TreeNode): Item data
         a_label (str): Specify if it is a Folder or an Issue/WorkItem
 
     Returns:
         report_html (str): Html with the item
     """
-    issue_title = data['summary'] if data.get('issue_key') else data['folder_name']
+    issue_title = data.title
     report_html = f"{LI_CLOSE}{LI_OPEN}{a_label} {issue_title}{CLOSE_A}"
     return report_html
 
@@ -135,13 +160,13 @@ def create_item_on_next_level(data, a_label):
     Create html item based on next level
 
     Args:
-        data (dict): Item data
+        data (TreeNode): Item data
         a_label (str): Specify if it is a Folder or an Issue/WorkItem
 
     Returns:
         report_html (str): Html with the item
     """
-    issue_title = data['summary'] if data.get('issue_key') else data['folder_name']
+    issue_title = data.title
     report_html = f"{UL_OPEM}{LI_OPEN}{a_label} {issue_title}{CLOSE_A}"
     return report_html
 
@@ -151,14 +176,14 @@ def create_item_on_previous_level(data, a_label, level_difference):
     Create html item based on previous level
 
     Args:
-        data (dict): Item data
+        data (TreeNode): Item data
         a_label (str): Specify if it is a Folder or an Issue/WorkItem
         level_difference (int): Level difference
 
     Returns:
         report_html (str): Html with the item
     """
-    issue_title = data['summary'] if data.get('issue_key') else data['folder_name']
+    issue_title = data.title
     close_level = f"{LI_CLOSE}{UL_CLOSE}" * level_difference
     report_html = f"{close_level}{LI_OPEN}{a_label}  {issue_title}{CLOSE_A}"
     return report_html
@@ -170,7 +195,7 @@ def generate_expected_tree_html(path, issue_process_list, project_key):
 
     Args:
         path (str): Path to generate the expected tree html.
-        issue_process_list (list): List with all jira issues and Azure DevOps work items.
+        issue_process_list (list): List with the TreeNode of all jira issues and Azure DevOps work items.
         project_key (str): The jey of the project
 
     Returns:
@@ -180,15 +205,15 @@ def generate_expected_tree_html(path, issue_process_list, project_key):
     current_level = 0
     final_level = 0
     for data in issue_process_list:
-        a_label = OPEN_A_FOLDER if "folder" in data.keys() else OPEN_A
-        if data["level"] == current_level:
+        a_label = OPEN_A_FOLDER if data.is_folder else OPEN_A
+        if data.level == current_level:
             report_html += create_item_on_current_level(data, a_label)
-        if data['level'] > current_level:
+        if data.level > current_level:
             report_html += create_item_on_next_level(data, a_label)
-        if data['level'] < current_level:
-            level_difference = (current_level - data['level'])
+        if data.level < current_level:
+            level_difference = (current_level - data.level)
             report_html += create_item_on_previous_level(data, a_label, level_difference)
-        current_level = data["level"]
+        current_level = data.level
         final_level = current_level
 
     repeat = final_level + 1
@@ -0,0 +1,358 @@
+"""Collects per-phase timings and request metrics of a run and writes them as JSON and Prometheus text"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+METRIC_PREFIX = "r4j_migration"
+PERCENTILES = (50, 90, 95, 99)
+ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$")
+
+
+def endpoint_name(method, url):
+    """
+    Build a stable endpoint name from a request, replacing the numeric ids and GUIDs of the path by {id}.
+
+    Args:
+        method (str): HTTP method of the request.
+        url (str): URL of the request.
+
+    Returns:
+        str: The endpoint name, e.g. 'PATCH dev.azure.com/org/project/_apis/wit/workitems/{id}'.
+    """
+    parts = urlsplit(url)
+    segments = [("{id}" if ID_SEGMENT.match(segment) else segment) for segment in unquote(parts.path).split("/")]
+    return f"{method} {parts.netloc}{'/'.join(segments)}"
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def percentile(sorted_values, rank):
+    """
+    Nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_values (list): The sorted values.
+        rank (int): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile value, None for an empty list.
+    """
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(rank / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class EndpointStats:
+    """Request counters and latencies of one endpoint."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.status_codes = {}
+        self.latencies = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        summary = {"count": self.count, "errors": self.errors, "status_codes": self.status_codes,
+                   "bytes_sent": self.bytes_sent, "bytes_received": self.bytes_received,
+                   "latency_total_seconds": sum(latencies),
+                   "latency_max_seconds": latencies[-1] if latencies else None}
+        for rank in PERCENTILES:
+            summary[f"latency_p{rank}_seconds"] = percentile(latencies, rank)
+        return summary
+
+
+class MetricsRecorder:
+    """
+    Thread safe recorder of the phases, requests and retries of a run.
+
+    Attributes:
+        current_phase (str): Name of the phase running now, None outside of any phase.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.run_start = time.time()
+            self.current_phase = None
+            self._phase_start = None
+            self.phases = []
+            self.endpoints = {}
+            self.retries = {}
+            self.queue_waits = {}
+
+    def start_phase(self, name):
+        """
+        Start timing a phase, ending the phase currently running.
+
+        Args:
+            name (str): Name of the phase.
+        """
+        self.end_phase()
+        with self._lock:
+            self.current_phase = name
+            self._phase_start = time.perf_counter()
+            self.phases.append({"phase": name, "seconds": None, "requests": 0, "errors": 0, "retries": 0})
+
+    def end_phase(self):
+        """End the phase currently running, if any."""
+        with self._lock:
+            if self.current_phase is not None:
+                self.phases[-1]["seconds"] = time.perf_counter() - self._phase_start
+            self.current_phase = None
+
+    def record_response(self, response, *args, **kwargs):
+        """
+        Record a response, to be registered as a 'response' hook of a requests session.
+
+        Args:
+            response (Response): The response received.
+        """
+        request = response.request
+        name = endpoint_name(request.method, request.url)
+        body = request.body
+        bytes_sent = len(body) if isinstance(body, (bytes, str)) else 0
+        if kwargs.get("stream"):
+            bytes_received = int(response.headers.get("Content-Length", 0))
+        else:
+            bytes_received = len(response.content or b"")
+        with self._lock:
+            stats = self.endpoints.setdefault(name, EndpointStats())
+            stats.count += 1
+            stats.errors += 1 if response.status_code >= 400 else 0
+            status_code = str(response.status_code)
+            stats.status_codes[status_code] = stats.status_codes.get(status_code, 0) + 1
+            stats.latencies.append(response.elapsed.total_seconds())
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            if self.current_phase is not None:
+                self.phases[-1]["requests"] += 1
+                self.phases[-1]["errors"] += 1 if response.status_code >= 400 else 0
+
+    def record_retry(self, function_name):
+        """
+        Record the retry of a request.
+
+        Args:
+            function_name (str): Name of the helper function retried.
+        """
+        with self._lock:
+            self.retries[function_name] = self.retries.get(function_name, 0) + 1
+            if self.current_phase is not None:
+                self.phases[-1]["retries"] += 1
+
+    def record_queue_wait(self, priority_name, seconds):
+        """
+        Record the time a request waited for a slot of the request scheduler.
+
+        Args:
+            priority_name (str): Name of the priority class of the request.
+            seconds (float): Time waited.
+        """
+        with self._lock:
+            waits = self.queue_waits.setdefault(priority_name, {"requests": 0, "seconds": 0.0, "max_seconds": 0.0})
+            waits["requests"] += 1
+            waits["seconds"] += seconds
+            waits["max_seconds"] = max(waits["max_seconds"], seconds)
+
+    def current_phase_counts(self):
+        """
+        The counts of the phase running now, without building the whole summary.
+
+        Returns:
+            dict: The name, seconds, requests, errors and retries of the phase, None outside of any phase.
+        """
+        with self._lock:
+            if self.current_phase is None:
+                return None
+            phase = dict(self.phases[-1])
+            phase["seconds"] = time.perf_counter() - self._phase_start
+            return phase
+
+    def host_latencies(self):
+        """
+        The median latency of the requests sent to each host.
+
+        Returns:
+            dict: The latency in seconds by host.
+        """
+        latencies = {}
+        with self._lock:
+            for name, stats in self.endpoints.items():
+                host = name.split(" ", 1)[1].split("/", 1)[0]
+                latencies.setdefault(host, []).extend(stats.latencies)
+        return {host: percentile(sorted(values), 50) for host, values in latencies.items() if values}
+
+    def summary(self):
+        """
+        Build the machine-readable report of the run.
+
+        Returns:
+            dict: The phases, endpoints, retries and scheduler waits of the run.
+        """
+        with self._lock:
+            phases = [dict(phase) for phase in self.phases]
+            if self.current_phase is not None:
+                phases[-1]["seconds"] = time.perf_counter() - self._phase_start
+            return {"run_start": self.run_start, "run_seconds": time.time() - self.run_start,
+                    "phases": phases,
+                    "endpoints": {name: stats.summary() for name, stats in sorted(self.endpoints.items())},
+                    "retries": dict(self.retries),
+                    "queue_waits": {name: dict(waits) for name, waits in self.queue_waits.items()}}
+
+    def prometheus_text(self):
+        """
+        Build the metrics of the run in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics text.
+        """
+        summary = self.summary()
+        lines = [f"# TYPE {METRIC_PREFIX}_phase_duration_seconds gauge"]
+        for phase in summary["phases"]:
+            if phase["seconds"] is not None:
+                lines.append(f'{METRIC_PREFIX}_phase_duration_seconds{{phase="{_label(phase["phase"])}"}} {phase["seconds"]}')
+        lines.append(f"# TYPE {METRIC_PREFIX}_requests_total counter")
+        for name, stats in summary["endpoints"].items():
+            for status_code, count in stats["status_codes"].items():
+                lines.append(f'{METRIC_PREFIX}_requests_total{{endpoint="{_label(name)}",status="{status_code}"}} {count}')
+        lines.append(f"# TYPE {METRIC_PREFIX}_request_duration_seconds summary")
+        for name, stats in summary["endpoints"].items():
+            for rank in PERCENTILES:
+                lines.append(f'{METRIC_PREFIX}_request_duration_seconds{{endpoint="{_label(name)}",quantile="{rank / 100}"}} '
+                             f'{stats[f"latency_p{rank}_seconds"]}')
+            lines.append(f'{METRIC_PREFIX}_request_duration_seconds_sum{{endpoint="{_label(name)}"}} '
+                         f'{stats["latency_total_seconds"]}')
+            lines.append(f'{METRIC_PREFIX}_request_duration_seconds_count{{endpoint="{_label(name)}"}} {stats["count"]}')
+        for direction in ("sent", "received"):
+            lines.append(f"# TYPE {METRIC_PREFIX}_request_bytes_{direction}_total counter")
+            for name, stats in summary["endpoints"].items():
+                lines.append(f'{METRIC_PREFIX}_request_bytes_{direction}_total{{endpoint="{_label(name)}"}} '
+                             f'{stats[f"bytes_{direction}"]}')
+        lines.append(f"# TYPE {METRIC_PREFIX}_retries_total counter")
+        for function_name, count in summary["retries"].items():
+            lines.append(f'{METRIC_PREFIX}_retries_total{{function="{_label(function_name)}"}} {count}')
+        lines.append(f"# TYPE {METRIC_PREFIX}_queue_wait_seconds_total counter")
+        for priority_name, waits in summary["queue_waits"].items():
+            lines.append(f'{METRIC_PREFIX}_queue_wait_seconds_total{{priority="{priority_name}"}} {waits["seconds"]}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRecorder()
+
+
+def instrument_session(session):
+    """
+    Record every response received through a requests session.
+
+    Args:
+        session (Session): The session used by an uplink consumer.
+    """
+    session.hooks["response"].append(METRICS.record_response)
+
+
+def start_phase(name):
+    """
+    Start timing a phase of the run, ending the previous one.
+
+    Args:
+        name (str): Name of the phase.
+    """
+    METRICS.start_phase(name)
+
+
+def record_retry(function_name):
+    """
+    Record the retry of a request.
+
+    Args:
+        function_name (str): Name of the helper function retried.
+    """
+    METRICS.record_retry(function_name)
+
+
+def record_queue_wait(priority_name, seconds):
+    """
+    Record the time a request waited for a slot of the request scheduler.
+
+    Args:
+        priority_name (str): Name of the priority class of the request.
+        seconds (float): Time waited.
+    """
+    METRICS.record_queue_wait(priority_name, seconds)
+
+
+def write_metrics_report(file_name, prometheus=False):
+    """
+    End the current phase and write the metrics of the run under the report folder.
+
+    Args:
+        file_name (str): Base name of the files, e.g. 'migration' writes './report/migration_metrics.json'.
+        prometheus (bool): If True, also write './report/<file_name>_metrics.prom' in the Prometheus text format.
+
+    Returns:
+        dict: The metrics written.
+    """
+    METRICS.end_phase()
+    summary = METRICS.summary()
+    with open(f"./report/{file_name}_metrics.json", "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2)
+    if prometheus:
+        with open(f"./report/{file_name}_metrics.prom", "w", encoding="utf-8") as file:
+            file.write(METRICS.prometheus_text())
+    return summary
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        content = METRICS.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_prometheus_server(port, host="127.0.0.1"):
+    """
+    Serve the live metrics of the run on http://localhost:<port>/metrics from a daemon thread.
+
+    Args:
+        port (int): Port of the metrics server.
+        host (str): Interface the server listens on, only the local one by default.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer((host, port), _PrometheusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_prometheus_server(server):
+    """
+    Stop a metrics server and release its port, so the next run of the process can serve its metrics.
+
+    Args:
+        server (ThreadingHTTPServer): The server returned by start_prometheus_server.
+    """
+    server.shutdown()
+    server.server_close()
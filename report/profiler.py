@@ -0,0 +1,116 @@
+"""Profiles a run with cProfile and a sampling profiler tagged with the pipeline phase"""
+import cProfile
+import os
+import sys
+import threading
+import time
+
+from report.log_and_report import write_logging_simple_message
+from report.metrics import METRICS
+
+PROFILE_ARGUMENT = "--profile"
+SAMPLING_INTERVAL = 0.005
+
+
+def split_profile_argument(arguments):
+    """
+    Remove the profile flag from the command-line arguments.
+
+    Args:
+        arguments (list): The command-line arguments, without the script name.
+
+    Returns:
+        tuple: The arguments without the flag and True if the flag was given.
+    """
+    return [argument for argument in arguments if argument != PROFILE_ARGUMENT], PROFILE_ARGUMENT in arguments
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of a thread at a fixed interval and counts the collapsed stacks.
+
+    Every stack is prefixed with the phase of the run recorded by the metrics when the sample was taken, so a
+    flamegraph shows the time of each phase side by side.
+
+    Args:
+        thread_id (int): Identifier of the thread to sample.
+        default_phase (str): Tag of the samples taken outside of any phase.
+        interval (float): Seconds between two samples.
+    """
+
+    def __init__(self, thread_id, default_phase, interval=SAMPLING_INTERVAL):
+        self.thread_id = thread_id
+        self.default_phase = default_phase
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            names.append(f"phase:{METRICS.current_phase or self.default_phase}")
+            stack = ";".join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def write_collapsed(self, path):
+        """
+        Write the samples in the collapsed stack format read by flamegraph.pl and speedscope.
+
+        Args:
+            path (str): Path of the output file.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write(f"{stack} {count}\n")
+
+
+def run_profiled(file_name, function, *args):
+    """
+    Run a function under cProfile and the sampling profiler, writing the results under the report folder.
+
+    Writes './report/<file_name>.pstats', to be read with pstats or snakeviz, and
+    './report/<file_name>.collapsed', to be rendered as a flamegraph.
+
+    Args:
+        file_name (str): Base name of the output files.
+        function (function): The function to profile, e.g. run_migration.
+        *args: The arguments of the function.
+
+    Returns:
+        The result of the function.
+    """
+    sampler = SamplingProfiler(threading.get_ident(), function.__name__)
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    sampler.start()
+    profile.enable()
+    try:
+        return function(*args)
+    finally:
+        profile.disable()
+        sampler.stop()
+        pstats_path = f"./report/{file_name}.pstats"
+        collapsed_path = f"./report/{file_name}.collapsed"
+        profile.dump_stats(pstats_path)
+        sampler.write_collapsed(collapsed_path)
+        write_logging_simple_message(f"Profile of {time.perf_counter() - start:.2f} s written to {pstats_path} "
+                                     f"and {collapsed_path}")
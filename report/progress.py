@@ -0,0 +1,157 @@
+"""Shows the progress of the running phase: items done, request rate, errors, retries and estimated time left"""
+import sys
+import threading
+import time
+
+from config.config import RUN_ENV
+from report import metrics
+
+MODES = ("auto", "bar", "log", "quiet")
+# Default refresh period in seconds of each mode, a log line is printed less often than the bar is redrawn
+DEFAULT_INTERVALS = {"bar": 1.0, "log": 30.0}
+
+
+def _duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class ProgressDisplay:
+    """
+    Thread safe progress of the phases of a run, refreshed by a background thread.
+
+    The phase and its request, error and retry counts are read from the run metrics. The loops of a phase set
+    its number of items with track and count the items done with advance, which adds the done/total and the
+    estimated time left. The display replaces the per-item messages: while it runs, they are only logged.
+
+    Attributes:
+        active (bool): True between start and stop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._line_length = 0
+        self.active = False
+        self.mode = "quiet"
+        self._reset_phase(None)
+
+    def _reset_phase(self, phase):
+        self._phase = phase
+        self._total = None
+        self._done = 0
+        self._start = time.perf_counter()
+
+    def start(self):
+        """Start the display of the mode set in run_env.progress."""
+        if RUN_ENV.progress not in MODES:
+            raise ValueError(f"Unknown progress mode {RUN_ENV.progress}, use one of {', '.join(MODES)}")
+        self.stop()
+        self.mode = RUN_ENV.progress
+        if self.mode == "auto":
+            self.mode = "bar" if sys.stdout.isatty() else "log"
+        with self._lock:
+            self._reset_phase(None)
+            self.active = True
+        if self.mode != "quiet":
+            self._stopped.clear()
+            interval = RUN_ENV.progress_interval or DEFAULT_INTERVALS[self.mode]
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="progress", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the display, clearing the bar."""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._clear()
+            self.active = False
+
+    def track(self, total):
+        """
+        Set the number of items of the running phase.
+
+        Args:
+            total (int): The number of items, None when unknown.
+        """
+        with self._lock:
+            self._reset_phase(metrics.METRICS.current_phase)
+            self._total = total
+
+    def advance(self, count=1):
+        """
+        Count items done in the running phase.
+
+        Args:
+            count (int): The number of items done.
+        """
+        with self._lock:
+            self._done += count
+
+    def write(self, message):
+        """
+        Print a message above the bar.
+
+        Args:
+            message (str): The message.
+        """
+        with self._lock:
+            self._clear()
+            print(message, flush=True)
+
+    def line(self):
+        """
+        Build the progress line of the running phase.
+
+        Returns:
+            str: The line, None outside of any phase.
+        """
+        phase = metrics.METRICS.current_phase_counts()
+        if phase is None:
+            return None
+        with self._lock:
+            tracked = self._phase == phase["phase"]
+            done, total = (self._done, self._total) if tracked else (0, None)
+            elapsed = time.perf_counter() - self._start
+        parts = [f"{phase['phase']}:"]
+        if total:
+            parts.append(f"{done}/{total} ({100 * done / total:.1f}%)")
+        elif tracked:
+            parts.append(f"{done} done")
+        parts.append(f"{phase['requests'] / phase['seconds'] if phase['seconds'] else 0:.1f} req/s,")
+        parts.append(f"{phase['errors']} errors, {phase['retries']} retries,")
+        if total and done:
+            parts.append(f"ETA {_duration(elapsed * (total - done) / done)}")
+        else:
+            parts.append(f"elapsed {_duration(phase['seconds'])}")
+        return " ".join(parts)
+
+    def _clear(self):
+        if self._line_length:
+            sys.stdout.write("\r" + " " * self._line_length + "\r")
+            sys.stdout.flush()
+            self._line_length = 0
+
+    def _run(self, interval):
+        while not self._stopped.wait(interval):
+            line = self.line()
+            if line is None:
+                continue
+            with self._lock:
+                if self.mode == "bar":
+                    self._clear()
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+                    self._line_length = len(line)
+                else:
+                    print(line, flush=True)
+
+
+PROGRESS = ProgressDisplay()
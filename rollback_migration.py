@@ -0,0 +1,26 @@
+import sys
+from report.profiler import run_profiled, split_profile_argument
+from utilities import pop_option, run_rollback
+
+USAGE = ("Usage: python rollback_migration.py <project_name> [--record <record_file> [--run <run_id>|all]] [--destroy] "
+         "[--profile]")
+
+if __name__ == '__main__':
+    arguments, profile = split_profile_argument(sys.argv[1:])
+    destroy = "--destroy" in arguments
+    arguments = [argument for argument in arguments if argument != "--destroy"]
+    record_path = pop_option(arguments, "--record", USAGE)
+    run_id = pop_option(arguments, "--run", USAGE)
+    if run_id and not record_path:
+        print(f"--run needs --record. {USAGE}")
+        sys.exit()
+    if len(arguments) != 1:
+        print(f"Project name is required. {USAGE}")
+        sys.exit()
+    project_name = arguments[0]
+    run = f", Run: {run_id or 'latest'}" if record_path else ""
+    print(f"Project name: {project_name}, Record: {record_path or 'origin marker query'}{run}, Destroy: {destroy}")
+    if profile:
+        run_profiled("rollback_profile", run_rollback, project_name, record_path, destroy, run_id)
+    else:
+        run_rollback(project_name, record_path, destroy, run_id)
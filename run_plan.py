@@ -0,0 +1,17 @@
+import sys
+from report.profiler import run_profiled, split_profile_argument
+from utilities import run_request_plan
+
+USAGE = "Usage: python run_plan.py <plan_file> [--profile]"
+
+if __name__ == '__main__':
+    arguments, profile = split_profile_argument(sys.argv[1:])
+    if len(arguments) != 1:
+        print(f"Plan file is required. {USAGE}")
+        sys.exit()
+    plan_path = arguments[0]
+    print(f"Plan file: {plan_path}")
+    if profile:
+        run_profiled("plan_profile", run_request_plan, plan_path)
+    else:
+        run_request_plan(plan_path)
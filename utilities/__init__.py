@@ -1,4 +1,9 @@
 from utilities.transform_data import read_and_process_tree_items
 from utilities.run_migration import run_migration
+from utilities.migration_scope import MigrationScope
 from utilities.ease_requirements_functions import delete_tree_items_by_project_key
 from utilities.run_clean_tree import run_clean
+from utilities.run_rollback import run_rollback
+from utilities.sharding import finish_sharded_migration, plan_sharded_migration, run_shard_worker
+from utilities.request_plan import run_request_plan
+from utilities.command_line import pop_option
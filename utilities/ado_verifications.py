@@ -1,7 +1,14 @@
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from api.azure_dev_ops import ease_requirements_helper
 from api.azure_dev_ops import ado_helper
 from api.azure_dev_ops.api import ado_api
-from report.log_and_report import write_logging_server_response
+from config.config import ADO_ENV, RUN_ENV
+from report.log_and_report import (raise_an_error, write_logging_error, write_logging_server_response,
+                                   write_logging_simple_message)
+from utilities.field_mapping import get_work_item_template
+from utilities.origin_marker import get_migrated_work_item_ids, origin_key
+from utilities.wiki_markup import description_to_html
 import re
 
 
@@ -19,7 +26,10 @@ def verify_folder_work_item_type(organization, project_key):
     folder_work_item_type, response = ease_requirements_helper.get_folder_work_item_type(organization, project_key)
     if folder_work_item_type is not None:
         message = "Folder work item type is configured in ADO instance"
-        write_logging_server_response(response, message)
+        if response is not None:
+            write_logging_server_response(response, message)
+        else:
+            write_logging_simple_message(message)
         return True
     else:
         message = "FOLDER ISSUE TYPE ERROR: Folder work item type is not configured in cloud instance"
@@ -37,14 +47,18 @@ def verify_data_center_project_exists_in_ado(organization, project_key):
     Returns:
         bool: True if the project exists, False otherwise.
     """
-    response = ado_api.get_project_by_id_or_name(organization, project_key)
-    if response.status_code == 200 and response.json()["name"] == project_key:
-        message = "Project exists on ADO"
-        write_logging_server_response(response, message)
+    message = "ERROR: Project not found on Azure DevOps"
+    try:
+        project = ado_helper.get_project_by_id_or_name(organization, project_key)
+    except requests.exceptions.HTTPError as e:
+        write_logging_server_response(e.response, message, True, AssertionError)
+        return False
+    if project["name"] == project_key:
+        write_logging_simple_message("Project exists on ADO")
         return verify_r4ado_is_active_ado_organization(organization)
     else:
-        message = "ERROR: Project not found on Azure DevOps"
-        write_logging_server_response(response, message, True, AssertionError)
+        write_logging_error(message)
+        raise_an_error(message, AssertionError)
 
 
 def verify_r4ado_is_active_ado_organization(organization):
@@ -84,69 +98,211 @@ def verify_all_data_center_tree_issues_in_ado_instance(jira_ado_ids, tree_items_
     """
     Verifies all data center tree issues in the Azure DevOps (ADO) instance.
 
+    The Work Items created by previous runs are found by their origin marker with a query paged by id. When
+    legacy_resume_matching is enabled, the remaining items are matched by title and description with the Work
+    Items created without a marker.
+
     Args:
         jira_ado_ids (dict): A dictionary mapping JIRA IDs to ADO IDs.
-        tree_items_list (list): A list of tree items.
+        tree_items_list (list): A list of TreeNode.
         organization (str): The name of the organization.
         project (str): The name of the project.
 
     Returns:
         bool: True if all tree issues are verified, False otherwise.
     """
-    ado_work_items = ado_helper.get_all_work_items_in_project(organization, project)
-    if len(ado_work_items) != 0:
-        for index, issue in enumerate(tree_items_list):
-            issue["id"] = find_existing_work_items_on_ado(issue, ado_work_items['value'])
-            if issue["id"]:
-                tree_items_list[index] = issue
-                jira_ado_ids[str(issue["jira_id"])] = issue["id"]
+    migrated_ids = get_migrated_work_item_ids(organization, project)
+    for issue in tree_items_list:
+        issue.id = migrated_ids.get(origin_key(issue))
+        if issue.id:
+            jira_ado_ids[str(issue.jira_id)] = issue.id
+
+    if RUN_ENV.legacy_resume_matching and len(tree_items_list) != len(jira_ado_ids) - 1:
+        ado_work_items = ado_helper.get_all_work_items_in_project(organization, project)
+        if len(ado_work_items) != 0:
+            migrated = set(migrated_ids.values())
+            unmarked_work_items = [item for item in ado_work_items['value'] if item["id"] not in migrated]
+            for issue in tree_items_list:
+                if not issue.id:
+                    issue.id = find_existing_work_items_on_ado(issue, unmarked_work_items)
+                    if issue.id:
+                        jira_ado_ids[str(issue.jira_id)] = issue.id
     return len(tree_items_list) == len(jira_ado_ids) - 1
 
 
 def find_existing_work_items_on_ado(jira_issue, ado_work_items):
     """
-    Finds existing work items on Azure DevOps (ADO) based on JIRA issue data.
+    Finds existing work items on Azure DevOps (ADO) based on JIRA issue data, for the work items created
+    without an origin marker.
 
     Args:
-        jira_issue (dict): The JIRA issue data.
+        jira_issue (TreeNode): The JIRA folder or issue node.
         ado_work_items (list): A list of ADO work items.
 
     Returns:
         str: The ID of the existing work item if found, None otherwise.
     """
+    jira_description = description_to_html(jira_issue.description)
+    # The previous versions stored the raw wiki markup, where ADO escapes the non-breaking spaces
+    raw_description = (jira_issue.description or "").replace('\xa0', '&nbsp;')
     for item in ado_work_items:
-        title_key = "folder_name" if "folder_name" in jira_issue else "summary"
         ado_description = item["fields"]["System.Description"] if "System.Description" in item["fields"] else ""
-        if "folder_name" in jira_issue:
-            jira_description = jira_issue["folderData"]["description"] \
-                               if jira_issue["folderData"]["description"] else ""
-            if '\xa0' in jira_description:
-                jira_description = jira_description.replace('\xa0', '&nbsp;')
-            if jira_issue[title_key] == item["fields"]["System.Title"]:
-                if jira_description == ado_description:
-                    ado_work_items.remove(item)
-                    return item["id"]
-        else:
+        if not jira_issue.is_folder:
             # Check if the title matches the regex pattern [ProjectKey-Number]
             # If yes, it was migrated from Jira like this using solidify/jira-azuredevops-migrator
-            regex_pattern = r"\[" + jira_issue["issue_key"] + "\]"
+            regex_pattern = r"\[" + jira_issue.key + "\]"
             if re.search(regex_pattern, item["fields"]["System.Title"]):
                 ado_work_items.remove(item)
                 return item["id"]
-            
-            fields = jira_issue["issueData"].get("fields", None)
-            if fields is None:
-                fields = jira_issue.get("issueData", None)
-            if fields is None:                
-                continue
-
-            jira_description = fields.get("description", "")
-            if jira_description != None and '\xa0' in jira_description:
-                jira_description = jira_description.replace('\xa0', '&nbsp;')
-            if jira_issue[title_key] == item["fields"]["System.Title"]:
-                if jira_description == ado_description:
-                    ado_work_items.remove(item)
-                    return item["id"]
+
+        if jira_issue.title == item["fields"]["System.Title"]:
+            if ado_description in (jira_description, raw_description):
+                ado_work_items.remove(item)
+                return item["id"]
+
+
+def count_mapping_combinations(nodes):
+    """
+    Count the distinct (issue type, status) combinations and link types of the issues to migrate.
+
+    Args:
+        nodes (iterable): The TreeNode of the folders and issues.
+
+    Returns:
+        tuple: The [count, example issue key] of each (issue type, status) and of each link type name.
+    """
+    combinations = {}
+    links = {}
+    for node in nodes:
+        if node.is_folder:
+            continue
+        entry = combinations.setdefault((node.issue_type, node.status), [0, node.key])
+        entry[0] += 1
+        for _, link_name in node.links:
+            entry = links.setdefault(link_name, [0, node.key])
+            entry[0] += 1
+    return combinations, links
+
+
+def configured_mapping_combinations():
+    """
+    The combinations named in the issue type, status and link type maps, checked when the issues are not all
+    downloaded before the first write, e.g. in the pipelined migration. The statuses are only checked when
+    their map entry names a Work Item type of the issue type map.
+
+    Returns:
+        tuple: The combinations and link types, like count_mapping_combinations.
+    """
+    combinations = {(issue_type, None): [0, "issue_type_map"] for issue_type in ADO_ENV.issue_type_map
+                    if issue_type != "Folder"}
+    for status in ADO_ENV.status_map:
+        if "/" in status:
+            work_item_type, status = status.split("/", 1)
+            issue_types = [issue_type for issue_type, mapped in ADO_ENV.issue_type_map.items()
+                           if mapped == work_item_type and issue_type != "Folder"]
+            combinations.update({(issue_type, status): [0, "status_map"] for issue_type in issue_types})
+    links = {link_name: [0, "link_type_map"] for link_name in ADO_ENV.link_type_map}
+    return combinations, links
+
+
+def get_process_metadata(organization, project):
+    """
+    Retrieve the Work Item types, with their states and fields, and the relation types in parallel. Both are
+    kept in the metadata cache, on disk when run_env.cache_file is set.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+
+    Returns:
+        tuple: The Work Item types and the relation types.
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        work_item_types = executor.submit(ado_helper.get_work_item_types, organization, project)
+        relation_types = executor.submit(ado_helper.get_work_item_relation_types, organization)
+        return work_item_types.result(), relation_types.result()
+
+
+def find_mapping_problems(project, work_item_types, relation_types, combinations, links):
+    """
+    Check the combinations against the process of the project: the mapped Work Item type exists, the mapped
+    state is one of its states, the mapped fields are among its fields, and the link type is in the link map
+    and maps to an existing relation type.
+
+    Args:
+        project (str): The name of the project.
+        work_item_types (list): The Work Item types of the project.
+        relation_types (list): The relation types of the organization.
+        combinations (dict): The [count, example] of each (issue type, status), a None status is not checked.
+        links (dict): The [count, example] of each link type name.
+
+    Returns:
+        list: The problems found, one message per invalid combination.
+    """
+    types = {work_item_type["name"].casefold(): work_item_type for work_item_type in work_item_types}
+    relations = {relation["referenceName"] for relation in relation_types}
+    problems = []
+    missing_types = {}
+    for (issue_type, status), (count, example) in sorted(combinations.items(), key=str):
+        template = get_work_item_template(issue_type, project)
+        work_item_type = types.get(template.work_item_type.casefold())
+        if work_item_type is None:
+            # Reported once per issue type, with the issues of all its statuses
+            missing = missing_types.setdefault(issue_type, [0, example, template.work_item_type])
+            missing[0] += count
+            continue
+        states = [state["name"] for state in work_item_type.get("states", [])]
+        if status is not None and states and template.state(status).casefold() not in map(str.casefold, states):
+            problems.append(f"{count} issues of type '{issue_type}' with status '{status}' (e.g. {example}) map to "
+                            f"the state '{template.state(status)}', which is not a state of "
+                            f"'{template.work_item_type}': {', '.join(states)}")
+        fields = {field["referenceName"] for field in work_item_type.get("fields", [])}
+        if fields:
+            for path, _ in template.fields:
+                field = path[len("/fields/"):]
+                if field not in fields:
+                    problems.append(f"The field '{field}' mapped for the type '{issue_type}' is not a field of "
+                                    f"'{template.work_item_type}'")
+    for issue_type, (count, example, work_item_type) in missing_types.items():
+        issues = f"{count} issues" if count else "Issues"
+        problems.append(f"{issues} of type '{issue_type}' (e.g. {example}) map to the Work Item type "
+                        f"'{work_item_type}', which does not exist in {project}")
+    for link_name, (count, example) in sorted(links.items()):
+        links_text = f"{count} links" if count else "Links"
+        if link_name not in ADO_ENV.link_type_map:
+            problems.append(f"{links_text} '{link_name}' (e.g. from {example}) are not in the link_type_map")
+        elif ADO_ENV.link_type_map[link_name] not in relations:
+            problems.append(f"{links_text} '{link_name}' (e.g. from {example}) map to "
+                            f"'{ADO_ENV.link_type_map[link_name]}', which is not a relation type")
+    return list(dict.fromkeys(problems))
+
+
+def verify_mappings(organization, project, combinations, links):
+    """
+    Preflight check of the issue type, status, field and link type maps, before the first Work Item is created.
+    All the invalid combinations are reported together.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+        combinations (dict): The [count, example] of each (issue type, status), see count_mapping_combinations.
+        links (dict): The [count, example] of each link type name.
+
+    Returns:
+        bool: True if every combination is valid, False otherwise.
+    """
+    if not RUN_ENV.verify_mappings:
+        return True
+    work_item_types, relation_types = get_process_metadata(organization, project)
+    problems = find_mapping_problems(project, work_item_types, relation_types, combinations, links)
+    for problem in problems:
+        write_logging_error(f"MAPPING ERROR: {problem}")
+    if problems:
+        write_logging_simple_message(f"{len(problems)} mapping errors found, fix the maps in config.yaml")
+        return False
+    write_logging_simple_message(f"All the mappings are valid: {len(combinations)} issue type and status "
+                                 f"combinations, {len(links)} link types")
+    return True
 
 
 def run_project_ado_verifications(organization, project_key):
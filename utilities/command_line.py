@@ -0,0 +1,26 @@
+"""Parses the options of the command-line scripts"""
+import sys
+
+
+def pop_option(arguments, name, usage):
+    """
+    Remove an option and its value from the command-line arguments. The usage is printed and the script exits
+    when the option has no value.
+
+    Args:
+        arguments (list): The command-line arguments, without the script name, updated in place.
+        name (str): The name of the option, e.g. --folder.
+        usage (str): The usage of the script.
+
+    Returns:
+        str: The value of the option, None when it is not given.
+    """
+    if name not in arguments:
+        return None
+    index = arguments.index(name)
+    if index + 1 >= len(arguments):
+        print(usage)
+        sys.exit()
+    value = arguments[index + 1]
+    del arguments[index:index + 2]
+    return value
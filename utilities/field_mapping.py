@@ -0,0 +1,158 @@
+"""Maps the Jira fields to the Work Item fields with templates compiled once per issue and Work Item type"""
+from config.config import ADO_ENV
+from utilities.origin_marker import origin_field_path, origin_value
+from utilities.wiki_markup import description_to_html
+
+TAG_SEPARATOR = "; "
+DICT_VALUE_KEYS = ("value", "name")
+
+JIRA_FIELDS = tuple(dict.fromkeys(mapping["jira"] for mapping in ADO_ENV.field_map if "jira" in mapping))
+"""The Jira fields read by the field map, in the order their values are stored in TreeNode.fields"""
+
+_templates = {}
+
+
+def _matches(mapping, issue_type, work_item_type):
+    issue_types = mapping.get("issue_types")
+    work_item_types = mapping.get("work_item_types")
+    return (issue_types is None or issue_type in issue_types) and \
+        (work_item_types is None or work_item_type in work_item_types)
+
+
+def _convert(value, mapping):
+    """Convert a raw Jira field value to a scalar: dicts by property, lists joined with the separator."""
+    if isinstance(value, list):
+        values = [_convert(item, mapping) for item in value]
+        values = [str(item) for item in values if item not in (None, "")]
+        return mapping.get("separator", TAG_SEPARATOR).join(values) if values else None
+    if isinstance(value, dict):
+        if "property" in mapping:
+            return value.get(mapping["property"])
+        return next((value[key] for key in DICT_VALUE_KEYS if key in value), None)
+    return value
+
+
+def _compile_extractor(mapping, project):
+    """
+    Compile a field_map entry into a function returning the value of the field for a node.
+
+    Args:
+        mapping (dict): The field_map entry.
+        project (str): The name of the project, replaces {project} in the constant values.
+
+    Returns:
+        function: Takes a TreeNode and returns the value, None when the node has no value.
+    """
+    if "value" in mapping:
+        value = mapping["value"]
+        value = value.format(project=project) if isinstance(value, str) else value
+        return lambda node: value
+
+    index = JIRA_FIELDS.index(mapping["jira"])
+    value_map = mapping.get("value_map", {})
+    default = mapping.get("default")
+
+    def extract(node):
+        if not node.fields:
+            # Folders have no Jira fields
+            return None
+        value = _convert(node.fields[index], mapping)
+        if value in (None, ""):
+            return default
+        return value_map.get(value, value) if value_map else value
+    return extract
+
+
+class WorkItemTemplate:
+    """
+    The json-patch body of the Work Items of one Jira issue type, compiled from the maps of the configuration.
+
+    The Work Item type, the fields to set and their extractors are resolved when the template is compiled and the
+    mapped states are cached, so building a body only reads the values of the node.
+
+    Args:
+        issue_type (str): The Jira issue type, 'Folder' for folders.
+        work_item_type (str): The Azure DevOps Work Item type.
+        project (str): The name of the project.
+    """
+    __slots__ = ("work_item_type", "fields", "_states")
+
+    def __init__(self, issue_type, work_item_type, project):
+        self.work_item_type = work_item_type
+        self._states = {}
+        extractors = {}
+        for mapping in ADO_ENV.field_map:
+            if "ado" not in mapping or ("jira" not in mapping and "value" not in mapping):
+                raise Exception(f"Field map entry {mapping} needs an 'ado' field and a 'jira' field or a 'value'")
+            if _matches(mapping, issue_type, work_item_type):
+                extractors.setdefault(f"/fields/{mapping['ado']}", []).append(_compile_extractor(mapping, project))
+        # Every Work Item carries its origin marker, joined with the mapped tags when it is stored in the tags
+        extractors.setdefault(origin_field_path(), []).append(origin_value)
+        self.fields = tuple(extractors.items())
+
+    def state(self, status):
+        """
+        Map a Jira status to the Azure DevOps state, the status is used as is when it is not in the status map.
+
+        Args:
+            status (str): The Jira status.
+
+        Returns:
+            str: The Azure DevOps state.
+        """
+        if status not in self._states:
+            # Check if there is an specific mapping for the status in this work item type, then a general one
+            specific_status = f"{self.work_item_type}/{status}"
+            if specific_status in ADO_ENV.status_map:
+                self._states[status] = ADO_ENV.status_map[specific_status]
+            else:
+                self._states[status] = ADO_ENV.status_map.get(status, status)
+        return self._states[status]
+
+    def build_body(self, node):
+        """
+        Build the json-patch body of a node: description converted to HTML, title, state for issues, then the mapped fields and
+        the origin marker.
+
+        Args:
+            node (TreeNode): The folder or issue.
+
+        Returns:
+            list: The json-patch operations.
+        """
+        body = [
+            {"op": "add", "path": "/fields/System.Description", "from": None,
+             "value": description_to_html(node.description)},
+            {"op": "add", "path": "/fields/System.Title", "from": None, "value": node.title},
+        ]
+        if not node.is_folder:
+            body.append({"op": "add", "path": "/fields/System.State", "from": None, "value": self.state(node.status)})
+        for path, extractors in self.fields:
+            if len(extractors) == 1:
+                value = extractors[0](node)
+            else:
+                values = [str(value) for value in (extractor(node) for extractor in extractors)
+                          if value not in (None, "")]
+                value = TAG_SEPARATOR.join(values) if values else None
+            if value not in (None, ""):
+                body.append({"op": "add", "path": path, "from": None, "value": value})
+        return body
+
+
+def get_work_item_template(issue_type, project):
+    """
+    Get the template of an issue type, compiling it the first time the (issue type, Work Item type) pair is used.
+
+    Args:
+        issue_type (str): The Jira issue type, 'Folder' for folders.
+        project (str): The name of the project.
+
+    Returns:
+        WorkItemTemplate: The template.
+    """
+    work_item_type = ADO_ENV.issue_type_map.get(issue_type, issue_type)
+    key = (issue_type, work_item_type, project)
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = WorkItemTemplate(issue_type, work_item_type, project)
+    return template
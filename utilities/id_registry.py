@@ -0,0 +1,122 @@
+"""Registry of the Work Items created from Jira issues, shared by the migrations of all the projects"""
+import sqlite3
+import threading
+
+ISSUE_ORIGIN_PREFIX = "issue-"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    organization TEXT NOT NULL, jira_id TEXT NOT NULL, project TEXT NOT NULL, work_item_id INTEGER NOT NULL,
+    PRIMARY KEY (organization, jira_id)
+);
+CREATE INDEX IF NOT EXISTS work_items_id ON work_items (organization, work_item_id);
+"""
+
+
+class IdRegistry:
+    """
+    Persistent index of the Work Item id and project of every migrated Jira issue, in a SQLite file.
+
+    The registry outlives the runs, so the links to issues migrated with another project can be resolved with a
+    local lookup. The file is opened in WAL mode with a busy timeout, so several migrations can read and write it
+    at the same time.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        """
+        Open the registry file, creating it if needed.
+
+        Args:
+            path (str): The path of the registry file, None to keep no registry.
+        """
+        self.close()
+        if path:
+            connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+
+    def _write(self, statement, rows):
+        if self._connection is None or not rows:
+            return
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(statement, rows)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def register(self, organization, project, work_item_ids):
+        """
+        Register the Work Items of migrated issues, replacing the previous Work Item of an issue.
+
+        Args:
+            organization (str): The name of the organization.
+            project (str): The name of the project of the Work Items.
+            work_item_ids (dict): The Work Item id of each Jira issue id.
+        """
+        self._write("INSERT OR REPLACE INTO work_items VALUES (?, ?, ?, ?)",
+                    [(organization, str(jira_id), project, work_item_id)
+                     for jira_id, work_item_id in work_item_ids.items()])
+
+    def register_origins(self, organization, project, migrated_ids):
+        """
+        Register the issue Work Items found by their origin marker, see get_migrated_work_item_ids.
+
+        Args:
+            organization (str): The name of the organization.
+            project (str): The name of the project of the Work Items.
+            migrated_ids (dict): The Work Item id of each origin marker.
+        """
+        self.register(organization, project, {origin[len(ISSUE_ORIGIN_PREFIX):]: work_item_id
+                                               for origin, work_item_id in migrated_ids.items()
+                                               if origin.startswith(ISSUE_ORIGIN_PREFIX)})
+
+    def remove(self, organization, work_item_ids):
+        """
+        Remove deleted Work Items from the registry.
+
+        Args:
+            organization (str): The name of the organization.
+            work_item_ids (list): The ids of the deleted Work Items.
+        """
+        self._write("DELETE FROM work_items WHERE organization = ? AND work_item_id = ?",
+                    [(organization, work_item_id) for work_item_id in work_item_ids])
+
+    def lookup(self, organization, jira_id, excluded_project=None):
+        """
+        Find the Work Item of a migrated issue.
+
+        Args:
+            organization (str): The name of the organization.
+            jira_id (int or str): The id of the Jira issue.
+            excluded_project (str): A project whose Work Items are ignored, e.g. the project being migrated,
+                whose Work Items are known by the run itself.
+
+        Returns:
+            tuple: The project and the id of the Work Item, None if the issue is not registered.
+        """
+        if self._connection is None:
+            return None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT project, work_item_id FROM work_items WHERE organization = ? AND jira_id = ?",
+                (organization, str(jira_id))).fetchone()
+        if row is None or row[0] == excluded_project:
+            return None
+        return row
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+ID_REGISTRY = IdRegistry()
@@ -0,0 +1,118 @@
+"""Plans the issue searches of a migration as id windows fetched in parallel and merged without duplicates"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from api.data_center.jira_helper import iterate_issue_pages, project_or_tree_jql, search_issues
+from config.config import RUN_ENV
+from report.log_and_report import write_logging_simple_message
+from utilities.migrate_attachments import run_bounded
+
+
+def project_issue_queries(project_key, project_name):
+    """
+    The JQL queries of the issues in a project or in its requirements tree, run separately instead of joined
+    with OR: the project query stays fast, and the slow requirementsPath query only returns the issues of
+    the other projects.
+
+    Args:
+        project_key (str): The key of the project.
+        project_name (str): The name of the project, used by the R4J requirementsPath function.
+
+    Returns:
+        list: The JQL queries.
+    """
+    return [f"project={project_key}", f'issue in requirementsPath("{project_name}") AND project != {project_key}']
+
+
+def window_jql(jql, first_id, last_id):
+    """
+    The JQL query of the issues of a query with an id in a window.
+
+    Args:
+        jql (str): The JQL query, without ORDER BY.
+        first_id (int): The first id of the window.
+        last_id (int): The last id of the window.
+
+    Returns:
+        str: The JQL query.
+    """
+    return f"({jql}) AND id >= {first_id} AND id <= {last_id} ORDER BY id ASC"
+
+
+def plan_issue_windows(jql, page_size):
+    """
+    Split a query into id windows of about one page each. The number of issues and their lowest and highest
+    ids are read with two searches of one issue, then the id range is cut into equal windows. A window
+    holding more issues than a page, when the ids are not spread evenly, is paged on its own.
+
+    Args:
+        jql (str): The JQL query, without ORDER BY.
+        page_size (int): The number of issues aimed at per window.
+
+    Returns:
+        list: The JQL queries of the windows, none when the query finds no issue.
+    """
+    first = search_issues(f"({jql}) ORDER BY id ASC", 0, 1)
+    if not first["issues"]:
+        return []
+    last = search_issues(f"({jql}) ORDER BY id DESC", 0, 1)
+    first_id = int(first["issues"][0]["id"])
+    last_id = int(last["issues"][0]["id"])
+    window_count = max(1, math.ceil(first["total"] / page_size))
+    step = math.ceil((last_id - first_id + 1) / window_count)
+    return [window_jql(jql, start, min(start + step - 1, last_id)) for start in range(first_id, last_id + 1, step)]
+
+
+def _fetch_window(jql, page_size):
+    return [issue for page in iterate_issue_pages(jql, page_size) for issue in page]
+
+
+def iterate_planned_issue_pages(queries, page_size):
+    """
+    Retrieves the issues found by the queries, each split into id windows fetched in parallel over a pool of
+    RUN_ENV.issue_query_concurrency workers. The issues found by several queries or windows, e.g. when an
+    issue is moved during the search, are only returned once.
+
+    Args:
+        queries (list): The JQL queries, without ORDER BY.
+        page_size (int): The maximum number of issues requested per page.
+
+    Yields:
+        list: The issues of each window, in the order the windows complete.
+    """
+    seen = set()
+    with ThreadPoolExecutor(max_workers=RUN_ENV.issue_query_concurrency) as executor:
+        plans = list(executor.map(plan_issue_windows, queries, [page_size] * len(queries)))
+        windows = [(window, page_size) for plan in plans for window in plan]
+        write_logging_simple_message(f"Searching the issues in {len(windows)} windows of {len(queries)} queries")
+        for _, result in run_bounded(executor, _fetch_window, windows, RUN_ENV.issue_query_concurrency * 2):
+            if isinstance(result, BaseException):
+                raise result
+            issues = [issue for issue in result if issue["id"] not in seen]
+            seen.update(issue["id"] for issue in issues)
+            if issues:
+                yield issues
+
+
+def iterate_project_issue_pages(project_key, project_name, scope=None, page_size=None):
+    """
+    Retrieves the issues to migrate: the issues of the folder of a scoped migration, otherwise the issues in the
+    project or in its requirements tree. With RUN_ENV.issue_query_plan the searches are split into windows
+    fetched in parallel, otherwise a single query is paged.
+
+    Args:
+        project_key (str): The key of the project.
+        project_name (str): The name of the project.
+        scope (MigrationScope): The folder to migrate, None for the whole project.
+        page_size (int): The maximum number of issues requested per page, RUN_ENV.issues_page_size if None.
+
+    Yields:
+        list: The issues of each page or window.
+    """
+    page_size = page_size or RUN_ENV.issues_page_size
+    if not RUN_ENV.issue_query_plan:
+        jql = scope.jql(project_name) if scope is not None else project_or_tree_jql(project_key, project_name)
+        yield from iterate_issue_pages(jql, page_size)
+        return
+    queries = [scope.jql(project_name)] if scope is not None else project_issue_queries(project_key, project_name)
+    yield from iterate_planned_issue_pages(queries, page_size)
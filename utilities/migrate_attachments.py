@@ -0,0 +1,267 @@
+"""Migrates the folder and issue attachments from Jira DC to the Work Items on Azure DevOps"""
+import json
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from api.azure_dev_ops import ado_helper
+from api.data_center import jira_helper
+from config.config import ADO_ENV, RUN_ENV
+from report.log_and_report import write_logging_error, write_logging_simple_message
+from report.progress import PROGRESS
+
+DOWNLOAD_READ_SIZE = 64 * 1024
+
+
+class AttachmentRecord:
+    """
+    The attachments of a project that could not be migrated, read from and appended to a JSON lines file, so
+    the next run retries them even when their Work Items already exist. A retried attachment is recorded as
+    migrated once it is linked to its Work Item.
+
+    Args:
+        path (str): The path of the record file, None to record nothing.
+        project (str): The name of the project.
+    """
+
+    def __init__(self, path, project):
+        self.failed = {}
+        self.project = project
+        self._file = None
+        if not path:
+            return
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry["project"] != project:
+                            continue
+                        key = (entry["work_item"], entry["content"])
+                        if entry["status"] == "failed":
+                            self.failed[key] = (entry["file"], entry["size"], entry["content"])
+                        else:
+                            self.failed.pop(key, None)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write(self, work_item_id, attachment, status):
+        if self._file is not None:
+            file_name, size, content_url = attachment
+            self._file.write(json.dumps({"project": self.project, "work_item": work_item_id, "file": file_name,
+                                         "size": size, "content": content_url, "status": status}) + "\n")
+            self._file.flush()
+
+    def record_failed(self, work_item_id, attachment):
+        """
+        Record an attachment that could not be migrated.
+
+        Args:
+            work_item_id (int): The id of the Work Item.
+            attachment (tuple): The (file name, size in bytes, content URL) of the attachment.
+        """
+        self._write(work_item_id, attachment, "failed")
+
+    def record_migrated(self, work_item_id, attachment):
+        """
+        Record an attachment migrated after it failed in a previous run.
+
+        Args:
+            work_item_id (int): The id of the Work Item.
+            attachment (tuple): The (file name, size in bytes, content URL) of the attachment.
+        """
+        if (work_item_id, attachment[2]) in self.failed:
+            self._write(work_item_id, attachment, "migrated")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def transfer_attachment(organization, project, attachment, chunk_size):
+    """
+    Stream an attachment from Jira DC to Azure DevOps without holding the whole file in memory.
+
+    Files up to chunk_size bytes are uploaded in a single request, bigger files with the chunked upload, so at
+    most one chunk of each file is in memory. A file whose size is given neither by Jira nor by the download
+    is spooled to a temporary file past chunk_size bytes, to learn its size before the chunked upload.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        attachment (tuple): The (file name, size in bytes, content URL) of the attachment.
+        chunk_size (int): The maximum number of bytes uploaded per request.
+
+    Returns:
+        str: The URL of the attachment on Azure DevOps.
+    """
+    file_name, size, content_url = attachment
+    response = jira_helper.download_attachment(content_url)
+    try:
+        if size is None and response.headers.get("Content-Length"):
+            size = int(response.headers["Content-Length"])
+        if size is not None:
+            return _upload_attachment(organization, project, file_name, response.iter_content(DOWNLOAD_READ_SIZE),
+                                      size, chunk_size)
+        with tempfile.SpooledTemporaryFile(max_size=chunk_size) as spool:
+            for piece in response.iter_content(DOWNLOAD_READ_SIZE):
+                spool.write(piece)
+            size = spool.tell()
+            spool.seek(0)
+            return _upload_attachment(organization, project, file_name,
+                                      iter(lambda: spool.read(DOWNLOAD_READ_SIZE), b""), size, chunk_size)
+    finally:
+        response.close()
+
+
+def _upload_attachment(organization, project, file_name, pieces, total_size, chunk_size):
+    if total_size <= chunk_size:
+        content = b"".join(pieces)
+        return ado_helper.create_attachment(organization, project, file_name, content)["url"]
+
+    uploaded = ado_helper.start_chunked_attachment(organization, project, file_name)
+    buffer = bytearray()
+    start = 0
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= chunk_size:
+            ado_helper.upload_attachment_chunk(organization, project, uploaded["id"], file_name, start,
+                                               bytes(buffer[:chunk_size]), total_size)
+            start += chunk_size
+            del buffer[:chunk_size]
+    if buffer:
+        ado_helper.upload_attachment_chunk(organization, project, uploaded["id"], file_name, start,
+                                           bytes(buffer), total_size)
+    return uploaded["url"]
+
+
+def add_attachment_relations(organization, project, work_item_id, attachments):
+    """
+    Add the AttachedFile relations of uploaded attachments to a Work Item in a single update.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        work_item_id (int): The id of the Work Item.
+        attachments (list): The (file name, attachment URL) of the uploaded attachments.
+    """
+    body = [
+        {
+            "op": "add",
+            "path": "/relations/-",
+            "from": None,
+            "value": {"rel": "AttachedFile", "url": url, "attributes": {"name": file_name}},
+        }
+        for file_name, url in attachments
+    ]
+    ado_helper.update_work_item(organization, project, work_item_id, body)
+
+
+def run_bounded(executor, function, jobs, max_in_flight):
+    """
+    Submit the jobs to the executor keeping at most max_in_flight of them queued or running.
+
+    Args:
+        executor (Executor): The executor running the jobs.
+        function: The function called with the arguments of each job.
+        jobs (iterable): The argument tuples of the jobs, consumed as the jobs complete.
+        max_in_flight (int): The maximum number of jobs submitted and not completed.
+
+    Yields:
+        tuple: Each job with its result, or with the exception it raised, as they complete.
+    """
+    in_flight = {}
+    jobs = iter(jobs)
+    while True:
+        for job in jobs:
+            in_flight[executor.submit(function, *job)] = job
+            if len(in_flight) >= max_in_flight:
+                break
+        if not in_flight:
+            return
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            job = in_flight.pop(future)
+            yield job, future.exception() or future.result()
+
+
+def migrate_attachments(tree_items_list, project, heartbeat=None, retry_failed=False):
+    """
+    Migrate the attachments of the folders and issues to their Work Items.
+
+    The files are transferred over a bounded pool of RUN_ENV.attachment_concurrency workers, then the
+    AttachedFile relations are added to each Work Item in batches of RUN_ENV.attachment_relations_batch.
+    A failed attachment is logged and recorded in RUN_ENV.attachment_record_file, and does not stop the
+    migration.
+
+    Args:
+        tree_items_list (list): The TreeNode of the folders and issues whose Work Items were created in this run.
+        project (str): The name of the project.
+        heartbeat: Optional function called from the calling thread after each attachment and each batch of
+            relations, e.g. to renew a lease.
+        retry_failed (bool): True to also retry the attachments recorded as failed by the previous runs, once
+            per run.
+
+    Returns:
+        int: The number of attachments migrated.
+    """
+    organization = ADO_ENV.organization
+    record = AttachmentRecord(RUN_ENV.attachment_record_file, project)
+    jobs = {(node.id, attachment[2]): (node.id, attachment)
+            for node in tree_items_list if node.id for attachment in node.attachments}
+    if retry_failed:
+        for (work_item_id, content_url), attachment in record.failed.items():
+            jobs.setdefault((work_item_id, content_url), (work_item_id, attachment))
+    jobs = list(jobs.values())
+    if not jobs:
+        record.close()
+        return 0
+    write_logging_simple_message(f"Migrating {len(jobs)} attachments")
+    max_in_flight = RUN_ENV.attachment_concurrency * 2
+    uploaded = {}
+    failed = 0
+
+    def transfer(work_item_id, attachment):
+        return transfer_attachment(organization, project, attachment, RUN_ENV.attachment_chunk_size)
+
+    PROGRESS.track(len(jobs))
+    try:
+        with ThreadPoolExecutor(max_workers=RUN_ENV.attachment_concurrency) as executor:
+            for (work_item_id, attachment), result in run_bounded(executor, transfer, jobs, max_in_flight):
+                PROGRESS.advance()
+                if heartbeat is not None:
+                    heartbeat()
+                if isinstance(result, BaseException):
+                    failed += 1
+                    record.record_failed(work_item_id, attachment)
+                    write_logging_error(f"Attachment '{attachment[0]}' of Work Item {work_item_id} not migrated: "
+                                        f"{result}")
+                else:
+                    uploaded.setdefault(work_item_id, []).append((attachment, result))
+
+            batch_size = RUN_ENV.attachment_relations_batch
+            relation_jobs = [(organization, project, work_item_id, attachments[index:index + batch_size])
+                             for work_item_id, attachments in uploaded.items()
+                             for index in range(0, len(attachments), batch_size)]
+            for job, result in run_bounded(executor, _add_uploaded_relations, relation_jobs, max_in_flight):
+                if heartbeat is not None:
+                    heartbeat()
+                for attachment, _ in job[3]:
+                    if isinstance(result, BaseException):
+                        record.record_failed(job[2], attachment)
+                    else:
+                        record.record_migrated(job[2], attachment)
+                if isinstance(result, BaseException):
+                    failed += len(job[3])
+                    write_logging_error(f"Attachments of Work Item {job[2]} not linked: {result}")
+    finally:
+        record.close()
+
+    migrated = len(jobs) - failed
+    write_logging_simple_message(f"{migrated} attachments migrated, {failed} failed")
+    return migrated
+
+
+def _add_uploaded_relations(organization, project, work_item_id, uploaded):
+    add_attachment_relations(organization, project, work_item_id,
+                             [(attachment[0], url) for attachment, url in uploaded])
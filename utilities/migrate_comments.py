@@ -0,0 +1,160 @@
+"""Migrates the comments of the Jira DC issues to the comments of their Work Items on Azure DevOps"""
+import html
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from api.azure_dev_ops import ado_helper
+from api.data_center import jira_helper
+from config.config import ADO_ENV, RUN_ENV
+from report.log_and_report import write_logging_error, write_logging_simple_message
+from report.progress import PROGRESS
+from utilities.migrate_attachments import run_bounded
+from utilities.tree_node import comments_from_jira
+from utilities.wiki_markup import markup_to_html
+
+
+class CommentRecord:
+    """
+    The Jira comments already added to a Work Item, read from and appended to a JSON lines file.
+
+    Each line is flushed when it is written, so a run that failed is resumed after its last comment. The
+    comments are recorded by Work Item, so they are migrated again to the new Work Items after a rollback.
+
+    Args:
+        path (str): The path of the record file, None to record nothing.
+    """
+
+    def __init__(self, path):
+        self.migrated = set()
+        self._file = None
+        self._lock = threading.Lock()
+        if not path:
+            return
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.migrated.add((entry["work_item"], entry["comment"]))
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, key):
+        return key in self.migrated
+
+    def record(self, work_item_id, comment_id, ado_comment_id):
+        """
+        Record a comment added to a Work Item.
+
+        Args:
+            work_item_id (int): The id of the Work Item.
+            comment_id (str): The id of the Jira comment.
+            ado_comment_id (int): The id of the Work Item comment.
+        """
+        with self._lock:
+            self.migrated.add((work_item_id, comment_id))
+            if self._file is not None:
+                self._file.write(json.dumps({"work_item": work_item_id, "comment": comment_id,
+                                             "ado_comment": ado_comment_id}) + "\n")
+                self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def comment_to_html(comment):
+    """
+    The HTML of a Work Item comment for a Jira comment, headed by its author and creation date since the
+    comment is added by the user of the migration.
+
+    Args:
+        comment (tuple): The (comment id, author, creation date, body) of the Jira comment.
+
+    Returns:
+        str: The HTML text.
+    """
+    _, author, created, body = comment
+    header = f"<p><i>{html.escape(author or 'Unknown')} commented on {html.escape(created or '')} in Jira</i></p>"
+    return header + markup_to_html(body)
+
+
+def migrate_node_comments(organization, project, node, record):
+    """
+    Add the comments of an issue to its Work Item, one after the other so they keep their Jira order. The
+    comments in the record are skipped, and the comments the search only returned in part are fetched.
+
+    Args:
+        organization (str): The name of the Azure DevOps organization.
+        project (str): The name of the project.
+        node (TreeNode): The issue, with the id of its Work Item.
+        record (CommentRecord): The comments already migrated, updated with the new ones.
+
+    Returns:
+        int: The number of comments added.
+    """
+    comments = node.comments
+    if comments is None:
+        comments = comments_from_jira(jira_helper.get_all_issue_comments(node.jira_id))
+    added = 0
+    for comment in comments:
+        if (node.id, comment[0]) in record:
+            continue
+        ado_comment = ado_helper.add_work_item_comment(organization, project, node.id, comment_to_html(comment))
+        record.record(node.id, comment[0], ado_comment["id"])
+        added += 1
+    return added
+
+
+def _unique_work_item_nodes(nodes):
+    # An issue is in the tree once per requirements path, its comments are only added once to its Work Item
+    seen = set()
+    for node in nodes:
+        if not node.id or node.is_folder:
+            continue
+        if node.id in seen:
+            PROGRESS.advance()
+            continue
+        seen.add(node.id)
+        yield node
+
+
+def migrate_comments(nodes, project, count=None):
+    """
+    Migrate the comments of the issues to their Work Items.
+
+    The comments come with the issue pages of the search, only the issues with more comments than the search
+    returns are fetched one by one. The issues are migrated over a bounded pool of RUN_ENV.comment_concurrency
+    workers, the comments of each issue in order. The comments of an issue found several times in the tree are
+    added once. A failed issue is logged and does not stop the migration, its remaining comments are added by
+    the next run.
+
+    Args:
+        nodes (iterable): The TreeNode of the folders and issues with a Work Item, the folders are skipped.
+        project (str): The name of the project.
+        count (int): The number of nodes, for the progress, None if unknown.
+
+    Returns:
+        int: The number of comments added.
+    """
+    organization = ADO_ENV.organization
+    record = CommentRecord(RUN_ENV.comment_record_file)
+    jobs = ((organization, project, node, record) for node in _unique_work_item_nodes(nodes))
+    added = 0
+    failed = 0
+    PROGRESS.track(count)
+    try:
+        with ThreadPoolExecutor(max_workers=RUN_ENV.comment_concurrency) as executor:
+            for job, result in run_bounded(executor, migrate_node_comments, jobs, RUN_ENV.comment_concurrency * 2):
+                PROGRESS.advance()
+                if isinstance(result, BaseException):
+                    failed += 1
+                    write_logging_error(f"Comments of Work Item {job[2].id} not all migrated: {result}")
+                else:
+                    added += result
+    finally:
+        record.close()
+    write_logging_simple_message(f"{added} comments migrated, {failed} Work Items with failed comments")
+    return added
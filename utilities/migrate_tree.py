@@ -1,139 +1,96 @@
 from math import e
 from api.azure_dev_ops.ado_helper import create_work_item, update_work_item
 from config.config import ADO_ENV
+from report.progress import PROGRESS
+from utilities.field_mapping import get_work_item_template
+from utilities.id_registry import ID_REGISTRY
+from utilities.origin_marker import origin_key
+from utilities.run_record import RUN_RECORD
 
 
-def process_data_to_create_work_item(data, project_key, jira_ado_ids):
+def process_data_to_create_work_item(data, project_key, jira_ado_ids, deferred_links=None):
     """
     Create the body to create the Work Item on the Azure DevOps side.
 
     Args:
-        data (dict): The folder/issue data retrieved from Jira DC.
+        data (TreeNode): The folder/issue node, with the data retrieved from Jira DC.
         project_key (str): The key of the project.
+        jira_ado_ids (dict): The ids of the issues already created on Azure DevOps.
+        deferred_links (list): If given, receives the links whose target has no Work Item yet, see
+            add_issue_links_to_work_item.
 
     Returns:
         dict: The body in json-patch+json format necessary to create the folder as a Work Item
     """
-    issue_type = (
-        "Folder"
-        if "folder" in data
-        else data["issueData"]["fields"]["issuetype"]["name"]
-    )
-    work_item_type = (
-        ADO_ENV.issue_type_map[issue_type]
-        if issue_type in ADO_ENV.issue_type_map
-        else issue_type
-    )
+    template = get_work_item_template(data.issue_type, project_key)
     extracted_info = {
         "organization": ADO_ENV.organization,
         "project": project_key,
-        "work_item_type": work_item_type,
-        "body": [],
+        "work_item_type": template.work_item_type,
+        "body": template.build_body(data),
     }
-    if "folder" in data:
-        data = data["folderData"]
-        description = data["description"] if data["description"] is not None else ""
-        extracted_info["body"].append(
-            {
-                "op": "add",
-                "path": "/fields/System.Description",
-                "from": None,
-                "value": description,
-            }
-        )
-        extracted_info["body"].append(
-            {
-                "op": "add",
-                "path": "/fields/System.Title",
-                "from": None,
-                "value": data["name"],
-            }
-        )
+    if data.is_folder:
         return extracted_info
-    else:
-        data = data["issueData"]
-        description = (
-            data["fields"]["description"]
-            if data["fields"]["description"] is not None
-            else ""
-        )
-        extracted_info["body"].append(
-            {
-                "op": "add",
-                "path": "/fields/System.Description",
-                "from": None,
-                "value": description,
-            }
-        )
-        extracted_info["body"].append(
-            {
-                "op": "add",
-                "path": "/fields/System.Title",
-                "from": None,
-                "value": data["fields"]["summary"],
-            }
-        )
-
-        """The state value is mapped to the Azure DevOps state value, if the state value is not in the map, it will be used as is"""
-        state_value = data["fields"]["status"]["name"]
-
-        # Check if there is an specific mapping for the status in this work item type
-        if f"{work_item_type}/{state_value}" in ADO_ENV.status_map:
-            state_value = ADO_ENV.status_map[f"{work_item_type}/{state_value}"]
-
-        # If not, check if there is a general mapping for the status
-        elif state_value in ADO_ENV.status_map:
-            state_value = ADO_ENV.status_map[state_value]
-
-        extracted_info["body"].append(
-            {
-                "op": "add",
-                "path": "/fields/System.State",
-                "from": None,
-                "value": state_value,
-            }
-        )
 
-        add_issue_links_to_work_item(data, extracted_info, jira_ado_ids)
+    add_issue_links_to_work_item(data, extracted_info, jira_ado_ids, deferred_links)
 
-        return extracted_info
+    return extracted_info
 
 
-def add_issue_links_to_work_item(data, extracted_info, jira_ado_ids):
+def add_issue_links_to_work_item(data, extracted_info, jira_ado_ids, deferred_links=None):
     """
     Add the issue links to the work item body.
 
     Args:
-        data (dict): The issue data retrieved from Jira DC.
+        data (TreeNode): The issue node, with the links retrieved from Jira DC.
         extracted_info (dict): The body in json-patch+json format necessary to create the folder as a Work Item
-        jira_ado_ids (dict): The ids of the issues already created on Azure DevOps.
+        jira_ado_ids (dict): The ids of the issues already created on Azure DevOps. The targets not found are
+            looked up in the ID_REGISTRY, among the issues migrated with other projects.
+        deferred_links (list): If given, receives the (node, target Jira issue id, link name) of the links whose
+            target is found nowhere, so they can be added once the Work Items created concurrently exist.
+    """
+    for target_issue_id, link_name in data.links:
+        target_project = extracted_info["project"]
+        if target_issue_id in jira_ado_ids:
+            target_workitem_id = jira_ado_ids[target_issue_id]
+        else:
+            # Issue migrated with another project
+            registered = ID_REGISTRY.lookup(ADO_ENV.organization, target_issue_id, excluded_project=target_project)
+            if registered is None:
+                if deferred_links is not None:
+                    deferred_links.append((data, target_issue_id, link_name))
+                continue
+            target_project, target_workitem_id = registered
+        if target_workitem_id:
+            extracted_info["body"].append(link_relation(link_name, target_project, target_workitem_id))
+
+
+def link_relation(link_name, target_project, target_workitem_id):
     """
-    if "issuelinks" in data["fields"]:
-        for link in data["fields"]["issuelinks"]:
-            link_key = 'inwardIssue' if 'inwardIssue' in link else 'outwardIssue'
-            if link_key in link:
-                target_issue_id = link[link_key]["id"]
-                if target_issue_id not in jira_ado_ids:
-                    continue
-                target_workitem_id = jira_ado_ids[target_issue_id]
-                if target_workitem_id:
-                    link_name = link["type"]["outward"]
-                    if link_name not in ADO_ENV.link_type_map:
-                        raise Exception(
-                            f"Link type {link_name} not found in the link map"
-                        )
-                    ado_link_name = ADO_ENV.link_type_map[link_name]
-                    extracted_info["body"].append(
-                        {
-                            "op": "add",
-                            "path": "/relations/-",
-                            "from": None,
-                            "value": {
-                                "rel": ado_link_name,
-                                "url": f"https://dev.azure.com/{ADO_ENV.organization}/{extracted_info['project']}/_apis/wit/workitems/{target_workitem_id}",
-                            },
-                        }
-                    )
+    The json-patch operation adding an issue link to a Work Item.
+
+    Args:
+        link_name (str): The outward name of the Jira link type.
+        target_project (str): The project of the target Work Item.
+        target_workitem_id (int): The id of the target Work Item.
+
+    Returns:
+        dict: The json-patch operation.
+    """
+    if link_name not in ADO_ENV.link_type_map:
+        raise Exception(
+            f"Link type {link_name} not found in the link map"
+        )
+    ado_link_name = ADO_ENV.link_type_map[link_name]
+    return {
+        "op": "add",
+        "path": "/relations/-",
+        "from": None,
+        "value": {
+            "rel": ado_link_name,
+            "url": f"https://dev.azure.com/{ADO_ENV.organization}/{target_project}/_apis/wit/workitems/{target_workitem_id}",
+        },
+    }
 
 
 def create_work_items_on_ado(tree_items_list, jira_ado_ids, folder_type, project_key):
@@ -141,55 +98,86 @@ def create_work_items_on_ado(tree_items_list, jira_ado_ids, folder_type, project
     Create Work Items and populate the jira_ado_ids with the ids of the Work Items created.
 
     Args:
-        tree_items_list (list): List with all the issues and folders data.
+        tree_items_list (list): List with the TreeNode of all the issues and folders.
         jira_ado_ids: (list): A list to return the ids of the created Work Items.
         folder_type (str): The issue data retrieved from Jira DC.
         project_key (str): The key of the project.
     """
     ADO_ENV.issue_type_map["Folder"] = folder_type
-    for index, issue in enumerate(tree_items_list):
-        if "id" not in issue or not issue["id"]:
-            work_item = process_data_to_create_work_item(
-                issue, project_key, jira_ado_ids
-            )
-
-            state_value = None
-            # Check if the state value is in the map. if yes, save it for later
-            if (
-                len(work_item["body"]) > 2
-                and "/fields/System.State" in work_item["body"][2]["path"]
-            ):
-                state_value = work_item["body"][2]["value"]
-                # Remove the state value from the body
-                work_item["body"].pop(2)
-
-            new_workitem = create_work_item(
-                work_item["organization"],
-                work_item["project"],
-                work_item["work_item_type"],
-                work_item["body"],
-            )
-            issue["id"] = new_workitem["id"]
-
-            # If the state value was saved, add it to the work item
-            if state_value and new_workitem["fields"]["System.State"] != state_value:
-                body = [
-                    {
-                        "op": "add",
-                        "path": "/fields/System.State",
-                        "from": new_workitem["fields"]["System.State"],
-                        "value": state_value,
-                    }
-                ]
-                update_work_item(
-                    work_item["organization"],
-                    work_item["project"],
-                    new_workitem["id"],
-                    body,
-                )
+    PROGRESS.track(sum(1 for issue in tree_items_list if not issue.id))
+    for issue in tree_items_list:
+        if not issue.id:
+            create_work_item_for_node(issue, project_key, jira_ado_ids)
+            PROGRESS.advance()
+
+
+def create_work_item_for_node(issue, project_key, jira_ado_ids, deferred_links=None):
+    """
+    Create the Work Item of a folder or issue, set its id on the node and add it to jira_ado_ids.
+
+    Args:
+        issue (TreeNode): The folder or issue to create.
+        project_key (str): The key of the project.
+        jira_ado_ids (dict): The ids of the Work Items already created, updated with the new one.
+        deferred_links (list): If given, receives the links whose target has no Work Item yet.
+    """
+    work_item = process_data_to_create_work_item(
+        issue, project_key, jira_ado_ids, deferred_links
+    )
+    issue.id = create_work_item_from_body(work_item)
+
+    RUN_RECORD.record(issue.id, origin_key(issue))
+    if not issue.is_folder:
+        ID_REGISTRY.register(ADO_ENV.organization, project_key, {issue.jira_id: issue.id})
+    jira_ado_ids[str(issue.jira_id)] = issue.id
+
+
+def create_work_item_from_body(work_item):
+    """
+    Create a Work Item from the body built by process_data_to_create_work_item. The state is set with a second
+    request when the new Work Item does not start in it.
+
+    Args:
+        work_item (dict): The organization, project, Work Item type and json-patch body of the Work Item.
+
+    Returns:
+        int: The id of the new Work Item.
+    """
+    state_value = None
+    # Check if the state value is in the map. if yes, save it for later
+    if (
+        len(work_item["body"]) > 2
+        and "/fields/System.State" in work_item["body"][2]["path"]
+    ):
+        state_value = work_item["body"][2]["value"]
+        # Remove the state value from the body
+        work_item["body"].pop(2)
+
+    new_workitem = create_work_item(
+        work_item["organization"],
+        work_item["project"],
+        work_item["work_item_type"],
+        work_item["body"],
+    )
+
+    # If the state value was saved, add it to the work item
+    if state_value and new_workitem["fields"]["System.State"] != state_value:
+        body = [
+            {
+                "op": "add",
+                "path": "/fields/System.State",
+                "from": new_workitem["fields"]["System.State"],
+                "value": state_value,
+            }
+        ]
+        update_work_item(
+            work_item["organization"],
+            work_item["project"],
+            new_workitem["id"],
+            body,
+        )
 
-            tree_items_list[index] = issue
-            jira_ado_ids[str(issue["jira_id"])] = issue["id"]
+    return new_workitem["id"]
 
 
 def replace_tree_issues_data_with_jira_issue_data(tree_items_list, project_issues):
@@ -197,20 +185,16 @@ def replace_tree_issues_data_with_jira_issue_data(tree_items_list, project_issue
     Replace the R4J tree issues data with the jira issue data
 
     Args:
-        tree_items_list (list): List with all the issues and folders data.
+        tree_items_list (list): List with the TreeNode of all the issues and folders.
         project_issues: (list): A list all the issues in the project, with all its information
         like summary, description, and status.
     """
-    for index, issue_data in enumerate(tree_items_list):
-        if "issueData" in issue_data:
-            replaced = False
-            for issue in project_issues:
-                if int(issue_data["issueData"]["issueId"]) == int(issue["id"]):
-                    replaced = True
-                    issue_data["issueData"] = issue
-                    tree_items_list[index] = issue_data
-                    break
-            if not replaced:
+    issues_by_id = {int(issue["id"]): issue for issue in project_issues}
+    for node in tree_items_list:
+        if not node.is_folder:
+            issue = issues_by_id.get(int(node.jira_id))
+            if issue is None:
                 raise Exception(
-                    f"Jira Issue with id {issue_data['issueData']['issueId']} not found in the project"
+                    f"Jira Issue with id {node.jira_id} not found in the project"
                 )
+            node.update_from_jira_issue(issue)
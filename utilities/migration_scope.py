@@ -0,0 +1,109 @@
+"""Limits a migration to the subtree of one R4J folder, attached under an existing easeRequirements parent"""
+import requests
+
+from api.azure_dev_ops import ado_helper
+from config.config import ADO_ENV
+
+PATH_SEPARATOR = "/"
+ROOT_ID = -1
+
+
+class MigrationScope:
+    """
+    The subtree of a project to migrate: an R4J folder, given by its id or by its path of folder names from the
+    root, and the Work Item of the easeRequirements tree to attach it under.
+
+    Only the issues of the folder are searched in Jira DC and only the folder is kept in the R4J tree, as the
+    single top-level folder, so the migration runs unchanged on the pruned tree. Its root, the Jira id -1,
+    stands for the parent Work Item.
+
+    Args:
+        folder_id (int): The id of the R4J folder, None when the path is given.
+        path (str): The folder names from the root separated by '/', None when the folder id is given.
+        parent_id (int): The Work Item to attach the folder under, None for the root of the tree.
+    """
+
+    def __init__(self, folder_id=None, path=None, parent_id=None):
+        if (folder_id is None) == (path is None):
+            raise ValueError("A migration scope needs either a folder id or a folder path")
+        self.folder_id = folder_id
+        self.path = [name for name in path.split(PATH_SEPARATOR) if name] if path is not None else None
+        self.parent_id = parent_id
+
+    @property
+    def root_id(self):
+        """int: The Work Item id standing for the root of the pruned tree."""
+        return self.parent_id if self.parent_id is not None else ROOT_ID
+
+    def __str__(self):
+        folder = PATH_SEPARATOR.join(self.path) if self.path is not None else f"folder {self.folder_id}"
+        return f"{folder} under {self.parent_id if self.parent_id is not None else 'the root'}"
+
+    def find_folder(self, tree):
+        """
+        Find the folder of the scope in the R4J tree and complete the path or the id of the scope.
+
+        Args:
+            tree (dict): The R4J tree of the project.
+
+        Returns:
+            dict: The folder.
+
+        Raises:
+            ValueError: If the folder is not in the tree.
+        """
+        stack = [(folder, [folder["name"]]) for folder in tree["folders"]]
+        while stack:
+            folder, names = stack.pop()
+            if folder["id"] == self.folder_id or names == self.path:
+                self.folder_id = folder["id"]
+                self.path = names
+                return folder
+            if self.path is None or names == self.path[:len(names)]:
+                stack.extend((child, names + [child["name"]]) for child in folder["folders"])
+        raise ValueError(f"Folder {self} not found in the R4J tree")
+
+    def prune(self, tree):
+        """
+        Keep only the folder of the scope in the R4J tree, as its single top-level folder.
+
+        Args:
+            tree (dict): The R4J tree of the project.
+
+        Returns:
+            dict: The pruned tree.
+        """
+        return {"id": tree["id"], "folders": [self.find_folder(tree)], "issues": []}
+
+    def jql(self, project_name):
+        """
+        The JQL query of the issues in the folder of the scope and its subfolders.
+
+        Args:
+            project_name (str): The name of the project, the first element of the R4J requirementsPath.
+
+        Returns:
+            str: The JQL query.
+        """
+        if self.path is None:
+            raise ValueError("The folder path is only known once the folder is found in the R4J tree")
+        path = PATH_SEPARATOR.join([project_name, *self.path]).replace("\\", "\\\\").replace('"', '\\"')
+        return f'issue in requirementsPath("{path}")'
+
+    def verify_parent(self, project_name):
+        """
+        Verify that the parent Work Item exists in the project.
+
+        Args:
+            project_name (str): The name of the project.
+
+        Returns:
+            bool: True if the scope has no parent or its parent exists, False otherwise.
+        """
+        if self.parent_id is None:
+            return True
+        try:
+            ado_helper.get_work_item_by_id(ADO_ENV.organization, project_name, self.parent_id)
+        except requests.exceptions.HTTPError:
+            return False
+        return True
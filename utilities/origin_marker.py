@@ -0,0 +1,99 @@
+"""Marks the Work Items with the Jira folder or issue they were created from, to find them again when resuming"""
+from api.azure_dev_ops import ado_helper
+from config.config import ADO_ENV
+from utilities.id_registry import ID_REGISTRY
+
+MIGRATED_TAG = "jira-migrated"
+ORIGIN_TAG_PREFIX = "jira-origin:"
+
+
+def origin_key(node):
+    """
+    The stable origin marker of a folder or issue, which does not change when its title or description are edited.
+
+    Args:
+        node (TreeNode): The folder or issue.
+
+    Returns:
+        str: 'folder-<R4J folder id>' or 'issue-<Jira issue id>'.
+    """
+    return f"{'folder' if node.is_folder else 'issue'}-{node.jira_id}"
+
+
+def origin_field_path():
+    """
+    The json-patch path of the field holding the origin marker: origin_field when configured, the tags otherwise.
+
+    Returns:
+        str: The path of the field.
+    """
+    return f"/fields/{ADO_ENV.origin_field}" if ADO_ENV.origin_field else "/fields/System.Tags"
+
+
+def origin_value(node):
+    """
+    The value written in the origin field when creating the Work Item of a node.
+
+    Args:
+        node (TreeNode): The folder or issue.
+
+    Returns:
+        str: The origin marker, or the migrated and origin tags when the marker is stored in the tags.
+    """
+    if ADO_ENV.origin_field:
+        return origin_key(node)
+    return f"{MIGRATED_TAG}; {ORIGIN_TAG_PREFIX}{origin_key(node)}"
+
+
+def _read_origin(work_item):
+    fields = work_item["fields"]
+    if ADO_ENV.origin_field:
+        return fields.get(ADO_ENV.origin_field)
+    for tag in fields.get("System.Tags", "").split(";"):
+        tag = tag.strip()
+        if tag.startswith(ORIGIN_TAG_PREFIX):
+            return tag[len(ORIGIN_TAG_PREFIX):]
+    return None
+
+
+def get_migrated_work_items(organization, project, fields=()):
+    """
+    Retrieve the Work Items of a project carrying an origin marker with a WIQL query paged by id.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+        fields (iterable): Fields retrieved besides the origin field.
+
+    Returns:
+        list: The Work Items.
+    """
+    if ADO_ENV.origin_field:
+        condition = f"[{ADO_ENV.origin_field}] <> ''"
+        origin_field = ADO_ENV.origin_field
+    else:
+        condition = f"[System.Tags] CONTAINS '{MIGRATED_TAG}'"
+        origin_field = "System.Tags"
+    query = f"SELECT [System.Id] FROM workitems WHERE [System.TeamProject] = '{project}' AND {condition}"
+    return ado_helper.get_work_items_by_query(organization, project, query, [origin_field, *fields])
+
+
+def get_migrated_work_item_ids(organization, project):
+    """
+    Index the Work Items created by previous runs by their origin marker. The issue Work Items are also added to
+    the ID_REGISTRY, so the registry covers the projects migrated before it existed.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+
+    Returns:
+        dict: The Work Item id of each origin marker, see origin_key.
+    """
+    migrated_ids = {}
+    for work_item in get_migrated_work_items(organization, project):
+        origin = _read_origin(work_item)
+        if origin:
+            migrated_ids[origin] = work_item["id"]
+    ID_REGISTRY.register_origins(organization, project, migrated_ids)
+    return migrated_ids
@@ -0,0 +1,279 @@
+"""Pipelined migration where the download, matching and creation stages overlap through bounded queues"""
+import queue
+import threading
+
+from api import r4j_helper
+from api.azure_dev_ops import ado_helper, ease_requirements_helper
+from api.data_center.jira_helper import get_project_by_name
+from config.config import ADO_ENV, RUN_ENV
+from report import metrics
+from report.log_and_report import write_logging_error, write_logging_simple_message
+from report.progress import PROGRESS
+from utilities.issue_search_plan import iterate_project_issue_pages
+from utilities.origin_marker import get_migrated_work_item_ids, origin_key
+from utilities.migrate_attachments import migrate_attachments
+from utilities.migrate_comments import migrate_comments
+from utilities.migrate_tree import create_work_item_for_node, link_relation
+from utilities.transform_data import read_and_process_tree_items, sort_tree
+from utilities.tree_integrity import node_rows, verify_tree
+from utilities.verify_migration import verify_migration
+
+POLL_SECONDS = 0.5
+_DONE = object()
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage when another stage of the pipeline failed."""
+
+
+class MigrationPipeline:
+    """
+    Runs the migration as concurrent stages connected by bounded queues.
+
+    The issue pages are downloaded while the R4J tree and the existing Work Items are retrieved, each issue is
+    joined with its tree node as soon as its page arrives and passed to the Work Item creators, and the tree
+    writer creates every tree item as soon as its Work Item exists. The tree writer follows the depth-first
+    order of the tree, so the parent and previous siblings of an item are always created before it.
+
+    Args:
+        project_name (str): The name of the project in the Azure DevOps side and in Jira DC.
+        project_key (str): The key of the project on Jira DC.
+        folder_type (str): The folder Work Item type of the project.
+        concurrency (int): Number of Work Item creators.
+        queue_size (int): Maximum number of pages or items waiting between two stages.
+        page_size (int): Number of issues requested per page.
+        scope (MigrationScope): The folder to migrate, None for the whole project.
+    """
+
+    def __init__(self, project_name, project_key, folder_type, concurrency, queue_size, page_size, scope=None):
+        self.project_name = project_name
+        self.scope = scope
+        self.project_key = project_key
+        self.folder_type = folder_type
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.issue_pages = queue.Queue(maxsize=queue_size)
+        self.ready_items = queue.Queue(maxsize=queue_size)
+        self.created = threading.Condition()
+        self.cancelled = threading.Event()
+        self.nodes_ready = threading.Event()
+        self.order_ready = threading.Event()
+        self.existing_ready = threading.Event()
+        self.errors = []
+        self.jira_ado_ids = {"-1": scope.root_id if scope is not None else -1}
+        self.tree_items_list = []
+        self.created_nodes = []
+        self.deferred_links = []
+        self.deep_order_tree = []
+        self.migrated_ids = {}
+        self.existing_count = 0
+        self.tree_items_created = 0
+
+    def _check_cancelled(self):
+        if self.cancelled.is_set():
+            raise PipelineCancelled()
+
+    def _put(self, items_queue, item):
+        while True:
+            self._check_cancelled()
+            try:
+                items_queue.put(item, timeout=POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, items_queue):
+        while True:
+            self._check_cancelled()
+            try:
+                return items_queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+    def _wait(self, event):
+        while not event.wait(POLL_SECONDS):
+            self._check_cancelled()
+
+    def _stage(self, target):
+        def run():
+            try:
+                target()
+            except PipelineCancelled:
+                pass
+            except BaseException as e:
+                self.errors.append(e)
+                self.cancelled.set()
+                with self.created:
+                    self.created.notify_all()
+        return threading.Thread(target=run, name=target.__name__, daemon=True)
+
+    def download_issues(self):
+        """Stage: download the issue pages from Jira DC."""
+        # The path of a folder given by its id is read from the tree
+        if self.scope is not None and self.scope.path is None:
+            self._wait(self.nodes_ready)
+        for page in iterate_project_issue_pages(self.project_key, self.project_name, self.scope, self.page_size):
+            self._put(self.issue_pages, page)
+        self._put(self.issue_pages, _DONE)
+
+    def download_tree(self):
+        """Stage: download the R4J tree, flatten it and compute its depth-first order."""
+        data_center_tree = r4j_helper.get_complete_tree_structure_by_project_key(self.project_key)
+        if self.scope is not None:
+            data_center_tree = self.scope.prune(data_center_tree)
+        read_and_process_tree_items(data_center_tree, self.tree_items_list)
+        # Nothing is created before the nodes are ready
+        if not verify_tree(node_rows(self.tree_items_list)):
+            raise Exception("Tree verifications failed, see the tree errors")
+        PROGRESS.track(len(self.tree_items_list))
+        self.nodes_ready.set()
+        self.deep_order_tree = sort_tree(self.tree_items_list)
+        self.order_ready.set()
+
+    def scan_existing_work_items(self):
+        """Stage: retrieve the Work Items created on Azure DevOps by previous runs."""
+        self.migrated_ids = get_migrated_work_item_ids(ADO_ENV.organization, self.project_name)
+        self.existing_ready.set()
+
+    def _dispatch(self, node):
+        node.id = self.migrated_ids.get(origin_key(node))
+        if node.id:
+            self.existing_count += 1
+            with self.created:
+                self.jira_ado_ids[str(node.jira_id)] = node.id
+                self.created.notify_all()
+        else:
+            self._put(self.ready_items, node)
+
+    def join_issues(self):
+        """Stage: join each downloaded issue with its tree nodes and pass the nodes to the creators."""
+        self._wait(self.nodes_ready)
+        self._wait(self.existing_ready)
+        pending = {}
+        for node in self.tree_items_list:
+            if node.is_folder:
+                self._dispatch(node)
+            else:
+                pending.setdefault(int(node.jira_id), []).append(node)
+        while True:
+            page = self._get(self.issue_pages)
+            if page is _DONE:
+                break
+            for issue in page:
+                for node in pending.pop(int(issue["id"]), ()):
+                    node.update_from_jira_issue(issue)
+                    self._dispatch(node)
+        if pending:
+            raise Exception(f"Jira Issue with id {next(iter(pending))} not found in the project")
+        for _ in range(self.concurrency):
+            self._put(self.ready_items, _DONE)
+
+    def create_work_items(self):
+        """Stage: create the Work Items of the nodes passed by the join stage."""
+        while True:
+            node = self._get(self.ready_items)
+            if node is _DONE:
+                return
+            create_work_item_for_node(node, self.project_name, self.jira_ado_ids, self.deferred_links)
+            self.created_nodes.append(node)
+            with self.created:
+                self.created.notify_all()
+
+    def create_tree(self):
+        """Stage: create the tree items in depth-first order as soon as their Work Items exist."""
+        project_id = ado_helper.get_project_by_id_or_name(ADO_ENV.organization, self.project_name)["id"]
+        self._wait(self.order_ready)
+        for node in self.deep_order_tree:
+            with self.created:
+                # The id is set on the node before it is added to jira_ado_ids, wait for both
+                while node.id is None or str(node.jira_id) not in self.jira_ado_ids:
+                    self._check_cancelled()
+                    self.created.wait(POLL_SECONDS)
+            node.parent_id = self.jira_ado_ids[str(node.jira_parent_id)]
+            ease_requirements_helper.create_single_tree_item(project_id, node.id, node.parent_id)
+            self.tree_items_created += 1
+            PROGRESS.advance()
+
+    def add_deferred_links(self):
+        """
+        Add the links left out of the Work Items because their target was being created at the same time. A
+        link is skipped when its target added it on creation in this run, and added once when both ends left it
+        out.
+
+        Returns:
+            int: The number of links added.
+        """
+        deferred = {(str(node.jira_id), str(target_issue_id)) for node, target_issue_id, _ in self.deferred_links}
+        created = {str(node.jira_id): node for node in self.created_nodes if not node.is_folder}
+        added = set()
+        relations = {}
+        for node, target_issue_id, link_name in self.deferred_links:
+            source_id, target_id = str(node.jira_id), str(target_issue_id)
+            target_workitem_id = self.jira_ado_ids.get(target_id)
+            pair = (min(source_id, target_id), max(source_id, target_id), link_name)
+            if not target_workitem_id or pair in added:
+                continue
+            target = created.get(target_id)
+            linked_back = target is not None and any(str(link[0]) == source_id for link in target.links)
+            if linked_back and (target_id, source_id) not in deferred:
+                continue
+            added.add(pair)
+            relations.setdefault(node.id, []).append(link_relation(link_name, self.project_name, target_workitem_id))
+        for work_item_id, body in relations.items():
+            ado_helper.update_work_item(ADO_ENV.organization, self.project_name, work_item_id, body)
+        return len(added)
+
+    def run(self):
+        """
+        Run all the stages and wait for them to finish.
+
+        Raises:
+            Exception: The first error raised by a stage, after all the stages stopped.
+        """
+        ADO_ENV.issue_type_map["Folder"] = self.folder_type
+        stages = [self.download_issues, self.download_tree, self.scan_existing_work_items, self.join_issues,
+                  self.create_tree] + [self.create_work_items] * self.concurrency
+        threads = [self._stage(stage) for stage in stages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            for error in self.errors[1:]:
+                write_logging_error(f"Pipeline stage failed: {error}")
+            raise self.errors[0]
+        linked = self.add_deferred_links()
+        write_logging_simple_message(f"{linked} links between Work Items created concurrently added")
+
+
+def run_migration_pipeline(project_name, scope=None):
+    """
+    Runs the migration of a project with the stages overlapping, see MigrationPipeline.
+
+    Args:
+        project_name (str): The name of the project in the Azure DevOps side and in Jira DC.
+        scope (MigrationScope): The folder to migrate, None for the whole project.
+
+    Returns:
+        None
+    """
+    project_key = get_project_by_name(project_name)["key"]
+    folder_type, _ = ease_requirements_helper.get_folder_work_item_type(ADO_ENV.organization, project_name)
+    write_logging_simple_message(f"Running the pipelined migration with {RUN_ENV.concurrency} Work Item creators")
+    pipeline = MigrationPipeline(project_name, project_key, folder_type, RUN_ENV.concurrency, RUN_ENV.queue_size,
+                                 RUN_ENV.issues_page_size, scope)
+    pipeline.run()
+    write_logging_simple_message(f"{pipeline.existing_count} data center issues found on the ADO")
+    if RUN_ENV.migrate_attachments:
+        metrics.start_phase("migrate_attachments")
+        migrate_attachments(pipeline.created_nodes, project_name, retry_failed=True)
+    if RUN_ENV.migrate_comments:
+        metrics.start_phase("migrate_comments")
+        issues = [node for node in pipeline.tree_items_list if not node.is_folder]
+        migrate_comments(issues, project_name, len(issues))
+    write_logging_simple_message("Migration completed")
+    write_logging_simple_message(
+        "Created " + str(pipeline.tree_items_created) + " items in the easeRequirements tree")
+    if RUN_ENV.verify_migration:
+        metrics.start_phase("verify_migration")
+        verify_migration(pipeline.tree_items_list, pipeline.deep_order_tree, pipeline.jira_ado_ids, project_name)
@@ -0,0 +1,251 @@
+"""Plans the requests of a migration in a dry run, estimates their duration and runs a saved plan later"""
+import json
+import math
+import re
+from urllib.parse import urlsplit
+
+from api.azure_dev_ops import ado_helper, ease_requirements_helper
+from api.azure_dev_ops.api import EaseRequirementsForAzureDevopsApi, ease_requirements_url
+from config.config import ADO_ENV, DC_ENV, RUN_ENV
+from report import metrics
+from report.log_and_report import initialize_logging, write_logging_simple_message
+from report.progress import PROGRESS
+from utilities import ado_verifications
+from utilities.id_registry import ID_REGISTRY
+from utilities.migrate_tree import create_work_item_from_body, process_data_to_create_work_item
+from utilities.origin_marker import get_migrated_work_item_ids, origin_key
+from utilities.run_record import RUN_RECORD
+
+REQUEST_PLAN = "./report/request_plan.jsonl"
+REQUEST_PLAN_SUMMARY = "./report/request_plan_summary.json"
+LOG_FILE = "migration"
+
+# Work Items created in the plan are referenced by their origin marker until they have an id
+REF_PREFIX = "$ref:"
+REF_PATTERN = re.compile(r"\$ref:((?:folder|issue)-[^/\"\s]+)")
+# Latency assumed for a host no request was sent to yet
+DEFAULT_LATENCY = 0.25
+
+
+class _PlannedIds:
+    """The jira_ado_ids of a dry run: the ids of the existing Work Items, the references of the planned ones."""
+
+    def __init__(self, known):
+        self.known = known
+        self.planned = {}
+
+    def get(self, jira_id, default=None):
+        if jira_id in self.planned:
+            return self.planned[jira_id]
+        return self.known.get(jira_id, default)
+
+    def __contains__(self, jira_id):
+        return self.get(jira_id) is not None
+
+    def __getitem__(self, jira_id):
+        value = self.get(jira_id)
+        if value is None:
+            raise KeyError(jira_id)
+        return value
+
+    def __setitem__(self, jira_id, value):
+        self.planned[jira_id] = value
+
+
+class _RequestCounter:
+    """Counts the planned requests per endpoint, named like the endpoints of the run metrics."""
+
+    def __init__(self):
+        self.endpoints = {}
+
+    def add(self, method, url, workers, count=1):
+        name = metrics.endpoint_name(method, url)
+        entry = self.endpoints.setdefault(name, {"host": urlsplit(url).netloc, "requests": 0, "workers": workers})
+        entry["requests"] += count
+
+
+def _count_attachments(counter, node, project_name):
+    work_items_url = f"{ADO_ENV.application_url.rstrip('/')}/{ADO_ENV.organization}/{project_name}/_apis/wit"
+    for _, size, content_url in node.attachments:
+        counter.add("GET", content_url, RUN_ENV.attachment_concurrency)
+        if size is not None and size > RUN_ENV.attachment_chunk_size:
+            counter.add("POST", f"{work_items_url}/attachments", RUN_ENV.attachment_concurrency)
+            counter.add("PUT", f"{work_items_url}/attachments/0", RUN_ENV.attachment_concurrency,
+                        math.ceil(size / RUN_ENV.attachment_chunk_size))
+        else:
+            counter.add("POST", f"{work_items_url}/attachments", RUN_ENV.attachment_concurrency)
+    counter.add("PATCH", f"{work_items_url}/workitems/0", RUN_ENV.attachment_concurrency,
+                math.ceil(len(node.attachments) / RUN_ENV.attachment_relations_batch))
+
+
+def _count_comments(counter, node, work_items_url):
+    if node.comments is None:
+        # Only the fetch of the comments the search did not return is counted, not the comments added
+        counter.add("GET", f"{DC_ENV.application_url.rstrip('/')}/rest/api/2/issue/0/comment",
+                    RUN_ENV.comment_concurrency)
+    elif node.comments:
+        counter.add("POST", f"{work_items_url}/0/comments", RUN_ENV.comment_concurrency, len(node.comments))
+
+
+def estimate(endpoints):
+    """
+    Estimate the duration of the planned requests from the latency measured to each host during the dry run.
+
+    Args:
+        endpoints (dict): The planned requests and workers of each endpoint.
+
+    Returns:
+        float: The estimated seconds.
+    """
+    latencies = metrics.METRICS.host_latencies()
+    fallback = sorted(latencies.values())[len(latencies) // 2] if latencies else DEFAULT_LATENCY
+    total = 0
+    for entry in endpoints.values():
+        entry["latency_seconds"] = latencies.get(entry["host"], fallback)
+        entry["seconds"] = entry["requests"] * entry["latency_seconds"] / entry["workers"]
+        total += entry["seconds"]
+    return total
+
+
+def write_request_plan(project_name, nodes_to_create, deep_order_tree, jira_ado_ids, path=REQUEST_PLAN):
+    """
+    Write the requests a migration would send as JSON lines: the body of every Work Item to create, in the
+    creation order, then the tree items in the tree order. The Work Items not created yet are referenced as
+    '$ref:<origin marker>' in the links and tree items. The attachments and comments are counted in the summary
+    but not written to the plan, the header records whether they were planned. A summary with the requests per endpoint and the
+    estimated duration is written to REQUEST_PLAN_SUMMARY.
+
+    Args:
+        project_name (str): The name of the project.
+        nodes_to_create (iterable): The TreeNode without a Work Item, in the creation order.
+        deep_order_tree (iterable): The TreeNode in depth-first order.
+        jira_ado_ids (dict): The Work Item id of each Jira id found on Azure DevOps.
+        path (str): The path of the plan.
+
+    Returns:
+        dict: The summary.
+    """
+    folder_type, _ = ease_requirements_helper.get_folder_work_item_type(ADO_ENV.organization, project_name)
+    ADO_ENV.issue_type_map["Folder"] = folder_type
+    project_id = ado_helper.get_project_by_id_or_name(ADO_ENV.organization, project_name)["id"]
+    workers = RUN_ENV.concurrency if RUN_ENV.pipeline else 1
+    work_items_url = f"{ADO_ENV.application_url.rstrip('/')}/{ADO_ENV.organization}/{project_name}/_apis/wit/workitems"
+    tree_items_url = f"{ease_requirements_url.rstrip('/')}/{EaseRequirementsForAzureDevopsApi.url_tree_items}" \
+                     f"{project_id}/Documents/"
+    planned_ids = _PlannedIds(jira_ado_ids)
+    counter = _RequestCounter()
+    links = 0
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(json.dumps({"request": "plan", "project": project_name, "organization": ADO_ENV.organization,
+                               "folder_type": folder_type, "migrate_attachments": RUN_ENV.migrate_attachments,
+                               "migrate_comments": RUN_ENV.migrate_comments}) + "\n")
+        for node in nodes_to_create:
+            work_item = process_data_to_create_work_item(node, project_name, planned_ids)
+            ref = origin_key(node)
+            planned_ids[str(node.jira_id)] = REF_PREFIX + ref
+            file.write(json.dumps({"request": "create_work_item", "ref": ref,
+                                   "work_item_type": work_item["work_item_type"], "body": work_item["body"]}) + "\n")
+            counter.add("POST", f"{work_items_url}/${work_item['work_item_type']}", workers)
+            if not node.is_folder:
+                # At most, the state is only set when the new Work Item does not start in it
+                counter.add("PATCH", f"{work_items_url}/0", workers)
+            links += sum(operation["path"] == "/relations/-" for operation in work_item["body"])
+            if RUN_ENV.migrate_attachments and node.attachments:
+                _count_attachments(counter, node, project_name)
+            if RUN_ENV.migrate_comments and not node.is_folder:
+                _count_comments(counter, node, work_items_url)
+        tree_items = 0
+        for node in deep_order_tree:
+            file.write(json.dumps({"request": "create_tree_item", "id": planned_ids[str(node.jira_id)],
+                                   "parent": planned_ids[str(node.jira_parent_id)]}) + "\n")
+            counter.add("PUT", tree_items_url, workers)
+            tree_items += 1
+
+    summary = {"project": project_name, "plan": path, "links": links, "tree_items": tree_items,
+               "work_items": len(planned_ids.planned), "estimated_seconds": estimate(counter.endpoints),
+               "endpoints": counter.endpoints}
+    with open(REQUEST_PLAN_SUMMARY, "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2)
+    write_logging_simple_message(
+        f"Request plan written to {path}: {summary['work_items']} Work Items with {links} links and "
+        f"{tree_items} tree items, {sum(entry['requests'] for entry in counter.endpoints.values())} requests "
+        f"estimated to take {summary['estimated_seconds']:.0f} s, see {REQUEST_PLAN_SUMMARY}")
+    return summary
+
+
+def _resolve(value, ids):
+    if isinstance(value, str) and value.startswith(REF_PREFIX):
+        return ids[value[len(REF_PREFIX):]]
+    return value
+
+
+def run_request_plan(path):
+    """
+    Send the requests of a plan written by a dry run, without downloading the project from Jira DC again.
+
+    The Work Items created by a previous run of the plan are found by their origin marker and not created again.
+    A plan made with migrate_attachments or migrate_comments is refused, since it does not hold these requests.
+
+    Args:
+        path (str): The path of the plan.
+    """
+    initialize_logging(LOG_FILE)
+    metrics.METRICS.reset()
+    with open(path, "r", encoding="utf-8") as file:
+        header = json.loads(file.readline())
+        project_name = header["project"]
+        if header["organization"] != ADO_ENV.organization:
+            raise Exception(f"The plan was made for the organization {header['organization']}")
+        planned = [option for option in ("migrate_attachments", "migrate_comments") if header.get(option)]
+        if planned:
+            options = " and ".join(planned)
+            raise Exception(f"The plan was made with {options}, which it cannot run. Run migrate.py instead, or "
+                            f"make the plan again with {options} set to false")
+        RUN_RECORD.start(project_name, RUN_ENV.run_record_file)
+        ID_REGISTRY.open(RUN_ENV.id_registry_file)
+        PROGRESS.start()
+        try:
+            _run_plan(file, project_name)
+        finally:
+            PROGRESS.stop()
+            RUN_RECORD.close()
+            ID_REGISTRY.close()
+            metrics.write_metrics_report(LOG_FILE, RUN_ENV.prometheus_metrics)
+
+
+def _run_plan(file, project_name):
+    metrics.start_phase("ado_verifications")
+    if not ado_verifications.run_project_ado_verifications(ADO_ENV.organization, project_name):
+        write_logging_simple_message("Azure DevOps verifications failed. Exiting...")
+        return
+    ids = get_migrated_work_item_ids(ADO_ENV.organization, project_name)
+    project_id = ado_helper.get_project_by_id_or_name(ADO_ENV.organization, project_name)["id"]
+
+    metrics.start_phase("create_work_items")
+    write_logging_simple_message(f"Running the request plan of {project_name}")
+    PROGRESS.track(None)
+    created = 0
+    tree_items = 0
+    for line in file:
+        entry = json.loads(line)
+        if entry["request"] == "create_work_item":
+            if entry["ref"] in ids:
+                continue
+            body = json.loads(REF_PATTERN.sub(lambda match: str(ids[match.group(1)]), json.dumps(entry["body"])))
+            ids[entry["ref"]] = create_work_item_from_body(
+                {"organization": ADO_ENV.organization, "project": project_name,
+                 "work_item_type": entry["work_item_type"], "body": body})
+            RUN_RECORD.record(ids[entry["ref"]], entry["ref"])
+            ID_REGISTRY.register_origins(ADO_ENV.organization, project_name, {entry["ref"]: ids[entry["ref"]]})
+            created += 1
+            PROGRESS.advance()
+        elif entry["request"] == "create_tree_item":
+            if tree_items == 0:
+                metrics.start_phase("create_tree_items")
+                PROGRESS.track(None)
+            ease_requirements_helper.create_single_tree_item(project_id, _resolve(entry["id"], ids),
+                                                             _resolve(entry["parent"], ids))
+            tree_items += 1
+            PROGRESS.advance()
+    write_logging_simple_message(f"Request plan completed: {created} Work Items and {tree_items} tree items created")
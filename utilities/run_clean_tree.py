@@ -1,3 +1,4 @@
+from report import metrics
 from report.log_and_report import initialize_logging, write_logging_simple_message
 from utilities import ease_requirements_functions
 
@@ -8,5 +9,6 @@ def run_clean(project_key):
     initialize_logging(LOG_FILE)
 
     # Delete tree items on project
+    metrics.start_phase("delete_tree_items")
     write_logging_simple_message(f"Deleting tree items on project: {project_key}")
     ease_requirements_functions.delete_tree_items_by_project_key(project_key)
@@ -1,33 +1,94 @@
 """Implements the migration from an R4J project to easeRequirements for Azure DevOps"""
 from api import r4j_helper
 from api.azure_dev_ops import ado_helper, ease_requirements_helper
-from api.data_center.jira_helper import get_all_issues_in_project_by_project_key_or_tree, get_project_by_name
-from config.config import ADO_ENV
+from api.data_center.jira_helper import get_project_by_name
+from config.config import ADO_ENV, RUN_ENV
+from report import metrics
 from report.log_and_report import (generate_expected_tree_html,
                                    initialize_logging, open_report_html,
                                    write_logging_simple_message)
+from report.progress import PROGRESS
 from utilities import ado_verifications, read_and_process_tree_items
 from utilities.migrate_tree import (
     create_work_items_on_ado, replace_tree_issues_data_with_jira_issue_data)
+from utilities.migrate_attachments import migrate_attachments
+from utilities.issue_search_plan import iterate_project_issue_pages
+from utilities.migrate_comments import migrate_comments
+from utilities.pipeline import run_migration_pipeline
+from utilities.request_plan import write_request_plan
+from utilities.id_registry import ID_REGISTRY
+from utilities.run_record import RUN_RECORD
+from utilities.tree_integrity import node_rows, verify_tree
+from utilities.verify_migration import verify_migration
+from utilities.wiki_markup import clear_converted_descriptions, convert_descriptions
+from utilities.working_set import run_migration_working_set
 from utilities.transform_data import sort_tree
 
 LOG_FILE = "migration"
 
 
-def run_migration(project_name, dry_run):
+def run_migration(project_name, dry_run, scope=None):
     """
     Runs the migration process for transferring thr requirements tree from Jira DC to Azure DevOps.
 
     Args:
         project_name (str): The name of the project in the Azure DevOps side and the project key on the Jira DC side.
         dry_run (bool): If True, performs a dry run without making any changes.
+        scope (MigrationScope): The folder to migrate and the Work Item to attach it under, None for the whole
+            project.
 
     Returns:
         None
     """
     initialize_logging(LOG_FILE)
+    metrics.METRICS.reset()
+    prometheus_server = metrics.start_prometheus_server(RUN_ENV.prometheus_port) if RUN_ENV.prometheus_port \
+        else None
+    if not dry_run:
+        RUN_RECORD.start(project_name, RUN_ENV.run_record_file)
+        if RUN_RECORD.run_id:
+            write_logging_simple_message(f"The created Work Items are recorded as the run {RUN_RECORD.run_id}")
+    ID_REGISTRY.open(RUN_ENV.id_registry_file)
+    PROGRESS.start()
+    try:
+        _migrate(project_name, dry_run, scope)
+    finally:
+        PROGRESS.stop()
+        RUN_RECORD.close()
+        ID_REGISTRY.close()
+        clear_converted_descriptions()
+        write_metrics_summary()
+        if prometheus_server is not None:
+            metrics.stop_prometheus_server(prometheus_server)
+
+
+def write_metrics_summary():
+    """
+    Write the timings and request metrics of the run under the report folder and log the phase durations.
+
+    Returns:
+        None
+    """
+    summary = metrics.write_metrics_report(LOG_FILE, RUN_ENV.prometheus_metrics)
+    for phase in summary["phases"]:
+        write_logging_simple_message(f"Phase '{phase['phase']}' took {phase['seconds']:.2f} s ({phase['requests']} "
+                                     f"requests, {phase['errors']} errors, {phase['retries']} retries)")
 
+
+def _migrate(project_name, dry_run, scope):
+    """
+    Runs the phases of the migration, see run_migration.
+
+    Args:
+        project_name (str): The name of the project in the Azure DevOps side and the project key on the Jira DC side.
+        dry_run (bool): If True, performs a dry run without making any changes.
+        scope (MigrationScope): The folder to migrate, None for the whole project.
+
+    Returns:
+        None
+    """
     # Azure DevOps verifications
+    metrics.start_phase("ado_verifications")
     write_logging_simple_message("Azure DevOps verifications started")
     flag_ado_verifications = ado_verifications.run_project_ado_verifications(
         ADO_ENV.organization, project_name)
@@ -37,34 +98,81 @@ def run_migration(project_name, dry_run):
         write_logging_simple_message(
             "Azure DevOps verifications failed. Exiting...")
         return
+    if scope is not None:
+        write_logging_simple_message(f"Migrating the scope {scope}")
+        if not scope.verify_parent(project_name):
+            write_logging_simple_message(f"Parent Work Item {scope.parent_id} not found. Exiting...")
+            return
 
-    # Download the Issue from Jira DC
-    write_logging_simple_message("Download the issues from Jira DC")
-    project = get_project_by_name(project_name)
-    project_key = project["key"]
-    project_issues = get_all_issues_in_project_by_project_key_or_tree(project_key, project_name)[
-        "issues"]
+    if RUN_ENV.working_set == "sqlite":
+        run_migration_working_set(project_name, dry_run, scope)
+        return
+
+    if RUN_ENV.pipeline and not dry_run and not RUN_ENV.legacy_resume_matching:
+        # The issues are still downloading when the first Work Items are created, only the maps are checked
+        metrics.start_phase("verify_mappings")
+        if not ado_verifications.verify_mappings(ADO_ENV.organization, project_name,
+                                                 *ado_verifications.configured_mapping_combinations()):
+            write_logging_simple_message("Mapping verifications failed. Exiting...")
+            return
+        metrics.start_phase("pipeline")
+        run_migration_pipeline(project_name, scope)
+        return
 
     # Download the tree from R4JDC
+    metrics.start_phase("download_tree")
     write_logging_simple_message("Download the tree from R4JDC")
+    project = get_project_by_name(project_name)
+    project_key = project["key"]
     data_center_tree = r4j_helper.get_complete_tree_structure_by_project_key(
         project_key)
+    if scope is not None:
+        data_center_tree = scope.prune(data_center_tree)
+
+    # Download the Issue from Jira DC, only the issues of the folder for a scoped migration
+    metrics.start_phase("download_issues")
+    write_logging_simple_message("Download the issues from Jira DC")
+    project_issues = [issue for page in iterate_project_issue_pages(project_key, project_name, scope)
+                      for issue in page]
+    metrics.start_phase("flatten_tree")
     tree_items_list = []
     read_and_process_tree_items(data_center_tree, tree_items_list)
 
+    # Check the tree before the expensive phases, a broken tree would fail after the Work Items are created
+    metrics.start_phase("verify_tree")
+    if not verify_tree(node_rows(tree_items_list)) and not dry_run:
+        write_logging_simple_message("Tree verifications failed. Exiting...")
+        return
+
     # Replace r4j the issues data with Jira data center Issue data
+    metrics.start_phase("update_issue_data")
     write_logging_simple_message("Updating issue data")
     replace_tree_issues_data_with_jira_issue_data(
         tree_items_list, project_issues)
 
+    # Check the maps against the Azure DevOps process before the first write
+    metrics.start_phase("verify_mappings")
+    mappings_valid = ado_verifications.verify_mappings(
+        ADO_ENV.organization, project_name, *ado_verifications.count_mapping_combinations(tree_items_list))
+    if not mappings_valid and not dry_run:
+        write_logging_simple_message("Mapping verifications failed. Exiting...")
+        return
+
+    if not dry_run:
+        metrics.start_phase("convert_descriptions")
+        write_logging_simple_message("Converting the descriptions to HTML")
+        convert_descriptions(tree_items_list)
+
     # Check if all issues are found on the Jira Cloud instance
+    metrics.start_phase("find_existing_work_items")
     write_logging_simple_message(
         "Check if all issues are found on the Azure DevOps instance")
-    jira_ado_ids = {"-1": -1}
+    jira_ado_ids = {"-1": scope.root_id if scope is not None else -1}
     verify_issues_in_ado = ado_verifications.verify_all_data_center_tree_issues_in_ado_instance(jira_ado_ids,
                                                                                                 tree_items_list,
                                                                                                 ADO_ENV.organization,
                                                                                                 project_name)
+    nodes_to_create = []
     if verify_issues_in_ado:
         write_logging_simple_message(
             "ADO ISSUES: Tree data center issues are found on the ADO instance.")
@@ -74,45 +182,75 @@ def run_migration(project_name, dry_run):
             f"going to create {len(tree_items_list) - (len(jira_ado_ids) -1)} WorkItems")
 
         # Get folder type
+        metrics.start_phase("get_folder_work_item_type")
         write_logging_simple_message("Get folder work item type")
         folder_type, _ = ease_requirements_helper.get_folder_work_item_type(
             ADO_ENV.organization, project_name)
 
         # Create all the issues as Work Items
+        metrics.start_phase("create_work_items")
         write_logging_simple_message("Creating issues as Work Items")
         if not dry_run:
+            nodes_to_create = [issue for issue in tree_items_list if not issue.id]
             create_work_items_on_ado(
                 tree_items_list, jira_ado_ids, folder_type, project_name)
 
+    if RUN_ENV.migrate_attachments and not dry_run:
+        metrics.start_phase("migrate_attachments")
+        write_logging_simple_message("Migrating the attachments")
+        # Run even when every Work Item exists, to retry the attachments that failed in the previous runs
+        migrate_attachments(nodes_to_create, project_name, retry_failed=True)
+
     if not dry_run:
         # Replace the Jira id with the Ado ids
+        metrics.start_phase("replace_parent_ids")
         write_logging_simple_message(
             "Replacing Jira Ids with the Work Item Ado Ids")
-        for index, issue in enumerate(tree_items_list):
-            issue["parent_id"] = jira_ado_ids[str(issue["jira_parent_id"])]
-            tree_items_list[index] = issue
+        for issue in tree_items_list:
+            issue.parent_id = jira_ado_ids[str(issue.jira_parent_id)]
 
         # Sort the tree item list by level and position
+        metrics.start_phase("sort_tree")
         write_logging_simple_message("Sort tree to create")
         deep_order_tree = sort_tree(tree_items_list)
 
         # Create the new tree on Azure DevOps
+        metrics.start_phase("create_tree_items")
         write_logging_simple_message("Creating the new tree on Azure DevOps")
         tree_items_created = []
         project_id = ado_helper.get_project_by_id_or_name(
             ADO_ENV.organization, project_name)["id"]
+        PROGRESS.track(len(deep_order_tree))
         for issue in deep_order_tree:
-            tree_items_created.append(ease_requirements_helper.create_single_tree_item(project_id, issue["id"],
-                                                                                       issue["parent_id"]))
+            tree_items_created.append(ease_requirements_helper.create_single_tree_item(project_id, issue.id,
+                                                                                       issue.parent_id))
+            PROGRESS.advance()
         write_logging_simple_message("Migration completed")
         write_logging_simple_message(
             "Created " + str(len(tree_items_created)) + " items in the easeRequirements tree")
 
+        if RUN_ENV.migrate_comments:
+            metrics.start_phase("migrate_comments")
+            write_logging_simple_message("Migrating the comments")
+            issues = [issue for issue in tree_items_list if not issue.is_folder]
+            migrate_comments(issues, project_name, len(issues))
+
+        if RUN_ENV.verify_migration:
+            metrics.start_phase("verify_migration")
+            verify_migration(tree_items_list, deep_order_tree, jira_ado_ids, project_name)
+
     # Generate report HTML with expected tree structure
     else:
+        metrics.start_phase("sort_tree")
         deep_order_tree = sort_tree(tree_items_list)
+        metrics.start_phase("expected_tree_html")
         write_logging_simple_message("Expected tree HTML generating")
         expected_tree_path = "./report/expected_tree.html"
         generate_expected_tree_html(
             expected_tree_path, deep_order_tree, project_name)
+
+        metrics.start_phase("request_plan")
+        write_logging_simple_message("Writing the request plan")
+        write_request_plan(project_name, [issue for issue in tree_items_list if not issue.id], deep_order_tree,
+                           jira_ado_ids)
         open_report_html(expected_tree_path)
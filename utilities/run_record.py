@@ -0,0 +1,92 @@
+"""Records the Work Items created by a migration run, so the run can be rolled back"""
+import json
+import threading
+import uuid
+from datetime import datetime, timezone
+
+ALL_RUNS = "all"
+
+
+class RunRecord:
+    """
+    Appends a JSON line with the run id, time, project, Work Item id and origin marker of every Work Item created
+    by a run.
+
+    Each line is flushed when it is written, so the record of a run that failed is complete up to the failure.
+    The lines of the following runs are appended to the same file, told apart by their run id.
+    """
+
+    def __init__(self):
+        self._file = None
+        self._project = None
+        self.run_id = None
+        self._lock = threading.Lock()
+
+    def start(self, project, path):
+        """
+        Start recording the Work Items created in a project.
+
+        Args:
+            project (str): The name of the project.
+            path (str): The path of the record file, None to record nothing.
+        """
+        self.close()
+        if path:
+            self._project = project
+            self.run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:6]}"
+            self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, work_item_id, origin):
+        """
+        Record a created Work Item.
+
+        Args:
+            work_item_id (int): The id of the Work Item.
+            origin (str): The origin marker of the Work Item.
+        """
+        if self._file is None:
+            return
+        line = json.dumps({"run": self.run_id, "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                           "project": self._project, "id": work_item_id, "origin": origin})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_created_work_item_ids(path, project, run_id=None):
+    """
+    Read the ids of the Work Items created in a project by a run from a record file. The lines written before
+    the runs had an id belong to a single run, which has no id.
+
+    Args:
+        path (str): The path of the record file.
+        project (str): The name of the project.
+        run_id (str): The id of the run, None for the last run of the project, ALL_RUNS for every run.
+
+    Returns:
+        tuple: The id of the run read, or ALL_RUNS, and its Work Item ids in creation order without duplicates.
+    """
+    runs = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                if entry["project"] == project:
+                    run = entry.get("run")
+                    # A run moves to the end when it writes, so the last key is the run that wrote last
+                    work_item_ids = runs.pop(run, {})
+                    work_item_ids[entry["id"]] = None
+                    runs[run] = work_item_ids
+    if run_id == ALL_RUNS:
+        return ALL_RUNS, list(dict.fromkeys(work_item_id for ids in runs.values() for work_item_id in ids))
+    if run_id is None:
+        run_id = next(reversed(runs), None)
+    return run_id, list(runs.get(run_id, ()))
+
+
+RUN_RECORD = RunRecord()
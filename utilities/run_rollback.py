@@ -0,0 +1,109 @@
+"""Rolls back a migration: deletes the Work Items it created and their tree items"""
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+
+from api.azure_dev_ops import ado_helper, ease_requirements_helper
+from config.config import ADO_ENV, RUN_ENV
+from report import metrics
+from report.log_and_report import initialize_logging, write_logging_error, write_logging_simple_message
+from utilities.id_registry import ID_REGISTRY
+from utilities.origin_marker import get_migrated_work_items
+from utilities.run_record import read_created_work_item_ids
+
+LOG_FILE = "rollback"
+
+
+def _chunks(values, size):
+    return [values[index:index + size] for index in range(0, len(values), size)]
+
+
+def delete_work_items(organization, project, work_item_ids, destroy):
+    """
+    Delete Work Items with the batch delete endpoint, sending the chunks in parallel.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+        work_item_ids (list): The ids of the Work Items.
+        destroy (bool): True to destroy the Work Items, False to move them to the recycle bin.
+
+    Returns:
+        int: The number of Work Items that could not be deleted.
+    """
+    failed = 0
+    chunks = _chunks(work_item_ids, ado_helper.WORK_ITEMS_BATCH_SIZE)
+    with ThreadPoolExecutor(max_workers=RUN_ENV.concurrency) as executor:
+        futures = [executor.submit(ado_helper.delete_work_items, organization, project, chunk, destroy)
+                   for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            try:
+                failed += len(future.result())
+            except Exception as e:
+                failed += len(chunk)
+                write_logging_error(f"Work Items {chunk[0]} to {chunk[-1]} not deleted: {e}")
+    return failed
+
+
+def delete_tree_items(project_id, work_item_ids):
+    """
+    Delete the tree items of Work Items in parallel. The tree items have the id of their Work Item.
+
+    Args:
+        project_id (str): The ID of the project.
+        work_item_ids (list): The ids of the Work Items.
+
+    Returns:
+        int: The number of tree items deleted.
+    """
+    work_item_ids = {str(work_item_id) for work_item_id in work_item_ids}
+    tree_items = ease_requirements_helper.get_all_tree_items(project_id) or []
+    item_ids = [item["id"] for item in tree_items if str(item["id"]) in work_item_ids]
+    with ThreadPoolExecutor(max_workers=RUN_ENV.concurrency) as executor:
+        list(executor.map(ease_requirements_helper.delete_single_tree_item, repeat(project_id), item_ids))
+    return len(item_ids)
+
+
+def run_rollback(project_name, record_path=None, destroy=False, run_id=None):
+    """
+    Delete the Work Items created by the migrations of a project, and their tree items.
+
+    The Work Items created by a run are read from a run record when record_path is given, otherwise all the
+    Work Items carrying an origin marker are deleted.
+
+    Args:
+        project_name (str): The name of the project in the Azure DevOps side.
+        record_path (str): The path of the run record, see run_env.run_record_file.
+        destroy (bool): True to destroy the Work Items instead of moving them to the recycle bin.
+        run_id (str): The run of the record to roll back, None for the last run of the project, 'all' for every
+            run.
+    """
+    initialize_logging(LOG_FILE)
+    organization = ADO_ENV.organization
+
+    metrics.start_phase("find_created_work_items")
+    if record_path:
+        write_logging_simple_message(f"Reading the created Work Items from {record_path}")
+        run_id, work_item_ids = read_created_work_item_ids(record_path, project_name, run_id)
+        write_logging_simple_message(f"Rolling back the run {run_id or 'without id'} of the record")
+    else:
+        write_logging_simple_message("Searching the Work Items created by the migration")
+        work_item_ids = [work_item["id"] for work_item in get_migrated_work_items(organization, project_name)]
+    if not work_item_ids:
+        write_logging_simple_message("No Work Items to roll back")
+        return
+
+    metrics.start_phase("delete_tree_items")
+    project_id = ado_helper.get_project_by_id_or_name(organization, project_name)["id"]
+    deleted_tree_items = delete_tree_items(project_id, work_item_ids)
+    write_logging_simple_message(f"{deleted_tree_items} tree items deleted")
+
+    metrics.start_phase("delete_work_items")
+    action = "Destroying" if destroy else "Deleting"
+    write_logging_simple_message(f"{action} {len(work_item_ids)} Work Items")
+    failed = delete_work_items(organization, project_name, work_item_ids, destroy)
+    ID_REGISTRY.open(RUN_ENV.id_registry_file)
+    try:
+        ID_REGISTRY.remove(organization, work_item_ids)
+    finally:
+        ID_REGISTRY.close()
+    write_logging_simple_message(f"{len(work_item_ids) - failed} Work Items deleted, {failed} failed")
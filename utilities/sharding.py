@@ -0,0 +1,423 @@
+"""Sharded migration of a large project: several workers, on one or more hosts, migrate subtrees of the project"""
+import os
+import socket
+import time
+
+from api.azure_dev_ops import ado_helper, ease_requirements_helper
+from config.config import ADO_ENV, RUN_ENV
+from report import metrics
+from report.log_and_report import initialize_logging, write_logging_simple_message
+from report.progress import PROGRESS
+from utilities import ado_verifications
+from utilities.id_registry import ID_REGISTRY
+from utilities.migrate_attachments import migrate_attachments
+from utilities.migrate_comments import migrate_comments
+from utilities.migrate_tree import create_work_item_for_node, link_relation
+from utilities.origin_marker import get_migrated_work_item_ids
+from utilities.run_record import RUN_RECORD
+from utilities.verify_migration import verify_migration
+from utilities.working_set import WorkItemIds, WorkingSet, load_project
+
+LOG_FILE = "sharded_migration"
+
+# The trunk: the folders too large to be a shard, whose Work Items are created by the plan
+TRUNK_SHARD = 0
+
+SHARDS_SCHEMA = """
+CREATE TABLE shards (
+    shard INTEGER PRIMARY KEY, size INTEGER, status TEXT DEFAULT 'pending', owner TEXT, lease_expires REAL,
+    attempts INTEGER DEFAULT 0
+);
+CREATE INDEX nodes_shard ON nodes (shard);
+"""
+
+
+def plan_shards(levels, is_folder, shard_size):
+    """
+    Split a tree in depth-first order into shards at folder boundaries.
+
+    A subtree is kept whole when it has at most shard_size nodes; consecutive small sibling subtrees are grouped
+    into one shard. A folder with a larger subtree goes to the trunk and its children are split in turn. An
+    issue with a larger subtree, which cannot be split at a folder, is a shard of its own.
+
+    Args:
+        levels (list): The level of each node, in depth-first order.
+        is_folder (list): True for the folders, in the same order.
+        shard_size (int): The maximum number of nodes of a shard.
+
+    Returns:
+        tuple: The shard of each node (TRUNK_SHARD for the trunk), the indexes of the shard roots, and the
+            number of nodes of each shard.
+    """
+    count = len(levels)
+    sizes = [1] * count
+    # Subtree sizes, accumulated from the last node up to its ancestors
+    stack = []
+    for index in range(count - 1, -1, -1):
+        while stack and levels[stack[-1]] > levels[index]:
+            sizes[index] += sizes[stack.pop()]
+        stack.append(index)
+
+    shards = [TRUNK_SHARD] * count
+    roots = []
+    shard_sizes = {TRUNK_SHARD: 0}
+
+    def children(index):
+        child = index + 1
+        while child < index + sizes[index]:
+            yield child
+            child += sizes[child]
+
+    def emit(group):
+        if not group:
+            return
+        shard = len(shard_sizes)
+        shard_sizes[shard] = 0
+        for root in group:
+            roots.append(root)
+            for node in range(root, root + sizes[root]):
+                shards[node] = shard
+            shard_sizes[shard] += sizes[root]
+
+    def assign(siblings):
+        group = []
+        group_size = 0
+        for node in siblings:
+            if sizes[node] > shard_size and is_folder[node]:
+                shard_sizes[TRUNK_SHARD] += 1
+                assign(list(children(node)))
+                continue
+            if group and group_size + sizes[node] > shard_size:
+                emit(group)
+                group, group_size = [], 0
+            group.append(node)
+            group_size += sizes[node]
+        emit(group)
+
+    top_level = []
+    index = 0
+    while index < count:
+        top_level.append(index)
+        index += sizes[index]
+    assign(top_level)
+    return shards, roots, shard_sizes
+
+
+class ShardCoordinator:
+    """
+    Lease store of the shards, in the working set shared by the workers.
+
+    A worker claims the first pending shard, or a shard whose lease expired because its worker stopped, and
+    renews the lease while it works on it. The claims run in immediate transactions, so two workers never hold
+    the same shard.
+
+    Args:
+        working_set (WorkingSet): The working set of the sharded migration.
+        owner (str): The name of the worker.
+    """
+
+    def __init__(self, working_set, owner):
+        self.connection = working_set.connection
+        self.owner = owner
+
+    def claim(self):
+        """
+        Claim a shard. The shards are claimed in order, the trunk being migrated by the plan.
+
+        Returns:
+            tuple: The shard and True if an expired lease was taken over, None when no shard is left.
+        """
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT shard, attempts FROM shards WHERE status = 'pending' OR (status = 'leased' AND "
+                "lease_expires < ?) ORDER BY shard LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE shards SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                    "WHERE shard = ?", (self.owner, now + RUN_ENV.shard_lease_seconds, row[0]))
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return (row[0], row[1] > 0) if row else None
+
+    def renew(self, shard):
+        """
+        Extend the lease of a shard and commit the progress made on it.
+
+        Args:
+            shard (int): The shard.
+        """
+        renewed = self.connection.execute(
+            "UPDATE shards SET lease_expires = ? WHERE shard = ? AND owner = ? AND status = 'leased'",
+            (time.time() + RUN_ENV.shard_lease_seconds, shard, self.owner)).rowcount
+        self.connection.commit()
+        if not renewed:
+            raise Exception(f"The lease of shard {shard} was lost, it is migrated by another worker")
+
+    def complete(self, shard):
+        self.connection.execute("UPDATE shards SET status = 'done' WHERE shard = ? AND owner = ?",
+                                (shard, self.owner))
+        self.connection.commit()
+
+    def pending(self):
+        """
+        Returns:
+            list: The shards that are not done.
+        """
+        return [row[0] for row in self.connection.execute("SELECT shard FROM shards WHERE status != 'done'")]
+
+
+def _run(project_name, function, *args, record=True):
+    initialize_logging(LOG_FILE)
+    metrics.METRICS.reset()
+    if record:
+        RUN_RECORD.start(project_name, RUN_ENV.run_record_file)
+    ID_REGISTRY.open(RUN_ENV.id_registry_file)
+    PROGRESS.start()
+    try:
+        return function(project_name, *args)
+    finally:
+        PROGRESS.stop()
+        RUN_RECORD.close()
+        ID_REGISTRY.close()
+        metrics.write_metrics_report(LOG_FILE, RUN_ENV.prometheus_metrics)
+
+
+def plan_sharded_migration(project_name, shard_size=None):
+    """
+    Download the project into the shared working set (run_env.shard_file) and split it into shards, then create
+    the Work Items and tree items of the trunk and of the shard roots, so the workers create the tree items of
+    their shards under parents already in the tree.
+
+    Args:
+        project_name (str): The name of the project in the Azure DevOps side and in Jira DC.
+        shard_size (int): The maximum number of nodes of a shard, run_env.shard_size by default.
+    """
+    _run(project_name, _plan, shard_size or RUN_ENV.shard_size)
+
+
+def _plan(project_name, shard_size):
+    metrics.start_phase("ado_verifications")
+    if not ado_verifications.run_project_ado_verifications(ADO_ENV.organization, project_name):
+        write_logging_simple_message("Azure DevOps verifications failed. Exiting...")
+        return
+
+    working_set = WorkingSet(RUN_ENV.shard_file, journal_mode=RUN_ENV.shard_journal_mode)
+    try:
+        if not load_project(working_set, project_name):
+            write_logging_simple_message("Tree verifications failed. Exiting...")
+            return
+
+        metrics.start_phase("verify_mappings")
+        if not ado_verifications.verify_mappings(ADO_ENV.organization, project_name,
+                                                 *working_set.mapping_combinations()):
+            write_logging_simple_message("Mapping verifications failed. Exiting...")
+            return
+
+        metrics.start_phase("find_existing_work_items")
+        migrated_ids = get_migrated_work_item_ids(ADO_ENV.organization, project_name)
+        existing = working_set.match_migrated(migrated_ids)
+        if RUN_ENV.legacy_resume_matching:
+            existing += working_set.match_legacy(ADO_ENV.organization, project_name, migrated_ids)
+        write_logging_simple_message(f"{existing} data center issues found on the ADO")
+
+        metrics.start_phase("plan_shards")
+        rows = working_set.connection.execute(
+            "SELECT rowid, level, is_folder FROM nodes WHERE tree_order IS NOT NULL ORDER BY tree_order").fetchall()
+        shards, roots, shard_sizes = plan_shards([row[1] for row in rows], [bool(row[2]) for row in rows],
+                                                 shard_size)
+        connection = working_set.connection
+        connection.executemany("UPDATE nodes SET shard = ? WHERE rowid = ?",
+                               [(shard, row[0]) for shard, row in zip(shards, rows)])
+        connection.executemany("UPDATE nodes SET shard_root = 1 WHERE rowid = ?", [(rows[root][0],) for root in roots])
+        connection.executescript(SHARDS_SCHEMA)
+        connection.executemany("INSERT INTO shards (shard, size) VALUES (?, ?)", shard_sizes.items())
+        connection.commit()
+        write_logging_simple_message(f"{len(rows)} nodes split into {len(shard_sizes) - 1} shards of at most "
+                                     f"{shard_size} nodes and a trunk of {shard_sizes[TRUNK_SHARD]} folders")
+
+        _create_trunk(working_set, project_name)
+        connection.execute("UPDATE shards SET status = 'done' WHERE shard = ?", (TRUNK_SHARD,))
+        connection.commit()
+    finally:
+        working_set.close()
+
+
+def _create_trunk(working_set, project_name):
+    """
+    Create the Work Items of the trunk and of the shard roots, then their tree items in the tree order. The
+    children of a trunk folder are all trunk folders or shard roots, so their sibling order is the source order
+    whatever the order the workers migrate the shards in.
+    """
+    folder_type, _ = ease_requirements_helper.get_folder_work_item_type(ADO_ENV.organization, project_name)
+    ADO_ENV.issue_type_map["Folder"] = folder_type
+    project_id = ado_helper.get_project_by_id_or_name(ADO_ENV.organization, project_name)["id"]
+    trunk = f"shard = {TRUNK_SHARD} OR shard_root = 1"
+
+    metrics.start_phase("create_work_items")
+    created = []
+    PROGRESS.track(working_set.count(f"({trunk}) AND id IS NULL"))
+    for rowid, node in working_set.iter_nodes(f"({trunk}) AND id IS NULL", "tree_order"):
+        # The links to the roots of the same shard are added here, the others by the shard or by finish
+        shard = working_set.connection.execute("SELECT shard FROM nodes WHERE rowid = ?", (rowid,)).fetchone()[0]
+        create_work_item_for_node(node, project_name, WorkItemIds(working_set, shard))
+        working_set.save_id(rowid, node, created=True)
+        working_set.connection.commit()
+        PROGRESS.advance()
+        if node.attachments:
+            created.append(node)
+
+    if RUN_ENV.migrate_attachments:
+        metrics.start_phase("migrate_attachments")
+        # The plan runs once per migration, so the attachments that failed in the previous runs are retried here
+        migrate_attachments(created, project_name, retry_failed=True)
+
+    metrics.start_phase("create_tree_items")
+    jira_ado_ids = working_set.jira_ado_ids
+    wired = 0
+    PROGRESS.track(working_set.count(trunk))
+    for rowid, node in working_set.iter_nodes(trunk, "tree_order"):
+        node.parent_id = jira_ado_ids[node.jira_parent_id]
+        ease_requirements_helper.create_single_tree_item(project_id, node.id, node.parent_id)
+        working_set.save_id(rowid, node)
+        wired += 1
+        PROGRESS.advance()
+    working_set.connection.commit()
+    write_logging_simple_message(f"{wired} trunk items and shard roots created in the tree")
+
+
+def run_shard_worker(project_name, worker_name=None):
+    """
+    Claim the shards of a planned migration and migrate them until none is left.
+
+    For each shard, the worker creates the Work Items of its nodes and the tree items of the nodes below the
+    shard roots, whose tree items were created by the plan. The links to the nodes of other shards are left to
+    finish_sharded_migration.
+
+    Args:
+        project_name (str): The name of the project in the Azure DevOps side and in Jira DC.
+        worker_name (str): The name of the worker in the leases, the host name and process id by default.
+    """
+    _run(project_name, _work, worker_name or f"{socket.gethostname()}-{os.getpid()}")
+
+
+def _work(project_name, worker_name):
+    working_set = WorkingSet(RUN_ENV.shard_file, create=False, journal_mode=RUN_ENV.shard_journal_mode)
+    try:
+        coordinator = ShardCoordinator(working_set, worker_name)
+        folder_type, _ = ease_requirements_helper.get_folder_work_item_type(ADO_ENV.organization, project_name)
+        ADO_ENV.issue_type_map["Folder"] = folder_type
+        project_id = ado_helper.get_project_by_id_or_name(ADO_ENV.organization, project_name)["id"]
+        while True:
+            claimed = coordinator.claim()
+            if claimed is None:
+                break
+            shard, taken_over = claimed
+            write_logging_simple_message(f"Worker {worker_name} migrating shard {shard}")
+            if taken_over:
+                # The previous worker may have created Work Items it did not save
+                working_set.match_migrated(get_migrated_work_item_ids(ADO_ENV.organization, project_name))
+            _migrate_shard(working_set, coordinator, shard, project_name, project_id)
+            coordinator.complete(shard)
+        write_logging_simple_message(f"Worker {worker_name} found no shard left to migrate")
+    finally:
+        working_set.close()
+
+
+def _migrate_shard(working_set, coordinator, shard, project_name, project_id):
+    jira_ado_ids = WorkItemIds(working_set, shard)
+
+    metrics.start_phase("create_work_items")
+    created = []
+    PROGRESS.track(working_set.count(f"shard = {shard} AND id IS NULL"))
+    for rowid, node in working_set.iter_nodes(f"shard = {shard} AND id IS NULL"):
+        create_work_item_for_node(node, project_name, jira_ado_ids)
+        working_set.save_id(rowid, node, created=True)
+        coordinator.renew(shard)
+        PROGRESS.advance()
+        if node.attachments:
+            created.append(node)
+
+    if RUN_ENV.migrate_attachments and created:
+        metrics.start_phase("migrate_attachments")
+        migrate_attachments(created, project_name, lambda: coordinator.renew(shard))
+
+    # Creating a tree item again only rewrites it, so a shard taken over is simply created again
+    metrics.start_phase("create_tree_items")
+    PROGRESS.track(working_set.count(f"shard = {shard} AND shard_root = 0"))
+    for rowid, node in working_set.iter_nodes(f"shard = {shard} AND shard_root = 0", "tree_order"):
+        node.parent_id = jira_ado_ids[node.jira_parent_id]
+        ease_requirements_helper.create_single_tree_item(project_id, node.id, node.parent_id)
+        working_set.save_id(rowid, node)
+        coordinator.renew(shard)
+        PROGRESS.advance()
+
+
+def finish_sharded_migration(project_name):
+    """
+    Once every shard is migrated, add the links between the nodes of different shards, migrate the comments and
+    verify the migration.
+
+    Args:
+        project_name (str): The name of the project in the Azure DevOps side and in Jira DC.
+    """
+    _run(project_name, _finish, record=False)
+
+
+def _finish(project_name):
+    working_set = WorkingSet(RUN_ENV.shard_file, create=False, journal_mode=RUN_ENV.shard_journal_mode)
+    try:
+        pending = ShardCoordinator(working_set, None).pending()
+        if pending:
+            raise Exception(f"Shards {', '.join(map(str, pending))} are not migrated yet")
+        jira_ado_ids = working_set.jira_ado_ids
+
+        metrics.start_phase("cross_shard_links")
+        linked = _add_cross_shard_links(working_set, project_name)
+        write_logging_simple_message(f"{linked} links between shards added")
+
+        if RUN_ENV.migrate_comments:
+            metrics.start_phase("migrate_comments")
+            issues = "id IS NOT NULL AND is_folder = 0"
+            migrate_comments((node for _, node in working_set.iter_nodes(issues)), project_name,
+                             working_set.count(issues))
+
+        if RUN_ENV.verify_migration:
+            metrics.start_phase("verify_migration")
+            ordered = "tree_order IS NOT NULL"
+            verify_migration((node for _, node in working_set.iter_nodes(ordered)),
+                             (node for _, node in working_set.iter_nodes(ordered, "tree_order")),
+                             jira_ado_ids, project_name)
+    finally:
+        working_set.close()
+
+
+def _add_cross_shard_links(working_set, project_name):
+    """
+    Add the links whose target is in another shard to the Work Items created by the workers, once per pair of
+    issues as the Jira links are listed on both issues and Azure DevOps adds the reverse link.
+
+    Returns:
+        int: The number of links added.
+    """
+    connection = working_set.connection
+    added = set()
+    for _, node in working_set.iter_nodes("is_folder = 0 AND created = 1 AND links != '[]'"):
+        shard = connection.execute("SELECT shard FROM nodes WHERE jira_id = ? AND is_folder = 0 LIMIT 1",
+                                   (str(node.jira_id),)).fetchone()[0]
+        relations = []
+        for target_issue_id, link_name in node.links:
+            target = connection.execute("SELECT shard, id FROM nodes WHERE jira_id = ? AND is_folder = 0 LIMIT 1",
+                                        (str(target_issue_id),)).fetchone()
+            pair = (min(str(node.jira_id), str(target_issue_id)), max(str(node.jira_id), str(target_issue_id)),
+                    link_name)
+            if target is None or target[0] == shard or not target[1] or pair in added:
+                continue
+            added.add(pair)
+            relations.append(link_relation(link_name, project_name, target[1]))
+        if relations:
+            ado_helper.update_work_item(ADO_ENV.organization, project_name, node.id, relations)
+    return len(added)
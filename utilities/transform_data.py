@@ -1,13 +1,15 @@
+from utilities.tree_node import TreeNode
+
 ROOT_ITEM = {'issue_key': -1, 'level': 1}
 
 
 def read_and_process_tree_items(data_input, _data_output, level=1, folder_id=-1, issue_id=None):
     """
-    Get the tree data from Data Center and
+    Get the tree data from Data Center and flatten it into a list of TreeNode
 
     Args:
         data_input (dict): R4J tree retrieved from the data center instance
-        _data_output: (list): List to be populated with the data processed
+        _data_output: (list): List to be populated with the TreeNode of every folder and issue
         level (int): Int that represents the level of the tree
         folder_id (str): id of the folder parent
         issue_id (str): id of the issue parent
@@ -17,24 +19,14 @@ def read_and_process_tree_items(data_input, _data_output, level=1, folder_id=-1,
 
     for folder in data_input["folders"]:
         data_folders = {"id": folder["name"], "folders": folder["folders"], "issues": folder["issues"]}
-        position = folder["absolutePosition"]
-        _data_output.append({"parent": root, "folder_name": folder["name"], "position": position, "level": level,
-                             "folder": True, "folderData": folder, "jira_id": folder["id"], "jira_parent_id": parent_id
-                             })
+        _data_output.append(TreeNode.from_r4j_folder(folder, root, level, parent_id))
         read_and_process_tree_items(data_folders, _data_output, level + 1, folder["id"])
 
     for issue in data_input["issues"]:
-        position = issue["absolutePosition"]
+        _data_output.append(TreeNode.from_r4j_issue(issue, root, level, parent_id))
         if "childReqs" in issue.keys() and len(issue["childReqs"]["childReq"]) != 0:
             data_issue = {"id": issue["key"], "folders": [], "issues": issue["childReqs"]["childReq"]}
-            _data_output.append({"parent": root, "issue_key": issue["key"], "summary": issue["summary"],
-                                 "position": position, "level": level, "issueData": issue, "jira_id": issue["issueId"],
-                                 "jira_parent_id": parent_id})
             read_and_process_tree_items(data_issue, _data_output, level + 1, issue["issueId"])
-        else:
-            _data_output.append({"parent": root, "issue_key": issue["key"], "summary": issue["summary"],
-                                 "position": position, "level": level, "issueData": issue, "jira_id": issue["issueId"],
-                                 "jira_parent_id": parent_id})
 
 
 def get_sorted_children(parent, tree_items):
@@ -49,8 +41,8 @@ def get_sorted_children(parent, tree_items):
         A list of sorted children.
     """
     children = [item for item in tree_items
-                if item["parent"] == parent["issue_key"] and item["level"] == parent["level"]]
-    return sorted(children, key=lambda x: x["position"])
+                if item.parent == parent["issue_key"] and item.level == parent["level"]]
+    return sorted(children, key=lambda x: x.position)
 
 
 def traverse_and_order_tree(children, tree_items, ordered_tree):
@@ -67,9 +59,8 @@ def traverse_and_order_tree(children, tree_items, ordered_tree):
     """
     for child in children:
         ordered_tree.append(child)
-        issue_key = child['issue_key'] if child.get('issue_key') else child['folder_name']
 
-        sorted_children = get_sorted_children({"issue_key": issue_key, "level": child['level']+1}, tree_items)
+        sorted_children = get_sorted_children({"issue_key": child.key, "level": child.level + 1}, tree_items)
         traverse_and_order_tree(sorted_children, tree_items, ordered_tree)
 
 
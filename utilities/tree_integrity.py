@@ -0,0 +1,121 @@
+"""Integrity checks of the flattened R4J tree, run before the first Work Item is created"""
+import numpy as np
+
+from config.config import RUN_ENV
+from report.log_and_report import write_logging_error, write_logging_simple_message
+
+ROOT_ID = -1
+MAX_EXAMPLES = 5
+
+
+def node_rows(tree_items_list):
+    """
+    The columns of the nodes checked by find_tree_problems.
+
+    Args:
+        tree_items_list (list): The TreeNode of all the folders and issues.
+
+    Returns:
+        list: The (jira_id, jira_parent_id, level, position, is_folder, key) of each node.
+    """
+    return [(node.jira_id, node.jira_parent_id, node.level, node.position, node.is_folder, node.key)
+            for node in tree_items_list]
+
+
+def _examples(values):
+    shown = ", ".join(str(value) for value in values[:MAX_EXAMPLES])
+    return shown if len(values) <= MAX_EXAMPLES else f"{shown} and {len(values) - MAX_EXAMPLES} more"
+
+
+def find_tree_problems(rows):
+    """
+    Find the nodes that would break the migration of the tree, with array operations so a tree of 100k nodes
+    is checked in a fraction of a second:
+
+    - orphans, whose parent is neither the root nor a node of the tree, their parent Work Item can't be found
+    - level inconsistencies, a node not one level below its parent, it would be left out of the tree order
+    - cycles, nodes whose ancestors never reach the root
+    - duplicate positions, siblings of the same kind at the same position, their order would be arbitrary.
+      R4J numbers the folders and the issues of a parent separately.
+
+    An issue can appear several times in the tree, a parent is found if any of its nodes matches.
+
+    Args:
+        rows (list): The (jira_id, jira_parent_id, level, position, is_folder, key) of each node, see node_rows.
+
+    Returns:
+        list: A message per kind of problem found, with examples of the nodes, empty if the tree is consistent.
+    """
+    if not rows:
+        return []
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    parent_ids = np.array([row[1] for row in rows], dtype=np.int64)
+    levels = np.array([row[2] for row in rows], dtype=np.int64)
+    positions = np.array([row[3] for row in rows], dtype=np.int64)
+    is_folder = np.array([row[4] for row in rows], dtype=bool)
+    keys = [row[5] for row in rows]
+    count = len(ids)
+    problems = []
+
+    # Rank of every id and parent id among the distinct ids of the nodes
+    unique_ids, id_ranks = np.unique(ids, return_inverse=True)
+    parent_ranks = np.minimum(np.searchsorted(unique_ids, parent_ids), len(unique_ids) - 1)
+    is_root = parent_ids == ROOT_ID
+    known = unique_ids[parent_ranks] == parent_ids
+
+    orphans = np.flatnonzero(~known & ~is_root)
+    if len(orphans):
+        problems.append(f"{len(orphans)} nodes have a parent that is not in the tree: "
+                        f"{_examples([f'{keys[index]} (parent {parent_ids[index]})' for index in orphans])}")
+
+    # A node must be one level below one of the nodes of its parent, or at level 1 under the root
+    width = int(levels.max()) + 2
+    node_levels = id_ranks * width + levels
+    expected = parent_ranks * width + levels - 1
+    misplaced = np.flatnonzero(np.where(is_root, levels != 1, known & ~np.isin(expected, node_levels)))
+    if len(misplaced):
+        problems.append(f"{len(misplaced)} nodes are not one level below their parent: "
+                        f"{_examples([f'{keys[index]} (level {levels[index]})' for index in misplaced])}")
+
+    # Follow the first node of every parent id, doubling the distance at each step, the count is the root
+    first_nodes = np.empty(len(unique_ids), dtype=np.int64)
+    first_nodes[id_ranks[::-1]] = np.arange(count - 1, -1, -1)
+    ancestors = np.append(np.where(known & ~is_root, first_nodes[parent_ranks], count), count)
+    for _ in range(count.bit_length() + 1):
+        ancestors = ancestors[ancestors]
+    cyclic = np.flatnonzero(ancestors[:count] != count)
+    if len(cyclic):
+        problems.append(f"{len(cyclic)} nodes are in or below a cycle of parents: "
+                        f"{_examples([keys[index] for index in cyclic])}")
+
+    order = np.lexsort((positions, is_folder, parent_ids))
+    same = ((parent_ids[order][1:] == parent_ids[order][:-1]) & (is_folder[order][1:] == is_folder[order][:-1])
+            & (positions[order][1:] == positions[order][:-1]))
+    duplicates = np.flatnonzero(same)
+    if len(duplicates):
+        problems.append(f"{len(duplicates)} nodes share the position of a sibling: " + _examples(
+            [f"{keys[order[index + 1]]} and {keys[order[index]]} (position {positions[order[index]]})"
+             for index in duplicates]))
+    return problems
+
+
+def verify_tree(rows):
+    """
+    Check the integrity of the flattened tree before the first write, all the problems are reported together.
+
+    Args:
+        rows (list): The (jira_id, jira_parent_id, level, position, is_folder, key) of each node, see node_rows.
+
+    Returns:
+        bool: True if the tree is consistent or the check is disabled, False otherwise.
+    """
+    if not RUN_ENV.verify_tree:
+        return True
+    problems = find_tree_problems(rows)
+    for problem in problems:
+        write_logging_error(f"TREE ERROR: {problem}")
+    if problems:
+        write_logging_simple_message(f"{len(problems)} kinds of tree errors found in the R4J tree")
+        return False
+    write_logging_simple_message(f"The tree of {len(rows)} nodes is consistent")
+    return True
@@ -0,0 +1,143 @@
+"""Compact model of the folders and issues of the tree being migrated"""
+import sys
+
+from utilities.field_mapping import JIRA_FIELDS
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _attachments(attachments):
+    return tuple((attachment["filename"], attachment.get("size"), attachment["content"])
+                 for attachment in attachments or ())
+
+
+def comments_from_jira(comments):
+    """
+    The comments of a Jira issue as (comment id, author, creation date, body) tuples, oldest first.
+
+    Args:
+        comments (list): The comments as returned by the Jira DC API.
+
+    Returns:
+        tuple: The comments.
+    """
+    return tuple((str(comment["id"]), (comment.get("author") or {}).get("displayName"), comment.get("created"),
+                  comment.get("body")) for comment in comments)
+
+
+class TreeNode:
+    """
+    A folder or issue of the R4J tree.
+
+    Only the values needed by the migration are kept, instead of the raw R4J and Jira payloads, and the strings
+    are interned so repeated titles, descriptions, statuses and types are stored once.
+
+    Attributes:
+        jira_id (int or str): The id of the folder or issue on Jira DC.
+        jira_parent_id (int or str): The Jira DC id of the parent folder or issue, -1 for the root.
+        parent (int or str): The key of the parent in the R4J tree: folder name, issue key or the root id.
+        key (str): The key of the node in the R4J tree: issue key for issues, name for folders.
+        level (int): The level of the node in the tree, starting at 1.
+        position (int): The position of the node in the R4J tree.
+        is_folder (bool): True for folders, False for issues.
+        title (str): The folder name or the issue summary.
+        description (str): The folder or issue description, None when empty.
+        status (str): The Jira status of the issue, None for folders.
+        issue_type (str): The Jira issue type, 'Folder' for folders.
+        links (tuple): The issue links as (target Jira issue id, outward link name) tuples.
+        attachments (tuple): The attachments as (file name, size in bytes, content URL) tuples.
+        comments (tuple): The comments of the issue, see comments_from_jira, None when the search only returned
+            part of them.
+        fields (tuple): The raw values of the Jira fields of the field map, in the order of JIRA_FIELDS.
+        id (int): The id of the Work Item on Azure DevOps, None until it is found or created.
+        parent_id (int): The Azure DevOps id of the parent Work Item, None until it is resolved.
+    """
+    __slots__ = ("jira_id", "jira_parent_id", "parent", "key", "level", "position", "is_folder", "title",
+                 "description", "status", "issue_type", "links", "attachments", "comments", "fields",
+                 "id", "parent_id")
+
+    def __init__(self, jira_id, jira_parent_id, parent, key, level, position, is_folder, title,
+                 description=None, status=None, issue_type=None, links=(), attachments=(), comments=()):
+        self.jira_id = jira_id
+        self.jira_parent_id = jira_parent_id
+        self.parent = _intern(parent)
+        self.key = _intern(key)
+        self.level = level
+        self.position = position
+        self.is_folder = is_folder
+        self.title = _intern(title)
+        self.description = _intern(description)
+        self.status = _intern(status)
+        self.issue_type = _intern(issue_type)
+        self.links = links
+        self.attachments = attachments
+        self.comments = comments
+        self.fields = ()
+        self.id = None
+        self.parent_id = None
+
+    @classmethod
+    def from_r4j_folder(cls, folder, parent, level, jira_parent_id):
+        """
+        Create a node from a folder of the R4J tree. The folder attachments are kept when the tree lists them.
+
+        Args:
+            folder (dict): The folder data of the R4J tree.
+            parent (int or str): The key of the parent in the R4J tree.
+            level (int): The level of the folder in the tree.
+            jira_parent_id (int or str): The Jira DC id of the parent.
+
+        Returns:
+            TreeNode: The folder node.
+        """
+        return cls(folder["id"], jira_parent_id, parent, folder["name"], level, folder["absolutePosition"], True,
+                   folder["name"], folder.get("description"), issue_type="Folder",
+                   attachments=_attachments(folder.get("attachments")))
+
+    @classmethod
+    def from_r4j_issue(cls, issue, parent, level, jira_parent_id):
+        """
+        Create a node from an issue of the R4J tree. The Jira data is added later with update_from_jira_issue.
+
+        Args:
+            issue (dict): The issue data of the R4J tree.
+            parent (int or str): The key of the parent in the R4J tree.
+            level (int): The level of the issue in the tree.
+            jira_parent_id (int or str): The Jira DC id of the parent.
+
+        Returns:
+            TreeNode: The issue node.
+        """
+        return cls(issue["issueId"], jira_parent_id, parent, issue["key"], level, issue["absolutePosition"], False,
+                   issue["summary"])
+
+    def update_from_jira_issue(self, issue):
+        """
+        Replace the R4J issue data with the data of the Jira DC issue.
+
+        Args:
+            issue (dict): The issue as returned by the Jira DC search.
+        """
+        fields = issue["fields"]
+        self.title = _intern(fields["summary"])
+        self.description = _intern(fields.get("description"))
+        self.status = _intern(fields["status"]["name"])
+        self.issue_type = _intern(fields["issuetype"]["name"])
+        links = []
+        for link in fields.get("issuelinks", ()):
+            link_key = 'inwardIssue' if 'inwardIssue' in link else 'outwardIssue'
+            if link_key in link:
+                links.append((link[link_key]["id"], _intern(link["type"]["outward"])))
+        self.links = tuple(links)
+        self.attachments = _attachments(fields.get("attachment"))
+        # The comment field is only searched when the comments are migrated
+        comment_field = fields.get("comment") or {}
+        comments = comments_from_jira(comment_field.get("comments", ()))
+        self.comments = comments if len(comments) >= comment_field.get("total", len(comments)) else None
+        self.fields = tuple(fields.get(name) for name in JIRA_FIELDS)
+
+    def __repr__(self):
+        kind = "Folder" if self.is_folder else "Issue"
+        return f"<{kind} {self.key} jira_id={self.jira_id} level={self.level} position={self.position} id={self.id}>"
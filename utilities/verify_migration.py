@@ -0,0 +1,181 @@
+"""Verifies the migrated tree and Work Items against the source tree and reports the mismatches"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from api.azure_dev_ops import ado_helper, ease_requirements_helper
+from config.config import ADO_ENV, RUN_ENV
+from report.log_and_report import write_logging_error, write_logging_simple_message
+from utilities.field_mapping import get_work_item_template
+from utilities.migrate_attachments import run_bounded
+from utilities.origin_marker import origin_key
+
+VERIFICATION_REPORT = "./report/verification_report.json"
+
+
+def _node_batches(organization, project, tree_items_list):
+    nodes = (node for node in tree_items_list if node.id)
+    while True:
+        batch = list(islice(nodes, ado_helper.WORK_ITEMS_BATCH_SIZE))
+        if not batch:
+            return
+        yield organization, project, batch
+
+
+def read_work_items(organization, project, nodes):
+    """
+    Read back the Work Items of a batch of nodes with their relations.
+
+    Args:
+        organization (str): The name of the organization.
+        project (str): The name of the project.
+        nodes (list): Up to WORK_ITEMS_BATCH_SIZE TreeNode, with their ids.
+
+    Returns:
+        dict: The Work Items by id.
+    """
+    work_item_ids = list(dict.fromkeys(node.id for node in nodes))
+    return {work_item["id"]: work_item
+            for work_item in ado_helper.get_work_items_with_relations(organization, project, work_item_ids)}
+
+
+def _mismatch(kind, node, expected, actual):
+    return {"type": kind, "work_item_id": node.id if node is not None else actual, "origin":
+            origin_key(node) if node is not None else None, "expected": expected, "actual": actual}
+
+
+def compare_tree(deep_order_tree, tree_items, root_id=-1):
+    """
+    Compare the parent and the sibling order of every tree item with the source tree.
+
+    The sibling order of the tree items is the order they are returned in by the easeRequirements API. The
+    source nodes are read once and only their ids and origin markers are kept.
+
+    Args:
+        deep_order_tree (iterable): The TreeNode of the source tree in depth-first order, with their ids.
+        tree_items (list): The tree items read back from easeRequirements.
+        root_id (int): The Work Item the source tree is attached under, -1 for the root of the tree.
+
+    Returns:
+        list: The mismatches.
+    """
+    mismatches = []
+    actual_parents = {}
+    actual_children = {}
+    for item in tree_items:
+        actual_parents[str(item["id"])] = str(item.get("parent"))
+        actual_children.setdefault(str(item.get("parent")), []).append(str(item["id"]))
+
+    expected_children = {}
+    origins = {}
+    for node in deep_order_tree:
+        item_id = str(node.id)
+        origins[item_id] = origin_key(node)
+        expected_children.setdefault(str(node.parent_id), []).append(item_id)
+        if item_id not in actual_parents:
+            mismatches.append(_mismatch("missing_tree_item", node, node.parent_id, None))
+        elif actual_parents[item_id] != str(node.parent_id):
+            mismatches.append(_mismatch("wrong_parent", node, node.parent_id, actual_parents[item_id]))
+
+    for item_id in actual_parents.keys() - origins.keys():
+        # A scoped migration only owns the subtree of its folder, the rest of the tree is not compared
+        if root_id == -1 or actual_parents[item_id] in origins:
+            mismatches.append(_mismatch("unexpected_tree_item", None, None, item_id))
+
+    for parent_id, children in expected_children.items():
+        actual = [child for child in actual_children.get(parent_id, ()) if child in origins]
+        if actual != children and sorted(actual) == sorted(children):
+            mismatches.append({"type": "sibling_order", "work_item_id": int(parent_id),
+                               "origin": origins.get(parent_id), "expected": children, "actual": actual})
+    return mismatches
+
+
+def compare_work_items(tree_items_list, work_items, jira_ado_ids, project):
+    """
+    Compare the title, state and links of every Work Item with its source folder or issue.
+
+    Only missing links are reported, since Azure DevOps adds the reverse links to the linked Work Items.
+
+    Args:
+        tree_items_list (list): The TreeNode of the source tree, with their ids.
+        work_items (dict): The Work Items read back, by id.
+        jira_ado_ids (dict): The Work Item id of each Jira id.
+        project (str): The name of the project.
+
+    Returns:
+        list: The mismatches.
+    """
+    mismatches = []
+    link_types = set(ADO_ENV.link_type_map.values())
+    for node in tree_items_list:
+        work_item = work_items.get(node.id)
+        if work_item is None:
+            mismatches.append(_mismatch("missing_work_item", node, node.title, None))
+            continue
+        fields = work_item["fields"]
+        if fields.get("System.Title") != node.title:
+            mismatches.append(_mismatch("title", node, node.title, fields.get("System.Title")))
+        if node.is_folder:
+            continue
+        state = get_work_item_template(node.issue_type, project).state(node.status)
+        if fields.get("System.State") != state:
+            mismatches.append(_mismatch("state", node, state, fields.get("System.State")))
+
+        actual_links = {(relation["rel"], relation["url"].rsplit("/", 1)[-1])
+                        for relation in work_item.get("relations") or () if relation["rel"] in link_types}
+        for target_issue_id, link_name in node.links:
+            target_id = jira_ado_ids.get(target_issue_id)
+            if target_id and link_name in ADO_ENV.link_type_map:
+                link = (ADO_ENV.link_type_map[link_name], str(target_id))
+                if link not in actual_links:
+                    mismatches.append(_mismatch("missing_link", node, list(link), None))
+    return mismatches
+
+
+def verify_migration(tree_items_list, deep_order_tree, jira_ado_ids, project):
+    """
+    Read back the migrated project and write the mismatches with the source tree to VERIFICATION_REPORT.
+
+    Each mismatch has the Work Item id and origin marker of the item to repair, so a repair can target these
+    items instead of running the whole migration again.
+
+    The nodes are read once each, so they can be streamed from a working set. The Work Items are read back and
+    compared one batch at a time, at most twice RUN_ENV.concurrency batches being read at once.
+
+    Args:
+        tree_items_list (iterable): The TreeNode of the source tree, with their ids.
+        deep_order_tree (iterable): The same nodes in depth-first order.
+        jira_ado_ids (dict): The Work Item id of each Jira id.
+        project (str): The name of the project.
+
+    Returns:
+        list: The mismatches.
+    """
+    write_logging_simple_message("Verifying the migrated tree and Work Items")
+    organization = ADO_ENV.organization
+    project_id = ado_helper.get_project_by_id_or_name(organization, project)["id"]
+    tree_items = ease_requirements_helper.get_all_tree_items(project_id) or []
+    mismatches = compare_tree(deep_order_tree, tree_items, jira_ado_ids.get("-1", -1))
+
+    work_item_count = 0
+    with ThreadPoolExecutor(max_workers=RUN_ENV.concurrency) as executor:
+        batches = _node_batches(organization, project, tree_items_list)
+        for (_, _, nodes), work_items in run_bounded(executor, read_work_items, batches, RUN_ENV.concurrency * 2):
+            if isinstance(work_items, BaseException):
+                raise work_items
+            work_item_count += len(work_items)
+            mismatches += compare_work_items(nodes, work_items, jira_ado_ids, project)
+    summary = {}
+    for mismatch in mismatches:
+        summary[mismatch["type"]] = summary.get(mismatch["type"], 0) + 1
+    with open(VERIFICATION_REPORT, "w", encoding="utf-8") as file:
+        json.dump({"project": project, "tree_items": len(tree_items), "work_items": work_item_count,
+                   "summary": summary, "mismatches": mismatches}, file, indent=2)
+
+    if mismatches:
+        counts = ", ".join(f"{count} {kind}" for kind, count in summary.items())
+        write_logging_error(f"{len(mismatches)} mismatches found ({counts}), see {VERIFICATION_REPORT}")
+    else:
+        write_logging_simple_message(f"Verification passed: {len(tree_items)} tree items and {work_item_count} "
+                                     "Work Items match the source tree")
+    return mismatches
@@ -0,0 +1,258 @@
+"""Converts the Jira wiki markup of the descriptions to the HTML rendered by Azure DevOps"""
+import hashlib
+import html
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from config.config import RUN_ENV
+
+# Below this number of descriptions to convert, starting the worker processes costs more than it saves
+POOL_THRESHOLD = 2000
+POOL_CHUNK_SIZE = 256
+CACHE_SIZE = 50000
+
+_PREFORMATTED = re.compile(r"(?<!\{)\{(code|noformat)(?::[^}]*)?\}(?!\})(.*?)\{\1\}", re.DOTALL)
+_QUOTE = re.compile(r"\{quote\}(.*?)\{quote\}", re.DOTALL)
+_PLACEHOLDER = re.compile(r"\x00(\d+)\x00")
+_HEADING = re.compile(r"^h([1-6])\.\s+(.*)$")
+_BLOCK_QUOTE = re.compile(r"^bq\.\s+(.*)$")
+_RULE = re.compile(r"^-{4,}\s*$")
+_LIST_ITEM = re.compile(r"^([*#]+|-)\s+(.*)$")
+# The separators of the table cells, except the one between the label and the URL of a link
+_TABLE_CELL = re.compile(r"(\|\|?)(?![^\[]*\])")
+_ESCAPED = re.compile(r"\\([*_+\-^~?{}\[\]|!])")
+_SAFE_URL = re.compile(r"(?:https?|ftp|mailto):", re.IGNORECASE)
+
+
+def _link(label, url, blocks):
+    # The text is already escaped without the quotes, which must be escaped too inside the attribute. Other
+    # schemes, e.g. javascript:, are kept as text. The opening tag is a placeholder, so the emphasis rules
+    # only apply to the label
+    url = _restore(url.strip(), blocks)
+    if not _SAFE_URL.match(url):
+        return label
+    return _placeholder(blocks, f'<a href="{url.replace(chr(34), "&quot;").replace(chr(39), "&#x27;")}">') + \
+        f"{label}</a>"
+
+
+# Rules applied first to the HTML-escaped text, their result is kept out of the inline rules as a placeholder
+_CODE = re.compile(r"\{\{(.+?)\}\}")
+_LABELED_LINK = re.compile(r"\[([^|\]\n]+)\|([^\]\n]+)\]")
+_URL_LINK = re.compile(r"\[((?:https?|ftp|mailto):[^\]\s]+)\]")
+
+# Inline rules, applied in order to the HTML-escaped text
+_INLINE_RULES = tuple((re.compile(pattern), replacement) for pattern, replacement in (
+    (r"\{color:([#\w]+)\}(.*?)\{color\}", r'<span style="color:\1">\2</span>'),
+    (r"(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?![\w*])", r"<strong>\1</strong>"),
+    (r"(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?![\w_])", r"<em>\1</em>"),
+    (r"(?<![\w\-])-(?=[^\s\-])(.+?)(?<=[^\s\-])-(?![\w\-])", r"<del>\1</del>"),
+    (r"(?<![\w+])\+(?=\S)(.+?)(?<=\S)\+(?![\w+])", r"<u>\1</u>"),
+    (r"(?<![\w^])\^(?=\S)(.+?)(?<=\S)\^(?![\w^])", r"<sup>\1</sup>"),
+    (r"(?<![\w~])~(?=\S)(.+?)(?<=\S)~(?![\w~])", r"<sub>\1</sub>"),
+    (r"\?\?(?=\S)(.+?)(?<=\S)\?\?", r"<cite>\1</cite>"),
+    (r"\\\\", "<br/>"),
+))
+
+_cache = {}
+_cache_lock = threading.Lock()
+# The descriptions converted ahead of the Work Item creation, kept for the whole run whatever their number
+_converted = {}
+
+
+def _inline(text, escaped):
+    text = _ESCAPED.sub(lambda match: _placeholder(escaped, html.escape(match.group(1))), text)
+    text = html.escape(text, quote=False)
+    text = _CODE.sub(lambda match: _placeholder(escaped, f"<code>{_restore(match.group(1), escaped)}</code>"), text)
+    text = _LABELED_LINK.sub(lambda match: _link(match.group(1), match.group(2), escaped), text)
+    text = _URL_LINK.sub(lambda match: _link(_placeholder(escaped, _restore(match.group(1), escaped)),
+                                             match.group(1), escaped), text)
+    for pattern, replacement in _INLINE_RULES:
+        text = pattern.sub(replacement, text)
+    return text.replace("\xa0", "&nbsp;")
+
+
+def _placeholder(blocks, value):
+    blocks.append(value)
+    return f"\x00{len(blocks) - 1}\x00"
+
+
+def _restore(text, blocks):
+    return _PLACEHOLDER.sub(lambda match: blocks[int(match.group(1))], text)
+
+
+def _close_lists(out, lists, depth=0):
+    while len(lists) > depth:
+        out.append(f"</li></{lists.pop()}>")
+
+
+def _convert(text):
+    """
+    Convert a Jira wiki markup text to HTML, without the cache.
+
+    Args:
+        text (str): The wiki markup.
+
+    Returns:
+        str: The HTML.
+    """
+    blocks = []
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = _PREFORMATTED.sub(lambda match: "\n" + _placeholder(
+        blocks, f"<pre>{html.escape(match.group(2).strip(chr(10)), quote=False)}</pre>") + "\n", text)
+    text = _QUOTE.sub(lambda match: "\n" + _placeholder(
+        blocks, f"<blockquote>{_convert(match.group(1).strip())}</blockquote>") + "\n", text)
+
+    out = []
+    paragraph = []
+    lists = []
+    table = []
+
+    def flush():
+        if paragraph:
+            out.append(f"<p>{'<br/>'.join(paragraph)}</p>")
+            paragraph.clear()
+        if table:
+            out.append(f"<table><tbody>{''.join(table)}</tbody></table>")
+            table.clear()
+        _close_lists(out, lists)
+
+    for line in text.split("\n"):
+        stripped = line.strip()
+        block = _PLACEHOLDER.fullmatch(stripped)
+        heading = _HEADING.match(stripped)
+        list_item = _LIST_ITEM.match(stripped)
+        if not stripped:
+            flush()
+        elif block:
+            flush()
+            out.append(blocks[int(block.group(1))])
+        elif heading:
+            flush()
+            out.append(f"<h{heading.group(1)}>{_inline(heading.group(2), blocks)}</h{heading.group(1)}>")
+        elif _BLOCK_QUOTE.match(stripped):
+            flush()
+            out.append(f"<blockquote>{_inline(_BLOCK_QUOTE.match(stripped).group(1), blocks)}</blockquote>")
+        elif _RULE.match(stripped):
+            flush()
+            out.append("<hr/>")
+        elif list_item:
+            if paragraph or table:
+                flush()
+            tags = ["ol" if marker == "#" else "ul" for marker in list_item.group(1)]
+            depth = 0
+            while depth < min(len(lists), len(tags)) and lists[depth] == tags[depth]:
+                depth += 1
+            _close_lists(out, lists, depth)
+            if depth == len(tags):
+                out.append("</li>")
+            while len(lists) < len(tags):
+                out.append(f"<{tags[len(lists)]}>")
+                lists.append(tags[len(lists)])
+            out.append(f"<li>{_inline(list_item.group(2), blocks)}")
+        elif stripped.startswith("|"):
+            if paragraph or lists:
+                flush()
+            cells = []
+            tag = None
+            for part in _TABLE_CELL.split(stripped.rstrip("|")):
+                if part in ("|", "||"):
+                    tag = "th" if part == "||" else "td"
+                elif tag:
+                    cells.append(f"<{tag}>{_inline(part.strip(), blocks)}</{tag}>")
+            table.append(f"<tr>{''.join(cells)}</tr>")
+        else:
+            if lists or table:
+                flush()
+            paragraph.append(_inline(line, blocks))
+    flush()
+    return _restore("".join(out), blocks)
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _store(digest, converted):
+    with _cache_lock:
+        if len(_cache) >= CACHE_SIZE:
+            del _cache[next(iter(_cache))]
+        _cache[digest] = converted
+
+
+def description_to_html(description):
+    """
+    The HTML stored in System.Description for a Jira description.
+
+    The conversions are memoized by the hash of the description, since templated requirements repeat the same
+    descriptions. With run_env.convert_wiki_markup disabled, the description is kept as it is.
+
+    Args:
+        description (str): The Jira wiki markup, None when empty.
+
+    Returns:
+        str: The HTML, an empty string when the description is empty.
+    """
+    if not description:
+        return ""
+    if not RUN_ENV.convert_wiki_markup:
+        return description
+    digest = _digest(description)
+    converted = _converted.get(digest)
+    if converted is None:
+        converted = _cache.get(digest)
+    if converted is None:
+        converted = _convert(description)
+        _store(digest, converted)
+    return converted
+
+
+def markup_to_html(text):
+    """
+    The HTML of a Jira wiki markup text that rarely repeats, e.g. a comment, without memoizing it. With
+    run_env.convert_wiki_markup disabled, the text is kept as it is.
+
+    Args:
+        text (str): The Jira wiki markup, None when empty.
+
+    Returns:
+        str: The HTML, an empty string when the text is empty.
+    """
+    if not text:
+        return ""
+    return _convert(text) if RUN_ENV.convert_wiki_markup else text
+
+
+def convert_descriptions(nodes):
+    """
+    Convert the descriptions of the nodes ahead of the Work Item creation for description_to_html. They are
+    kept until clear_converted_descriptions rather than in its bounded cache, which would evict the first of
+    them before the creation starts on large projects. Large projects are converted in a pool of processes
+    (run_env.markup_workers).
+
+    Args:
+        nodes (iterable): The TreeNode of the folders and issues.
+    """
+    if not RUN_ENV.convert_wiki_markup:
+        return
+    pending = {}
+    for node in nodes:
+        if node.description:
+            digest = _digest(node.description)
+            if digest in _converted or digest in pending:
+                continue
+            cached = _cache.get(digest)
+            if cached is not None:
+                _converted[digest] = cached
+            else:
+                pending[digest] = node.description
+    if len(pending) < POOL_THRESHOLD or RUN_ENV.markup_workers == 0:
+        _converted.update(zip(pending, map(_convert, pending.values())))
+        return
+    with ProcessPoolExecutor(max_workers=RUN_ENV.markup_workers) as executor:
+        _converted.update(zip(pending, executor.map(_convert, pending.values(), chunksize=POOL_CHUNK_SIZE)))
+
+
+def clear_converted_descriptions():
+    """Release the descriptions converted by convert_descriptions, once the Work Items of the run are created."""
+    _converted.clear()
@@ -0,0 +1,456 @@
+"""Disk-backed working set of the migration, so the memory stays flat whatever the size of the project"""
+import json
+import os
+import sqlite3
+
+from api import r4j_helper
+from api.azure_dev_ops import ado_helper, ease_requirements_helper
+from api.data_center.jira_helper import get_project_by_name
+from config.config import ADO_ENV, RUN_ENV
+from report import metrics
+from report.log_and_report import generate_expected_tree_html, open_report_html, write_logging_simple_message
+from report.progress import PROGRESS
+from utilities import ado_verifications
+from utilities.issue_search_plan import iterate_project_issue_pages
+from utilities.migrate_attachments import migrate_attachments
+from utilities.migrate_comments import migrate_comments
+from utilities.migrate_tree import create_work_item_for_node
+from utilities.origin_marker import get_migrated_work_item_ids
+from utilities.request_plan import write_request_plan
+from utilities.transform_data import read_and_process_tree_items
+from utilities.tree_integrity import verify_tree
+from utilities.tree_node import TreeNode
+from utilities.verify_migration import verify_migration
+from utilities.wiki_markup import convert_descriptions
+
+BATCH_SIZE = 1000
+
+NODE_COLUMNS = ("jira_id", "jira_parent_id", "parent", "key", "level", "position", "is_folder", "title",
+                "description", "status", "issue_type", "links", "attachments", "fields", "id", "parent_id",
+                "comments")
+
+SCHEMA = """
+CREATE TABLE nodes (
+    jira_id TEXT, jira_parent_id TEXT, parent TEXT, key TEXT, level INTEGER, position INTEGER,
+    is_folder INTEGER, title TEXT, description TEXT, status TEXT, issue_type TEXT, links TEXT,
+    attachments TEXT, fields TEXT, id INTEGER, parent_id INTEGER, created INTEGER DEFAULT 0,
+    tree_order TEXT, shard INTEGER, shard_root INTEGER DEFAULT 0, comments TEXT DEFAULT '[]'
+);
+CREATE INDEX nodes_jira_id ON nodes (jira_id);
+CREATE INDEX nodes_parent ON nodes (parent, level, position);
+CREATE INDEX nodes_level ON nodes (level);
+CREATE TABLE migrated (origin TEXT PRIMARY KEY, id INTEGER);
+"""
+
+
+def _to_row(node):
+    return (str(node.jira_id), str(node.jira_parent_id), str(node.parent), node.key, node.level, node.position,
+            int(node.is_folder), node.title, node.description, node.status, node.issue_type,
+            json.dumps(node.links), json.dumps(node.attachments), json.dumps(node.fields), node.id, node.parent_id,
+            json.dumps(node.comments))
+
+
+def _from_row(row):
+    node = TreeNode(row[0], row[1], row[2], row[3], row[4], row[5], bool(row[6]), row[7], row[8], row[9], row[10],
+                    tuple(tuple(link) for link in json.loads(row[11])),
+                    tuple(tuple(attachment) for attachment in json.loads(row[12])))
+    node.fields = tuple(json.loads(row[13]))
+    node.id = row[14]
+    node.parent_id = row[15]
+    comments = json.loads(row[16])
+    node.comments = tuple(tuple(comment) for comment in comments) if comments is not None else None
+    return node
+
+
+class _NodeWriter:
+    """List-like sink of read_and_process_tree_items inserting the nodes in batches."""
+
+    def __init__(self, working_set):
+        self.working_set = working_set
+        self.rows = []
+
+    def append(self, node):
+        self.rows.append(_to_row(node))
+        if len(self.rows) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.working_set.connection.executemany(
+            f"INSERT INTO nodes ({', '.join(NODE_COLUMNS)}) VALUES ({', '.join('?' * len(NODE_COLUMNS))})",
+            self.rows)
+        self.rows = []
+
+
+class WorkItemIds:
+    """
+    The jira_ado_ids mapping of the migration read from the working set: the Work Item id of each Jira id.
+    With a shard, only the Work Items of the nodes of the shard are known.
+    """
+
+    def __init__(self, working_set, shard=None):
+        self.working_set = working_set
+        self.shard = shard
+        # The Work Item standing for the root of the R4J tree, the parent Work Item of a scoped migration
+        self.root_id = -1
+
+    def get(self, jira_id, default=None):
+        if str(jira_id) == "-1":
+            return self.root_id
+        if self.shard is None:
+            row = self.working_set.connection.execute(
+                "SELECT id FROM nodes WHERE jira_id = ? AND id IS NOT NULL LIMIT 1", (str(jira_id),)).fetchone()
+        else:
+            row = self.working_set.connection.execute(
+                "SELECT id FROM nodes WHERE jira_id = ? AND shard = ? AND id IS NOT NULL LIMIT 1",
+                (str(jira_id), self.shard)).fetchone()
+        return row[0] if row else default
+
+    def __contains__(self, jira_id):
+        return self.get(jira_id) is not None
+
+    def __getitem__(self, jira_id):
+        work_item_id = self.get(jira_id)
+        if work_item_id is None:
+            raise KeyError(jira_id)
+        return work_item_id
+
+    def __setitem__(self, jira_id, work_item_id):
+        # The id is stored on the node by WorkingSet.save_id
+        pass
+
+
+class WorkingSet:
+    """
+    SQLite store of the folders and issues being migrated, indexed on the Jira id, the parent and the level.
+
+    Every phase reads and writes the nodes through the store, one node or one batch at a time, so only the
+    raw R4J tree is held in memory while it is flattened.
+
+    The file is opened with a busy timeout, so the workers of a sharded migration can share it. In WAL mode,
+    the default, they must run on one host as WAL needs memory shared between the processes. The rollback
+    journal (the delete mode) only relies on file locks, so the file can be shared between hosts on a network
+    file system whose locks work.
+
+    Args:
+        path (str): Path of the SQLite file.
+        create (bool): True to replace the file with an empty store, False to open an existing store.
+        journal_mode (str): The SQLite journal mode, wal or delete.
+    """
+
+    def __init__(self, path, create=True, journal_mode="wal"):
+        if create and os.path.exists(path):
+            os.remove(path)
+        elif not create and not os.path.exists(path):
+            raise FileNotFoundError(f"Working set {path} not found")
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        if journal_mode not in ("wal", "delete"):
+            raise ValueError(f"Unknown journal mode {journal_mode}, expected wal or delete")
+        self.connection.execute(f"PRAGMA journal_mode={journal_mode.upper()}")
+        if create:
+            self.connection.executescript(SCHEMA)
+        self.jira_ado_ids = WorkItemIds(self)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def add_tree(self, data_center_tree):
+        """Flatten the R4J tree into the store."""
+        writer = _NodeWriter(self)
+        read_and_process_tree_items(data_center_tree, writer)
+        writer.flush()
+        self.connection.commit()
+
+    def update_issues(self, issues):
+        """
+        Replace the R4J data of the issue nodes with the data of a page of Jira DC issues.
+
+        Args:
+            issues (list): The Jira DC issues.
+        """
+        scratch = TreeNode(None, None, None, None, None, None, False, None)
+        rows = []
+        for issue in issues:
+            scratch.update_from_jira_issue(issue)
+            rows.append((scratch.title, scratch.description, scratch.status, scratch.issue_type,
+                         json.dumps(scratch.links), json.dumps(scratch.attachments), json.dumps(scratch.fields),
+                         json.dumps(scratch.comments), str(issue["id"])))
+        self.connection.executemany(
+            "UPDATE nodes SET title = ?, description = ?, status = ?, issue_type = ?, links = ?, attachments = ?, "
+            "fields = ?, comments = ? WHERE jira_id = ? AND is_folder = 0", rows)
+        self.connection.commit()
+
+    def check_issues_updated(self):
+        """Raise an exception if an issue of the tree was not found in the Jira DC issues."""
+        row = self.connection.execute("SELECT jira_id FROM nodes WHERE is_folder = 0 AND issue_type IS NULL "
+                                      "LIMIT 1").fetchone()
+        if row:
+            raise Exception(f"Jira Issue with id {row[0]} not found in the project")
+
+    def match_migrated(self, migrated_ids):
+        """
+        Set the id of the nodes whose Work Item was created by a previous run.
+
+        Args:
+            migrated_ids (dict): The Work Item id of each origin marker.
+
+        Returns:
+            int: The number of nodes found.
+        """
+        self.connection.executemany("INSERT OR REPLACE INTO migrated VALUES (?, ?)", migrated_ids.items())
+        self.connection.execute(
+            "UPDATE nodes SET id = (SELECT migrated.id FROM migrated WHERE migrated.origin = "
+            "(CASE WHEN nodes.is_folder THEN 'folder-' ELSE 'issue-' END) || nodes.jira_id) WHERE id IS NULL")
+        self.connection.commit()
+        return self.connection.execute("SELECT COUNT(*) FROM nodes WHERE id IS NOT NULL").fetchone()[0]
+
+    def match_legacy(self, organization, project, migrated_ids):
+        """
+        Set the id of the nodes whose Work Item was created without an origin marker, matched by title and
+        description like verify_all_data_center_tree_issues_in_ado_instance, one batch of nodes at a time.
+
+        Args:
+            organization (str): The name of the organization.
+            project (str): The name of the project.
+            migrated_ids (dict): The Work Item id of each origin marker, whose Work Items are not matched again.
+
+        Returns:
+            int: The number of nodes found.
+        """
+        if not self.count("id IS NULL"):
+            return 0
+        ado_work_items = ado_helper.get_all_work_items_in_project(organization, project)
+        if len(ado_work_items) == 0:
+            return 0
+        migrated = set(migrated_ids.values())
+        unmarked_work_items = [item for item in ado_work_items["value"] if item["id"] not in migrated]
+        found = 0
+        for rowid, node in self.iter_nodes("id IS NULL"):
+            node.id = ado_verifications.find_existing_work_items_on_ado(node, unmarked_work_items)
+            if node.id:
+                self.save_id(rowid, node)
+                found += 1
+        self.connection.commit()
+        return found
+
+    def mapping_combinations(self):
+        """The [count, example key] of each (issue type, status) and link type, see count_mapping_combinations."""
+        rows = self.connection.execute("SELECT issue_type, status, COUNT(*), MIN(key) FROM nodes WHERE is_folder = 0 "
+                                       "GROUP BY issue_type, status")
+        combinations = {(issue_type, status): [count, key] for issue_type, status, count, key in rows}
+        rows = self.connection.execute("SELECT json_extract(link.value, '$[1]'), COUNT(*), MIN(nodes.key) "
+                                       "FROM nodes, json_each(nodes.links) AS link WHERE nodes.is_folder = 0 "
+                                       "GROUP BY 1")
+        links = {link_name: [count, key] for link_name, count, key in rows}
+        return combinations, links
+
+    def tree_rows(self):
+        """The (jira_id, jira_parent_id, level, position, is_folder, key) of each node, see verify_tree."""
+        return self.connection.execute("SELECT jira_id, jira_parent_id, level, position, is_folder, key "
+                                       "FROM nodes").fetchall()
+
+    def count(self, where="1"):
+        return self.connection.execute(f"SELECT COUNT(*) FROM nodes WHERE {where}").fetchone()[0]
+
+    def save_id(self, rowid, node, created=False):
+        """Store the Work Item id and parent id of a node, created is True when its Work Item was just created."""
+        self.connection.execute("UPDATE nodes SET id = ?, parent_id = ?, created = MAX(created, ?) WHERE rowid = ?",
+                                (node.id, node.parent_id, int(created), rowid))
+
+    def iter_nodes(self, where="1", order="rowid"):
+        """
+        Iterate over the nodes, loading them one batch at a time so the store can be updated meanwhile.
+
+        Args:
+            where (str): SQL condition on the nodes.
+            order (str): Unique column to iterate the nodes in the order of: rowid or tree_order.
+
+        Yields:
+            tuple: The rowid and the TreeNode of each node.
+        """
+        last = 0 if order == "rowid" else ""
+        while True:
+            rows = self.connection.execute(
+                f"SELECT rowid, {order}, {', '.join(NODE_COLUMNS)} FROM nodes WHERE ({where}) AND {order} > ? "
+                f"ORDER BY {order} LIMIT ?", (last, BATCH_SIZE)).fetchall()
+            for row in rows:
+                yield row[0], _from_row(row[2:])
+            if len(rows) < BATCH_SIZE:
+                return
+            last = rows[-1][1]
+
+    def sort_tree(self):
+        """
+        Store the depth-first order of the tree, each node coming after its parent and its previous siblings.
+
+        The children of a node are the nodes one level below whose parent is its key, as in sort_tree. The order
+        is the path of positions from the root, the rowid breaking the ties between siblings like a stable sort.
+        """
+        self.connection.executescript("""
+            CREATE TEMP TABLE ordered_nodes AS
+            WITH RECURSIVE ordered(node, key, level, path) AS (
+                SELECT rowid, key, level, printf('%010d%010d', position, rowid) FROM nodes
+                WHERE parent = '-1' AND level = 1
+                UNION ALL
+                SELECT nodes.rowid, nodes.key, nodes.level,
+                       ordered.path || printf('%010d%010d', nodes.position, nodes.rowid)
+                FROM nodes JOIN ordered ON nodes.parent = ordered.key AND nodes.level = ordered.level + 1
+            )
+            SELECT node, path FROM ordered;
+            CREATE INDEX temp.ordered_nodes_node ON ordered_nodes (node);
+            UPDATE nodes SET tree_order = (SELECT path FROM ordered_nodes WHERE node = nodes.rowid);
+            DROP TABLE ordered_nodes;
+            CREATE INDEX nodes_tree_order ON nodes (tree_order);
+        """)
+        self.connection.commit()
+
+
+def run_migration_working_set(project_name, dry_run, scope=None):
+    """
+    Runs the migration of a project with the nodes kept in a SQLite working set, see WorkingSet.
+
+    Args:
+        project_name (str): The name of the project in the Azure DevOps side and in Jira DC.
+        dry_run (bool): If True, performs a dry run without making any changes.
+        scope (MigrationScope): The folder to migrate, None for the whole project.
+    """
+    working_set = WorkingSet(RUN_ENV.working_set_file)
+    try:
+        _migrate(working_set, project_name, dry_run, scope)
+    finally:
+        working_set.close()
+
+
+def load_project(working_set, project_name, scope=None, dry_run=False):
+    """
+    Download the tree and the issues of a project into a working set and sort the tree.
+
+    Args:
+        working_set (WorkingSet): The empty working set.
+        project_name (str): The name of the project in Jira DC.
+        scope (MigrationScope): The folder to load, None for the whole project.
+        dry_run (bool): If True, the project is loaded even when the tree verifications fail.
+
+    Returns:
+        bool: True if the tree verifications passed, False otherwise.
+    """
+    project_key = get_project_by_name(project_name)["key"]
+
+    metrics.start_phase("download_tree")
+    write_logging_simple_message("Download the tree from R4JDC")
+    data_center_tree = r4j_helper.get_complete_tree_structure_by_project_key(project_key)
+    if scope is not None:
+        data_center_tree = scope.prune(data_center_tree)
+        working_set.jira_ado_ids.root_id = scope.root_id
+    metrics.start_phase("flatten_tree")
+    working_set.add_tree(data_center_tree)
+    del data_center_tree
+
+    metrics.start_phase("verify_tree")
+    tree_valid = verify_tree(working_set.tree_rows())
+    if not tree_valid and not dry_run:
+        return False
+
+    metrics.start_phase("download_issues")
+    write_logging_simple_message("Download the issues from Jira DC and update the issue data")
+    for page in iterate_project_issue_pages(project_key, project_name, scope):
+        working_set.update_issues(page)
+    working_set.check_issues_updated()
+
+    metrics.start_phase("sort_tree")
+    write_logging_simple_message("Sort tree to create")
+    working_set.sort_tree()
+    return tree_valid
+
+
+def _migrate(working_set, project_name, dry_run, scope):
+    if not load_project(working_set, project_name, scope, dry_run) and not dry_run:
+        write_logging_simple_message("Tree verifications failed. Exiting...")
+        return
+    ordered = "tree_order IS NOT NULL"
+
+    metrics.start_phase("verify_mappings")
+    mappings_valid = ado_verifications.verify_mappings(ADO_ENV.organization, project_name,
+                                                       *working_set.mapping_combinations())
+    if not mappings_valid and not dry_run:
+        write_logging_simple_message("Mapping verifications failed. Exiting...")
+        return
+
+    metrics.start_phase("find_existing_work_items")
+    write_logging_simple_message("Check if all issues are found on the Azure DevOps instance")
+    migrated_ids = get_migrated_work_item_ids(ADO_ENV.organization, project_name)
+    existing = working_set.match_migrated(migrated_ids)
+    if RUN_ENV.legacy_resume_matching:
+        existing += working_set.match_legacy(ADO_ENV.organization, project_name, migrated_ids)
+    write_logging_simple_message(f"{existing} data center issues found on the ADO, "
+                                 f"going to create {working_set.count() - existing} WorkItems")
+
+    if not dry_run:
+        # Only the descriptions of the Work Items to create are needed
+        metrics.start_phase("convert_descriptions")
+        write_logging_simple_message("Converting the descriptions to HTML")
+        convert_descriptions(node for _, node in working_set.iter_nodes("id IS NULL AND description IS NOT NULL"))
+
+    if dry_run:
+        metrics.start_phase("expected_tree_html")
+        write_logging_simple_message("Expected tree HTML generating")
+        expected_tree_path = "./report/expected_tree.html"
+        generate_expected_tree_html(expected_tree_path,
+                                    (node for _, node in working_set.iter_nodes(ordered, "tree_order")),
+                                    project_name)
+
+        metrics.start_phase("request_plan")
+        write_logging_simple_message("Writing the request plan")
+        write_request_plan(project_name, (node for _, node in working_set.iter_nodes("id IS NULL")),
+                           (node for _, node in working_set.iter_nodes(ordered, "tree_order")),
+                           working_set.jira_ado_ids)
+        open_report_html(expected_tree_path)
+        return
+
+    metrics.start_phase("get_folder_work_item_type")
+    folder_type, _ = ease_requirements_helper.get_folder_work_item_type(ADO_ENV.organization, project_name)
+    ADO_ENV.issue_type_map["Folder"] = folder_type
+
+    metrics.start_phase("create_work_items")
+    write_logging_simple_message("Creating issues as Work Items")
+    PROGRESS.track(working_set.count("id IS NULL"))
+    for rowid, node in working_set.iter_nodes("id IS NULL"):
+        create_work_item_for_node(node, project_name, working_set.jira_ado_ids)
+        working_set.save_id(rowid, node, created=True)
+        PROGRESS.advance()
+    working_set.connection.commit()
+
+    if RUN_ENV.migrate_attachments:
+        metrics.start_phase("migrate_attachments")
+        write_logging_simple_message("Migrating the attachments")
+        migrate_attachments([node for _, node in working_set.iter_nodes("created = 1 AND attachments != '[]'")],
+                            project_name, retry_failed=True)
+
+    metrics.start_phase("create_tree_items")
+    write_logging_simple_message("Creating the new tree on Azure DevOps")
+    project_id = ado_helper.get_project_by_id_or_name(ADO_ENV.organization, project_name)["id"]
+    tree_items_created = 0
+    PROGRESS.track(working_set.count(ordered))
+    for rowid, node in working_set.iter_nodes(ordered, "tree_order"):
+        node.parent_id = working_set.jira_ado_ids[node.jira_parent_id]
+        ease_requirements_helper.create_single_tree_item(project_id, node.id, node.parent_id)
+        working_set.save_id(rowid, node)
+        tree_items_created += 1
+        PROGRESS.advance()
+    working_set.connection.commit()
+    write_logging_simple_message("Migration completed")
+    write_logging_simple_message("Created " + str(tree_items_created) + " items in the easeRequirements tree")
+
+    if RUN_ENV.migrate_comments:
+        metrics.start_phase("migrate_comments")
+        write_logging_simple_message("Migrating the comments")
+        issues = "id IS NOT NULL AND is_folder = 0"
+        migrate_comments((node for _, node in working_set.iter_nodes(issues)), project_name,
+                         working_set.count(issues))
+
+    if RUN_ENV.verify_migration:
+        metrics.start_phase("verify_migration")
+        verify_migration((node for _, node in working_set.iter_nodes(ordered)),
+                         (node for _, node in working_set.iter_nodes(ordered, "tree_order")),
+                         working_set.jira_ado_ids, project_name)